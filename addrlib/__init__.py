@@ -7,6 +7,15 @@
 # Addrlib
 # A Python/Cython Address Library for Wii U textures.
 
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from . import addrlib as addrlib_py
+
 try:
     import pyximport
     pyximport.install()
@@ -14,10 +23,258 @@ try:
     from . import addrlib_cy as addrlib
 
 except:
-    from . import addrlib
+    addrlib = addrlib_py
 
 # Define the functions that can be used
-deswizzle = addrlib.deswizzle
-swizzle = addrlib.swizzle
 surfaceGetBitsPerPixel = addrlib.surfaceGetBitsPerPixel
-getSurfaceInfo = addrlib.getSurfaceInfo
+retile = addrlib.retile
+swizzleTiles = addrlib.swizzleTiles
+deswizzleRegion = addrlib.deswizzleRegion
+getTexelAddr = addrlib.getTexelAddr
+SwizzleContext = addrlib.SwizzleContext
+
+# The surface layout only depends on the arguments, so it's computed once per surface/mip level.
+# The returned object is shared between callers and must not be modified.
+getSurfaceInfo = lru_cache(maxsize=1024)(addrlib.getSurfaceInfo)
+
+
+################################################################
+################################################################
+
+# Swizzling backends, name -> (deswizzle, swizzle).
+# Which one is the fastest depends on the size of the surface, its tile mode and bpp,
+# so deswizzle and swizzle pick one for every call, using thresholds measured by autoTune.
+backends = OrderedDict()
+backends['python'] = (addrlib_py.deswizzle, addrlib_py.swizzle)
+
+_executor = None
+
+
+def _getExecutor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(os.cpu_count() or 1)
+
+    return _executor
+
+
+def _deswizzleThreaded(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, depth=1):
+    return addrlib.swizzleSurfThreaded(width, height, height_, format_, tileMode, swizzle_, pitch, bpp,
+                                       bytes(data), 0, _getExecutor(), os.cpu_count() or 1, depth)
+
+
+def _swizzleThreaded(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, depth=1):
+    return addrlib.swizzleSurfThreaded(width, height, height_, format_, tileMode, swizzle_, pitch, bpp,
+                                       bytes(data), 1, _getExecutor(), os.cpu_count() or 1, depth)
+
+
+if addrlib is not addrlib_py:
+    backends['cython'] = (addrlib.deswizzle, addrlib.swizzle)
+    backends['threaded'] = (_deswizzleThreaded, _swizzleThreaded)
+
+# Bumped whenever the backends change, so old tuning results aren't used
+TUNE_VERSION = 2
+
+# Surface sizes (in elements per side) the backends are timed at
+TUNE_SIZES = [8, 32, 128, 512]
+
+# Formats the backends are timed with, for each bpp
+TUNE_FORMATS = OrderedDict([(8, 0x1), (16, 0x7), (32, 0x1a), (64, 0x31), (128, 0x33)])
+
+# Tile modes the backends are timed with, for each kind of tile mode
+TUNE_TILE_MODES = OrderedDict([('linear', 1), ('micro', 2), ('macro', 4)])
+
+# A backend that is this many times slower than the fastest one isn't timed at larger sizes
+TUNE_CUTOFF = 4
+
+_forcedBackend = os.environ.get('ADDRLIB_BACKEND')
+_thresholds = None
+
+
+def getCachePath():
+    """
+    Where the autoTune results are saved, ADDRLIB_TUNE_CACHE if it's set.
+    """
+    if 'ADDRLIB_TUNE_CACHE' in os.environ:
+        return os.environ['ADDRLIB_TUNE_CACHE']
+
+    return os.path.join(os.path.expanduser('~'), '.cache', 'gtx_extract', 'addrlib_tune.json')
+
+
+def _tileModeKind(tileMode):
+    if tileMode in [0, 1]:
+        return 'linear'
+
+    elif tileMode in [2, 3]:
+        return 'micro'
+
+    return 'macro'
+
+
+def _time(function, args):
+    # Best of a few runs, at least 3, for at most ~20ms
+    best = None
+    total = 0.0
+    runs = 0
+
+    while runs < 3 or (total < 0.02 and runs < 20):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+        total += elapsed
+        runs += 1
+
+    return best
+
+
+def autoTune(save=True):
+    """
+    Time every backend on surfaces of every kind of tile mode and bpp at a few sizes,
+    and return the thresholds for picking the fastest one:
+    {'kind:bpp': [[maxElements, backend], ...]}, the last maxElements being None (no limit).
+    The results are saved to getCachePath() if save is set.
+    """
+    global _thresholds
+
+    thresholds = {}
+
+    for kind, tileMode in TUNE_TILE_MODES.items():
+        for bpp, format_ in TUNE_FORMATS.items():
+            candidates = list(backends)
+            winners = []
+
+            for size in TUNE_SIZES:
+                # BCn surfaces are measured in 4x4 blocks
+                width = height = size * 4 if bpp >= 64 else size
+
+                surfOut = getSurfaceInfo(format_, width, height, 1, 1, tileMode, 0, 0)
+                data = bytes(surfOut.surfSize)
+                args = (width, height, surfOut.height, format_, surfOut.tileMode, 0, surfOut.pitch, surfOut.bpp, data)
+
+                times = dict((name, _time(backends[name][0], args)) for name in candidates)
+                fastest = min(candidates, key=times.get)
+
+                winners.append((size * size, fastest))
+                candidates = [name for name in candidates if times[name] <= times[fastest] * TUNE_CUTOFF]
+
+            # The switch from one backend to the next happens between the sizes they won at
+            buckets = []
+            for i, (elements, name) in enumerate(winners):
+                if not buckets or buckets[-1][1] != name:
+                    buckets.append([None, name])
+
+                if i + 1 < len(winners):
+                    buckets[-1][0] = int((elements * winners[i + 1][0]) ** 0.5)
+
+            buckets[-1][0] = None
+            thresholds[kind + ':' + str(bpp)] = buckets
+
+    _thresholds = thresholds
+
+    if save:
+        _saveThresholds(thresholds)
+
+    return thresholds
+
+
+def _cacheKey():
+    return {'version': TUNE_VERSION, 'backends': list(backends), 'cpus': os.cpu_count()}
+
+
+def _saveThresholds(thresholds):
+    path = getCachePath()
+    data = dict(_cacheKey(), thresholds=thresholds)
+
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        # Written to a temporary file first, other processes could be reading it
+        with open(path + '.' + str(os.getpid()), "w") as output:
+            json.dump(data, output, indent=1)
+
+        os.replace(path + '.' + str(os.getpid()), path)
+
+    except OSError:
+        pass
+
+
+def _loadThresholds():
+    try:
+        with open(getCachePath()) as inf:
+            data = json.load(inf)
+
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or any(data.get(key) != value for key, value in _cacheKey().items()):
+        return None
+
+    return data.get('thresholds')
+
+
+def getThresholds():
+    """
+    The thresholds used for picking a backend, loaded from the cache file,
+    or measured with autoTune (and saved) the first time they are needed.
+    """
+    global _thresholds
+
+    if _thresholds is None:
+        _thresholds = _loadThresholds() or autoTune()
+
+    return _thresholds
+
+
+def setBackend(name):
+    """
+    Use this backend for every call, or pick one for every call again if name is None.
+    ADDRLIB_BACKEND sets the default.
+    """
+    global _forcedBackend
+
+    if name is not None and name not in backends:
+        raise ValueError("Unknown addrlib backend: " + name)
+
+    _forcedBackend = name
+
+
+def selectBackend(width, height, format_, tileMode, bpp, depth=1):
+    """
+    Name of the backend used for swizzling a surface (all its slices, if depth is more than 1).
+    """
+    if _forcedBackend in backends:
+        return _forcedBackend
+
+    if len(backends) == 1:
+        return next(iter(backends))
+
+    if format_ in addrlib_py.BCn_formats:
+        elements = ((width + 3) // 4) * ((height + 3) // 4)
+
+    else:
+        elements = width * height
+
+    elements *= depth
+
+    buckets = getThresholds().get(_tileModeKind(tileMode) + ':' + str(bpp))
+    if not buckets:
+        return list(backends)[1]
+
+    for maxElements, name in buckets:
+        if (maxElements is None or elements <= maxElements) and name in backends:
+            return name
+
+    return list(backends)[1]
+
+
+def deswizzle(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, depth=1):
+    return backends[selectBackend(width, height, format_, tileMode, bpp, depth)][0](
+        width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, depth)
+
+
+def swizzle(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, depth=1):
+    return backends[selectBackend(width, height, format_, tileMode, bpp, depth)][1](
+        width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, depth)
@@ -16,7 +16,7 @@ BCn_formats = [
 
 
 def swizzleSurf(width, height, height_, format_, tileMode, swizzle_,
-                pitch, bitsPerPixel, data, swizzle):
+                pitch, bitsPerPixel, data, swizzle, depth=1):
 
     bytesPerPixel = bitsPerPixel // 8
     result = bytearray(len(data))
@@ -25,43 +25,186 @@ def swizzleSurf(width, height, height_, format_, tileMode, swizzle_,
         width = (width + 3) // 4
         height = (height + 3) // 4
 
-    pipeSwizzle = (swizzle_ >> 8) & 1
-    bankSwizzle = (swizzle_ >> 9) & 3
+    context = SwizzleContext(bitsPerPixel, pitch, height_, tileMode, swizzle_)
+    computeAddr = context.computeAddr
 
-    for y in range(height):
-        for x in range(width):
-            if tileMode in [0, 1]:
-                pos = (y * pitch + x) * bytesPerPixel
+    if bytesPerPixel == 0:
+        return bytes(result)
 
-            elif tileMode in [2, 3]:
-                pos = computeSurfaceAddrFromCoordMicroTiled(x, y, bitsPerPixel, pitch, tileMode)
+    elif tileMode in [0, 1]:
+        swizzleRowsLinear(width, height, depth, context, data, result, swizzle)
+        return bytes(result)
 
-            else:
-                pos = computeSurfaceAddrFromCoordMacroTiled(x, y, bitsPerPixel, pitch, height_, tileMode,
-                                                            pipeSwizzle, bankSwizzle)
+    elif tileMode in [2, 3]:
+        swizzleRowsMicroTiled(width, height, depth, context, data, result, swizzle)
+        return bytes(result)
 
-            pos_ = (y * width + x) * bytesPerPixel
+    # The slices (of 3D, cube and array surfaces) are stored one after the other in the linear data
+    for z in range(depth):
+        for y in range(height):
+            for x in range(width):
+                pos = computeAddr(x, y, z)
+                pos_ = ((z * height + y) * width + x) * bytesPerPixel
 
-            if pos_ + bytesPerPixel <= len(data) and pos + bytesPerPixel <= len(data):
-                if swizzle == 0:
-                    result[pos_:pos_ + bytesPerPixel] = data[pos:pos + bytesPerPixel]
+                if pos_ + bytesPerPixel <= len(data) and pos + bytesPerPixel <= len(data):
+                    if swizzle == 0:
+                        result[pos_:pos_ + bytesPerPixel] = data[pos:pos + bytesPerPixel]
 
-                else:
-                    result[pos:pos + bytesPerPixel] = data[pos_:pos_ + bytesPerPixel]
+                    else:
+                        result[pos:pos + bytesPerPixel] = data[pos_:pos_ + bytesPerPixel]
 
     return bytes(result)
 
 
+def copyElements(data, result, pos, pos_, count, bytesPerPixel, swizzle):
+    # Copy count elements that follow each other both in the surface (at pos) and in the linear data (at pos_),
+    # only the ones that fit in data, like when they are copied one by one
+    count = min(count, (len(data) - pos) // bytesPerPixel, (len(data) - pos_) // bytesPerPixel)
+
+    if count > 0:
+        size = count * bytesPerPixel
+
+        if swizzle == 0:
+            result[pos_:pos_ + size] = data[pos:pos + size]
+
+        else:
+            result[pos:pos + size] = data[pos_:pos_ + size]
+
+
+def swizzleRowsLinear(width, height, depth, context, data, result, swizzle):
+    # Linear surfaces are only padded to the pitch, so every row is copied at once
+    bytesPerPixel = context.bytesPerPixel
+
+    for z in range(depth):
+        for y in range(height):
+            copyElements(data, result, context.computeAddr(0, y, z), (z * height + y) * width * bytesPerPixel,
+                         width, bytesPerPixel, swizzle)
+
+
+def swizzleRowsMicroTiled(width, height, depth, context, data, result, swizzle):
+    # 1D tiled surfaces are made of micro tiles (8x8 elements, 4 slices deep for tile mode 3) stored row by row,
+    # so only the start of every micro tile is computed, and its elements are copied a run at a time
+    bpp = context.bpp
+    bytesPerPixel = bpp // 8
+    microTileBytes = context.microTileBytes
+
+    for z in range(depth):
+        sliceOffset = z // context.thickness * context.sliceBytes + ((bpp * context.pixelBitsZ[z & 7]) >> 3)
+
+        for y in range(height):
+            rowOffset = sliceOffset + (y >> 3) * context.microTilesPerRow * microTileBytes
+            runs = context.microTileRuns[y & 7]
+            pos_ = (z * height + y) * width * bytesPerPixel
+
+            for tileX in range(0, width, 8):
+                tileOffset = rowOffset + (tileX >> 3) * microTileBytes
+
+                for x, pixelIndex, count in runs:
+                    x += tileX
+                    if x >= width:
+                        break
+
+                    copyElements(data, result, tileOffset + ((bpp * pixelIndex) >> 3), pos_ + x * bytesPerPixel,
+                                 min(count, width - x), bytesPerPixel, swizzle)
+
+
 def deswizzle(width, height, height_, format_, tileMode, swizzle_,
-              pitch, bpp, data):
+              pitch, bpp, data, depth=1):
 
-    return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, 0)
+    return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, 0, depth)
 
 
 def swizzle(width, height, height_, format_, tileMode, swizzle_,
-            pitch, bpp, data):
+            pitch, bpp, data, depth=1):
+
+    return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, 1, depth)
+
+
+def swizzleTiles(width, height, height_, format_, tileMode, swizzle_,
+                 pitch, bpp, data, surface, tiles):
+
+    # Only the elements of the given 8x8 tiles (x, y, z of their top left element) are swizzled,
+    # they are written straight into surface (a bytearray or a memoryview of one), the rest of it is kept
+    bytesPerPixel = bpp // 8
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    computeAddr = SwizzleContext(bpp, pitch, height_, tileMode, swizzle_).computeAddr
+
+    for x0, y0, z in tiles:
+        for y in range(y0, min(y0 + 8, height)):
+            for x in range(x0, min(x0 + 8, width)):
+                pos = computeAddr(x, y, z)
+                pos_ = ((z * height + y) * width + x) * bytesPerPixel
 
-    return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, 1)
+                if pos_ + bytesPerPixel <= len(data) and pos + bytesPerPixel <= len(surface):
+                    surface[pos:pos + bytesPerPixel] = data[pos_:pos_ + bytesPerPixel]
+
+
+def deswizzleRegion(x, y, w, h, slice_, height_, format_, tileMode, swizzle_, pitch, bpp, data):
+
+    # Only the addresses of the elements in the region are computed, so reading a small part
+    # of a huge surface is cheap. For BCn formats, the 4x4 blocks that cover it are read.
+    bytesPerPixel = bpp // 8
+
+    if format_ in BCn_formats:
+        w = (x + w + 3) // 4 - x // 4
+        h = (y + h + 3) // 4 - y // 4
+        x //= 4
+        y //= 4
+
+    result = bytearray(w * h * bytesPerPixel)
+
+    computeAddr = SwizzleContext(bpp, pitch, height_, tileMode, swizzle_).computeAddr
+
+    for j in range(h):
+        for i in range(w):
+            pos = computeAddr(x + i, y + j, slice_)
+            pos_ = (j * w + i) * bytesPerPixel
+
+            if pos + bytesPerPixel <= len(data):
+                result[pos_:pos_ + bytesPerPixel] = data[pos:pos + bytesPerPixel]
+
+    return bytes(result)
+
+
+def getTexelAddr(x, y, slice_, height_, format_, tileMode, swizzle_, pitch, bpp):
+
+    # Address of the element with the texel x, y (its 4x4 block for BCn formats)
+    if format_ in BCn_formats:
+        x //= 4
+        y //= 4
+
+    return SwizzleContext(bpp, pitch, height_, tileMode, swizzle_).computeAddr(x, y, slice_)
+
+
+def retile(width, height, depth, format_, bpp, srcHeight, srcTileMode, srcSwizzle, srcPitch,
+           dstHeight, dstTileMode, dstSwizzle, dstPitch, data, dstSize):
+
+    # Every element is copied straight from its address in the source layout
+    # to its address in the destination layout, without a linear copy in between
+    bytesPerPixel = bpp // 8
+    result = bytearray(dstSize)
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    computeSrcAddr = SwizzleContext(bpp, srcPitch, srcHeight, srcTileMode, srcSwizzle).computeAddr
+    computeDstAddr = SwizzleContext(bpp, dstPitch, dstHeight, dstTileMode, dstSwizzle).computeAddr
+
+    for z in range(depth):
+        for y in range(height):
+            for x in range(width):
+                pos = computeSrcAddr(x, y, z)
+                pos_ = computeDstAddr(x, y, z)
+
+                if pos + bytesPerPixel <= len(data) and pos_ + bytesPerPixel <= dstSize:
+                    result[pos_:pos_ + bytesPerPixel] = data[pos:pos + bytesPerPixel]
+
+    return bytes(result)
 
 
 formatHwInfo = [
@@ -117,7 +260,8 @@ def computeSurfaceThickness(tileMode):
     return 1
 
 
-def computePixelIndexWithinMicroTile(x, y, bpp):
+def computePixelIndexXYWithinMicroTile(x, y, bpp):
+    # Only used for building pixelIndexTables
     if bpp == 0x08:
         return (32 * ((y & 4) >> 2) | 16 * (y & 1) | 8 * ((y & 2) >> 1) |
                 4 * ((x & 4) >> 2) | 2 * ((x & 2) >> 1) | x & 1)
@@ -126,10 +270,6 @@ def computePixelIndexWithinMicroTile(x, y, bpp):
         return (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * (y & 1) |
                 4 * ((x & 4) >> 2) | 2 * ((x & 2) >> 1) | x & 1)
 
-    elif bpp in [0x20, 0x60]:
-        return (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
-                4 * (y & 1) | 2 * ((x & 2) >> 1) | x & 1)
-
     elif bpp == 0x40:
         return (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
                 4 * ((x & 2) >> 1) | 2 * (y & 1) | x & 1)
@@ -143,12 +283,71 @@ def computePixelIndexWithinMicroTile(x, y, bpp):
                 4 * (y & 1) | 2 * ((x & 2) >> 1) | x & 1)
 
 
+# The pixel index within a micro tile only depends on the lowest 3 bits of x, y and z,
+# so it's read from tables instead of shuffling bits for every pixel:
+# pixelIndexTables[bpp class][(y & 7) << 3 | x & 7] | pixelBitsZ[thickness >> 2][z & 7]
+microTileBppClasses = {0x08: 0, 0x10: 1, 0x40: 3, 0x80: 4}
+
+pixelIndexTables = [[computePixelIndexXYWithinMicroTile(i & 7, i >> 3, bpp) for i in range(64)]
+                    for bpp in [0x08, 0x10, 0x20, 0x40, 0x80]]
+
+# Thick tiles hold 4 (or 8) slices, z picks the slice
+pixelBitsZ = [
+    [0] * 8,
+    [128 * ((z & 2) >> 1) | 64 * (z & 1) for z in range(8)],
+    [256 * ((z & 4) >> 2) | 128 * ((z & 2) >> 1) | 64 * (z & 1) for z in range(8)],
+]
+
+def getMicroTileRuns(pixelIndexTable):
+    # The elements of every row of a micro tile that follow each other in it too,
+    # [(x, pixelIndex, count), ...] for every row, so 1D tiled surfaces are copied a run at a time
+    runs = []
+
+    for y in range(8):
+        row = []
+
+        for x in range(8):
+            pixelIndex = pixelIndexTable[y << 3 | x]
+
+            if row and row[-1][1] + row[-1][2] == pixelIndex:
+                row[-1][2] += 1
+
+            else:
+                row.append([x, pixelIndex, 1])
+
+        runs.append([tuple(run) for run in row])
+
+    return runs
+
+
+microTileRuns = [getMicroTileRuns(pixelIndexTable) for pixelIndexTable in pixelIndexTables]
+
+# The pipe depends on bit 3 of x and y, the bank on bits 3-4 of x and bits 4-5 of y
+pipeTable = [((y >> 3) ^ (x >> 3)) & 1 for y in range(16) for x in range(16)]
+bankTable = [((y >> 5) ^ (x >> 3)) & 1 | 2 * (((y >> 4) ^ (x >> 4)) & 1) for y in range(64) for x in range(32)]
+
+
+def computePixelIndexWithinMicroTile(x, y, z, bpp, tileMode):
+    return (pixelBitsZ[computeSurfaceThickness(tileMode) >> 2][z & 7]
+            | pixelIndexTables[microTileBppClasses.get(bpp, 2)][(y & 7) << 3 | x & 7])
+
+
 def computePipeFromCoordWoRotation(x, y):
-    return ((y >> 3) ^ (x >> 3)) & 1
+    return pipeTable[(y & 15) << 4 | x & 15]
 
 
 def computeBankFromCoordWoRotation(x, y):
-    return ((y >> 5) ^ (x >> 3)) & 1 | 2 * (((y >> 4) ^ (x >> 4)) & 1)
+    return bankTable[(y & 63) << 5 | x & 31]
+
+
+def computeSurfaceRotationFromTileMode(tileMode):
+    if tileMode in [4, 5, 6, 7, 8, 9, 10, 11]:
+        return 2
+
+    elif tileMode in [12, 13, 14, 15]:
+        return 1
+
+    return 0
 
 
 def isThickMacroTiled(tileMode):
@@ -208,7 +407,7 @@ def computeSurfaceBankSwappedWidth(tileMode, bpp, pitch, numSamples=1):
     return bankSwapWidth
 
 
-def computeSurfaceAddrFromCoordMicroTiled(x, y, bpp, pitch, tileMode):
+def computeSurfaceAddrFromCoordMicroTiled(x, y, slice_, bpp, pitch, height, tileMode):
     microTileThickness = 1
 
     if tileMode == 3:
@@ -218,18 +417,22 @@ def computeSurfaceAddrFromCoordMicroTiled(x, y, bpp, pitch, tileMode):
     microTilesPerRow = pitch >> 3
     microTileIndexX = x >> 3
     microTileIndexY = y >> 3
+    microTileIndexZ = slice_ // microTileThickness
 
     microTileOffset = microTileBytes * (microTileIndexX + microTileIndexY * microTilesPerRow)
-    pixelIndex = computePixelIndexWithinMicroTile(x, y, bpp)
+    sliceBytes = (pitch * height * microTileThickness * bpp + 7) // 8
+    sliceOffset = microTileIndexZ * sliceBytes
+
+    pixelIndex = computePixelIndexWithinMicroTile(x, y, slice_, bpp, tileMode)
     pixelOffset = (bpp * pixelIndex) >> 3
 
-    return pixelOffset + microTileOffset
+    return pixelOffset + microTileOffset + sliceOffset
 
 
 bankSwapOrder = [0, 1, 3, 2, 6, 7, 5, 4, 0, 0]
 
 
-def computeSurfaceAddrFromCoordMacroTiled(x, y, bpp, pitch, height,
+def computeSurfaceAddrFromCoordMacroTiled(x, y, slice_, bpp, pitch, height,
                                           tileMode, pipeSwizzle,
                                           bankSwizzle):
 
@@ -238,13 +441,14 @@ def computeSurfaceAddrFromCoordMacroTiled(x, y, bpp, pitch, height,
     microTileBits = bpp * (microTileThickness * 64)
     microTileBytes = (microTileBits + 7) // 8
 
-    pixelIndex = computePixelIndexWithinMicroTile(x, y, bpp)
+    pixelIndex = computePixelIndexWithinMicroTile(x, y, slice_, bpp, tileMode)
     elemOffset = bpp * pixelIndex
 
     bytesPerSample = microTileBytes
 
     if microTileBytes <= 2048:
         numSamples = 1
+        numSampleSplits = 1
         sampleSlice = 0
 
     else:
@@ -259,14 +463,20 @@ def computeSurfaceAddrFromCoordMacroTiled(x, y, bpp, pitch, height,
     pipe = computePipeFromCoordWoRotation(x, y)
     bank = computeBankFromCoordWoRotation(x, y)
 
+    # Every slice (every group of 4 slices for thick tile modes) is rotated to a different pipe and bank
+    sliceIn = slice_
+    if isThickMacroTiled(tileMode):
+        sliceIn >>= 2
+
     swizzle_ = pipeSwizzle + 2 * bankSwizzle
-    bankPipe = ((pipe + 2 * bank) ^ (6 * sampleSlice ^ swizzle_)) % 8
+    rotation = computeSurfaceRotationFromTileMode(tileMode)
+    bankPipe = ((pipe + 2 * bank) ^ (6 * sampleSlice ^ (swizzle_ + sliceIn * rotation))) % 8
 
     pipe = bankPipe % 2
     bank = bankPipe // 2
 
     sliceBytes = (height * pitch * microTileThickness * bpp * numSamples + 7) // 8
-    sliceOffset = sliceBytes * (sampleSlice // microTileThickness)
+    sliceOffset = sliceBytes * ((sampleSlice + numSampleSplits * slice_) // microTileThickness)
 
     macroTilePitch = 32
     macroTileHeight = 16
@@ -295,6 +505,115 @@ def computeSurfaceAddrFromCoordMacroTiled(x, y, bpp, pitch, height,
     return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
 
 
+def computeSurfaceAddrFromCoord(x, y, slice_, bpp, pitch, height, tileMode, pipeSwizzle, bankSwizzle):
+    if tileMode in [0, 1]:
+        return ((slice_ * height + y) * pitch + x) * (bpp // 8)
+
+    elif tileMode in [2, 3]:
+        return computeSurfaceAddrFromCoordMicroTiled(x, y, slice_, bpp, pitch, height, tileMode)
+
+    return computeSurfaceAddrFromCoordMacroTiled(x, y, slice_, bpp, pitch, height, tileMode,
+                                                 pipeSwizzle, bankSwizzle)
+
+
+class SwizzleContext:
+    # What computeSurfaceAddrFromCoord works out from the surface alone (thickness, tile and slice sizes,
+    # rotation, bank swapped width...), computed once per surface and mip level instead of for every element.
+    # computeAddr(x, y, slice_) returns the same address as computeSurfaceAddrFromCoord.
+    def __init__(self, bpp, pitch, height, tileMode, swizzle_):
+        self.bpp = bpp
+        self.pitch = pitch
+        self.height = height
+        self.tileMode = tileMode
+
+        thickness = computeSurfaceThickness(tileMode)
+        self.thickness = thickness
+        self.pixelBitsZ = pixelBitsZ[thickness >> 2]
+        self.pixelIndexTable = pixelIndexTables[microTileBppClasses.get(bpp, 2)]
+        self.microTileRuns = microTileRuns[microTileBppClasses.get(bpp, 2)]
+
+        if tileMode in [0, 1]:
+            self.bytesPerPixel = bpp // 8
+            self.computeAddr = self.computeAddrLinear
+
+        elif tileMode in [2, 3]:
+            self.microTileBytes = (64 * thickness * bpp + 7) // 8
+            self.microTilesPerRow = pitch >> 3
+            self.sliceBytes = (pitch * height * thickness * bpp + 7) // 8
+            self.computeAddr = self.computeAddrMicroTiled
+
+        else:
+            microTileBits = bpp * (thickness * 64)
+            microTileBytes = (microTileBits + 7) // 8
+
+            if microTileBytes <= 2048:
+                numSamples = 1
+                self.numSampleSplits = 1
+                self.sampleBits = 0
+
+            else:
+                samplesPerSlice = 2048 // microTileBytes
+                self.numSampleSplits = max(1, 1 // samplesPerSlice)
+                numSamples = samplesPerSlice
+                self.sampleBits = microTileBits // self.numSampleSplits
+
+            self.sliceShift = 2 if isThickMacroTiled(tileMode) else 0
+            self.swizzle = ((swizzle_ >> 8) & 1) + 2 * ((swizzle_ >> 9) & 3)
+            self.rotation = computeSurfaceRotationFromTileMode(tileMode)
+            self.sliceBytes = (height * pitch * thickness * bpp * numSamples + 7) // 8
+
+            aspectRatio = computeMacroTileAspectRatio(tileMode)
+            self.macroTilePitch = 32 // aspectRatio
+            self.macroTileHeight = 16 * aspectRatio
+            self.macroTilesPerRow = pitch // self.macroTilePitch
+            self.macroTileBytes = (numSamples * thickness * bpp * self.macroTileHeight
+                                   * self.macroTilePitch + 7) // 8
+
+            # 0 if the tile mode isn't bank swapped
+            self.bankSwapWidth = computeSurfaceBankSwappedWidth(tileMode, bpp, pitch, 1)
+            self.computeAddr = self.computeAddrMacroTiled
+
+    def computeAddrLinear(self, x, y, slice_):
+        return ((slice_ * self.height + y) * self.pitch + x) * self.bytesPerPixel
+
+    def computeAddrMicroTiled(self, x, y, slice_):
+        microTileOffset = self.microTileBytes * ((x >> 3) + (y >> 3) * self.microTilesPerRow)
+        sliceOffset = slice_ // self.thickness * self.sliceBytes
+
+        pixelIndex = self.pixelBitsZ[slice_ & 7] | self.pixelIndexTable[(y & 7) << 3 | x & 7]
+        return ((self.bpp * pixelIndex) >> 3) + microTileOffset + sliceOffset
+
+    def computeAddrMacroTiled(self, x, y, slice_):
+        elemOffset = self.bpp * (self.pixelBitsZ[slice_ & 7] | self.pixelIndexTable[(y & 7) << 3 | x & 7])
+
+        if self.sampleBits:
+            sampleSlice = elemOffset // self.sampleBits
+            elemOffset %= self.sampleBits
+
+        else:
+            sampleSlice = 0
+
+        elemOffset = (elemOffset + 7) // 8
+
+        bankPipe = ((pipeTable[(y & 15) << 4 | x & 15] + 2 * bankTable[(y & 63) << 5 | x & 31])
+                    ^ (6 * sampleSlice ^ (self.swizzle + (slice_ >> self.sliceShift) * self.rotation))) % 8
+
+        pipe = bankPipe % 2
+        bank = bankPipe // 2
+
+        sliceOffset = self.sliceBytes * ((sampleSlice + self.numSampleSplits * slice_) // self.thickness)
+
+        macroTileIndexX = x // self.macroTilePitch
+        macroTileOffset = ((macroTileIndexX + self.macroTilesPerRow * (y // self.macroTileHeight))
+                           * self.macroTileBytes)
+
+        if self.bankSwapWidth:
+            bank ^= bankSwapOrder[(self.macroTilePitch * macroTileIndexX // self.bankSwapWidth) & 3]
+
+        totalOffset = elemOffset + ((macroTileOffset + sliceOffset) >> 3)
+        return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
+
+
 expPitch = 0
 expHeight = 0
 expNumSlices = 0
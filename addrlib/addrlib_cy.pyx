@@ -8,7 +8,8 @@
 ################################################################
 ################################################################
 
-from cpython cimport array
+cimport cython
+from libc.string cimport memcpy
 
 
 ctypedef unsigned char u8
@@ -24,65 +25,280 @@ cdef list BCn_formats = [
 ]
 
 
-cdef bytes swizzleSurf(u32 width, u32 height, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
-                           u32 pitch, u32 bitsPerPixel, u8 *data, u32 dataSize, int swizzle):
+cdef inline void copyElements(const u8 *data, u8 *result, u64 pos, u64 pos_, u64 count, u32 bytesPerPixel,
+                              u64 dataSize, int swizzle) noexcept nogil:
 
-    cdef:
-        u32 bytesPerPixel = bitsPerPixel // 8
-        bytearray result = bytearray(dataSize)
+    # Copy count elements that follow each other both in the surface (at pos) and in the linear data (at pos_),
+    # only the ones that fit in data, like when they are copied one by one
+    if pos >= dataSize or pos_ >= dataSize:
+        return
 
-        u32 pipeSwizzle, bankSwizzle, y, x, pos_, n
-        u64 pos
+    count = min(count, (dataSize - pos) // bytesPerPixel, (dataSize - pos_) // bytesPerPixel)
 
-    if format_ in BCn_formats:
-        width = (width + 3) // 4
-        height = (height + 3) // 4
+    if swizzle == 0:
+        memcpy(result + pos_, data + pos, count * bytesPerPixel)
 
-    pipeSwizzle = (swizzle_ >> 8) & 1
-    bankSwizzle = (swizzle_ >> 9) & 3
+    else:
+        memcpy(result + pos, data + pos_, count * bytesPerPixel)
 
-    for y in range(height):
-        for x in range(width):
-            if tileMode in [0, 1]:
-                pos = (y * pitch + x) * bytesPerPixel
 
-            elif tileMode in [2, 3]:
-                pos = computeSurfaceAddrFromCoordMicroTiled(x, y, bitsPerPixel, pitch, tileMode)
+cdef void swizzleRowMicroTiled(u32 width, u32 z, u32 y, u64 row, SwizzleContext context, const u8 *data,
+                                u8 *result, u64 dataSize, int swizzle) noexcept nogil:
 
-            else:
-                pos = computeSurfaceAddrFromCoordMacroTiled(x, y, bitsPerPixel, pitch, height_, tileMode,
-                                                            pipeSwizzle, bankSwizzle)
+    # 1D tiled surfaces are made of micro tiles (8x8 elements, 4 slices deep for tile mode 3) stored row by row,
+    # so only the start of every micro tile is computed, and its elements are copied a run at a time
+    cdef:
+        u32 bpp = context.bpp
+        u32 bytesPerPixel = bpp // 8
+        u32 bppClass = context.bppClass
+        u32 tileY = y & 7
+        u32 tileX, x, n
+        u64 tileOffset
+        u64 pos_ = row * width * bytesPerPixel
+        u64 rowOffset = ((z // context.thickness) * context.sliceBytes
+                         + ((bpp * context.pixelBitsZ[z & 7]) >> 3)
+                         + <u64>(y >> 3) * context.microTilesPerRow * context.microTileBytes)
+
+    for tileX in range(0, width, 8):
+        tileOffset = rowOffset + <u64>(tileX >> 3) * context.microTileBytes
+
+        for n in range(microTileRunCount[bppClass][tileY]):
+            x = tileX + microTileRunX[bppClass][tileY][n]
+            if x >= width:
+                break
+
+            copyElements(data, result,
+                         tileOffset + ((bpp * context.pixelIndexTable[tileY << 3 | x & 7]) >> 3),
+                         pos_ + <u64>x * bytesPerPixel, min(microTileRunLength[bppClass][tileY][n], width - x),
+                         bytesPerPixel, dataSize, swizzle)
+
+
+cdef void swizzleRows(u32 width, u32 height, u32 rowStart, u32 rowEnd, SwizzleContext context,
+                      const u8 *data, u8 *result, u64 dataSize, int swizzle) noexcept nogil:
+
+    # The rows of every slice are numbered one after the other, row = z * height + y
+    cdef:
+        u32 bytesPerPixel = context.bytesPerPixel
+        u32 tileMode = context.tileMode
+        u32 row, z, y, x, n
+        u64 pos, pos_
+
+    if bytesPerPixel == 0:
+        return
+
+    for row in range(rowStart, rowEnd):
+        z = row // height
+        y = row % height
+
+        if tileMode == 0 or tileMode == 1:
+            # Linear surfaces are only padded to the pitch, so every row is copied at once
+            copyElements(data, result, context.computeAddr(0, y, z), <u64>row * width * bytesPerPixel, width,
+                         bytesPerPixel, dataSize, swizzle)
+
+            continue
 
-            pos_ = (y * width + x) * bytesPerPixel
+        elif tileMode == 2 or tileMode == 3:
+            swizzleRowMicroTiled(width, z, y, row, context, data, result, dataSize, swizzle)
+            continue
+
+        for x in range(width):
+            pos = context.computeAddr(x, y, z)
+            pos_ = (<u64>row * width + x) * bytesPerPixel
 
             if pos_ + bytesPerPixel <= dataSize and pos + bytesPerPixel <= dataSize:
                 if swizzle == 0:
                     for n in range(bytesPerPixel):
-                        result[pos_ + n] = <u8>data[pos + n]
+                        result[pos_ + n] = data[pos + n]
 
                 else:
                     for n in range(bytesPerPixel):
-                        result[pos + n] = <u8>data[pos_ + n]
+                        result[pos + n] = data[pos_ + n]
+
+
+cdef bytes swizzleSurf(u32 width, u32 height, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
+                           u32 pitch, u32 bitsPerPixel, const u8 *data, u64 dataSize, int swizzle, u32 depth):
+
+    cdef:
+        bytearray result = bytearray(dataSize)
+        u8 *result_ = result
+        SwizzleContext context = SwizzleContext(bitsPerPixel, pitch, height_, tileMode, swizzle_)
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    with nogil:
+        swizzleRows(width, height, 0, height * depth, context, data, result_, dataSize, swizzle)
 
     return bytes(result)
 
 
 cpdef bytes deswizzle(u32 width, u32 height, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
-                          u32 pitch, u32 bpp, bytes data):
-
-    cdef array.array dataArr = array.array('B', data)
+                          u32 pitch, u32 bpp, bytes data, u32 depth=1):
 
     return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp,
-                       dataArr.data.as_uchars, len(data), 0)
+                       data, len(data), 0, depth)
 
 
 cpdef bytes swizzle(u32 width, u32 height, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
-                          u32 pitch, u32 bpp, bytes data):
-
-    cdef array.array dataArr = array.array('B', data)
+                          u32 pitch, u32 bpp, bytes data, u32 depth=1):
 
     return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp,
-                       dataArr.data.as_uchars, len(data), 1)
+                       data, len(data), 1, depth)
+
+
+cpdef void swizzleTiles(u32 width, u32 height, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
+                        u32 pitch, u32 bpp, bytes data, u8[::1] surface, list tiles):
+
+    # Only the elements of the given 8x8 tiles (x, y, z of their top left element) are swizzled,
+    # they are written straight into surface (a bytearray or a memoryview of one), the rest of it is kept
+    cdef:
+        const u8 *data_ = data
+        u64 dataSize = len(data)
+        u64 surfSize = surface.shape[0]
+        u32 bytesPerPixel = bpp // 8
+        SwizzleContext context = SwizzleContext(bpp, pitch, height_, tileMode, swizzle_)
+        u32 x0, y0, z, x, y, n
+        u64 pos, pos_
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    for x0, y0, z in tiles:
+        for y in range(y0, min(y0 + 8, height)):
+            for x in range(x0, min(x0 + 8, width)):
+                pos = context.computeAddr(x, y, z)
+                pos_ = ((<u64>z * height + y) * width + x) * bytesPerPixel
+
+                if pos_ + bytesPerPixel <= dataSize and pos + bytesPerPixel <= surfSize:
+                    for n in range(bytesPerPixel):
+                        surface[pos + n] = data_[pos_ + n]
+
+
+cpdef bytes deswizzleRegion(u32 x, u32 y, u32 w, u32 h, u32 slice_, u32 height_, u32 format_, u32 tileMode,
+                            u32 swizzle_, u32 pitch, u32 bpp, const u8[::1] data):
+
+    # Only the addresses of the elements in the region are computed, so reading a small part
+    # of a huge surface is cheap. For BCn formats, the 4x4 blocks that cover it are read.
+    # data can be any buffer, like a memoryview of a memory-mapped file, it isn't copied.
+    cdef:
+        bytearray result
+        u8 *result_
+        u64 dataSize = data.shape[0]
+        u32 bytesPerPixel = bpp // 8
+        SwizzleContext context = SwizzleContext(bpp, pitch, height_, tileMode, swizzle_)
+        u32 i, j, n
+        u64 pos, pos_
+
+    if format_ in BCn_formats:
+        w = (x + w + 3) // 4 - x // 4
+        h = (y + h + 3) // 4 - y // 4
+        x //= 4
+        y //= 4
+
+    result = bytearray(<u64>w * h * bytesPerPixel)
+    result_ = result
+
+    with nogil:
+        for j in range(h):
+            for i in range(w):
+                pos = context.computeAddr(x + i, y + j, slice_)
+                pos_ = (<u64>j * w + i) * bytesPerPixel
+
+                if pos + bytesPerPixel <= dataSize:
+                    for n in range(bytesPerPixel):
+                        result_[pos_ + n] = data[pos + n]
+
+    return bytes(result)
+
+
+cpdef u64 getTexelAddr(u32 x, u32 y, u32 slice_, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
+                       u32 pitch, u32 bpp):
+
+    # Address of the element with the texel x, y (its 4x4 block for BCn formats)
+    if format_ in BCn_formats:
+        x //= 4
+        y //= 4
+
+    return SwizzleContext(bpp, pitch, height_, tileMode, swizzle_).computeAddr(x, y, slice_)
+
+
+cpdef bytes retile(u32 width, u32 height, u32 depth, u32 format_, u32 bpp, u32 srcHeight, u32 srcTileMode,
+                  u32 srcSwizzle, u32 srcPitch, u32 dstHeight, u32 dstTileMode, u32 dstSwizzle, u32 dstPitch,
+                  bytes data, u64 dstSize):
+
+    # Every element is copied straight from its address in the source layout
+    # to its address in the destination layout, without a linear copy in between
+    cdef:
+        bytearray result = bytearray(dstSize)
+        u8 *result_ = result
+        const u8 *data_ = data
+        u64 dataSize = len(data)
+        u32 bytesPerPixel = bpp // 8
+        SwizzleContext src = SwizzleContext(bpp, srcPitch, srcHeight, srcTileMode, srcSwizzle)
+        SwizzleContext dst = SwizzleContext(bpp, dstPitch, dstHeight, dstTileMode, dstSwizzle)
+        u32 z, y, x, n
+        u64 pos, pos_
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    with nogil:
+        for z in range(depth):
+            for y in range(height):
+                for x in range(width):
+                    pos = src.computeAddr(x, y, z)
+                    pos_ = dst.computeAddr(x, y, z)
+
+                    if pos + bytesPerPixel <= dataSize and pos_ + bytesPerPixel <= dstSize:
+                        for n in range(bytesPerPixel):
+                            result_[pos_ + n] = data_[pos + n]
+
+    return bytes(result)
+
+
+def _swizzleBand(u32 width, u32 height, u32 rowStart, u32 rowEnd, SwizzleContext context, bytes data,
+                 bytearray result, int swizzle):
+
+    cdef:
+        const u8 *data_ = data
+        u8 *result_ = result
+        u64 dataSize = len(data)
+
+    with nogil:
+        swizzleRows(width, height, rowStart, rowEnd, context, data_, result_, dataSize, swizzle)
+
+
+def swizzleSurfThreaded(u32 width, u32 height, u32 height_, u32 format_, u32 tileMode, u32 swizzle_,
+                        u32 pitch, u32 bitsPerPixel, bytes data, int swizzle, executor, u32 bands,
+                        u32 depth=1):
+    """
+    swizzleSurf split into bands of rows that run on executor's threads, without the GIL.
+    The rows of all the slices are split together, so the slices of 3D, cube and array surfaces
+    are processed in parallel too.
+    Every pixel has its own address, so the bands never write to the same bytes.
+    """
+    result = bytearray(len(data))
+    context = SwizzleContext(bitsPerPixel, pitch, height_, tileMode, swizzle_)
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    totalRows = height * depth
+    bands = max(1, min(bands, totalRows))
+    rows = (totalRows + bands - 1) // bands
+
+    futures = [executor.submit(_swizzleBand, width, height, row, min(row + rows, totalRows), context,
+                               data, result, swizzle)
+               for row in range(0, totalRows, rows)]
+
+    for future in futures:
+        future.result()
+
+    return bytes(result)
 
 
 cdef u8 formatHwInfo[0x100]
@@ -130,7 +346,7 @@ cpdef u32 surfaceGetBitsPerPixel(u32 surfaceFormat):
     return formatHwInfo[(surfaceFormat & 0x3F) * 4]
 
 
-cdef u32 computeSurfaceThickness(u32 tileMode):
+cdef u32 computeSurfaceThickness(u32 tileMode) noexcept nogil:
     if tileMode in [3, 7, 11, 13, 15]:
         return 4
 
@@ -140,7 +356,8 @@ cdef u32 computeSurfaceThickness(u32 tileMode):
     return 1
 
 
-cdef u32 computePixelIndexWithinMicroTile(u32 x, u32 y, u32 bpp):
+cdef u32 computePixelIndexXYWithinMicroTile(u32 x, u32 y, u32 bpp):
+    # Only used for building pixelIndexTables
     if bpp == 0x08:
         return (32 * ((y & 4) >> 2) | 16 * (y & 1) | 8 * ((y & 2) >> 1) |
                 4 * ((x & 4) >> 2) | 2 * ((x & 2) >> 1) | x & 1)
@@ -149,10 +366,6 @@ cdef u32 computePixelIndexWithinMicroTile(u32 x, u32 y, u32 bpp):
         return (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * (y & 1) |
                 4 * ((x & 4) >> 2) | 2 * ((x & 2) >> 1) | x & 1)
 
-    elif bpp in [0x20, 0x60]:
-        return (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
-                4 * (y & 1) | 2 * ((x & 2) >> 1) | x & 1)
-
     elif bpp == 0x40:
         return (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
                 4 * ((x & 2) >> 1) | 2 * (y & 1) | x & 1)
@@ -166,29 +379,121 @@ cdef u32 computePixelIndexWithinMicroTile(u32 x, u32 y, u32 bpp):
                 4 * (y & 1) | 2 * ((x & 2) >> 1) | x & 1)
 
 
-cdef u32 computePipeFromCoordWoRotation(u32 x, u32 y):
-    return ((y >> 3) ^ (x >> 3)) & 1
+# The pixel index within a micro tile only depends on the lowest 3 bits of x, y and z,
+# so it's read from tables instead of shuffling bits for every pixel:
+# pixelIndexTables[bpp class][(y & 7) << 3 | x & 7] | pixelBitsZ[thickness >> 2][z & 7]
+cdef u32 pixelIndexTables[5][64]
+
+# Thick tiles hold 4 (or 8) slices, z picks the slice
+cdef u32 pixelBitsZ[3][8]
+
+# The elements of every row of a micro tile that follow each other in it too, so 1D tiled surfaces
+# are copied a run at a time: microTileRunCount[bpp class][y] runs, starting at microTileRunX[bpp class][y][run]
+cdef u8 microTileRunCount[5][8]
+cdef u8 microTileRunX[5][8][8]
+cdef u8 microTileRunLength[5][8][8]
+
+# The pipe depends on bit 3 of x and y, the bank on bits 3-4 of x and bits 4-5 of y
+cdef u8 pipeTable[256]
+cdef u8 bankTable[2048]
+
+
+cdef void initTables():
+    cdef:
+        u32 bppClasses[5]
+        u32 i, x, y, z, n
+
+    bppClasses[:] = [0x08, 0x10, 0x20, 0x40, 0x80]
+
+    for i in range(5):
+        for y in range(8):
+            for x in range(8):
+                pixelIndexTables[i][y << 3 | x] = computePixelIndexXYWithinMicroTile(x, y, bppClasses[i])
+
+            n = 0
+            for x in range(8):
+                if n and (pixelIndexTables[i][y << 3 | microTileRunX[i][y][n - 1]] + microTileRunLength[i][y][n - 1]
+                          == pixelIndexTables[i][y << 3 | x]):
+                    microTileRunLength[i][y][n - 1] += 1
+
+                else:
+                    microTileRunX[i][y][n] = x
+                    microTileRunLength[i][y][n] = 1
+                    n += 1
+
+            microTileRunCount[i][y] = n
+
+    for z in range(8):
+        pixelBitsZ[0][z] = 0
+        pixelBitsZ[1][z] = 128 * ((z & 2) >> 1) | 64 * (z & 1)
+        pixelBitsZ[2][z] = 256 * ((z & 4) >> 2) | 128 * ((z & 2) >> 1) | 64 * (z & 1)
+
+    for y in range(16):
+        for x in range(16):
+            pipeTable[y << 4 | x] = ((y >> 3) ^ (x >> 3)) & 1
+
+    for y in range(64):
+        for x in range(32):
+            bankTable[y << 5 | x] = ((y >> 5) ^ (x >> 3)) & 1 | 2 * (((y >> 4) ^ (x >> 4)) & 1)
+
+
+initTables()
+
+
+cdef inline u32 microTileBppClass(u32 bpp) noexcept nogil:
+    if bpp == 0x08:
+        return 0
+
+    elif bpp == 0x10:
+        return 1
+
+    elif bpp == 0x40:
+        return 3
+
+    elif bpp == 0x80:
+        return 4
+
+    return 2
+
 
+cdef u32 computePixelIndexWithinMicroTile(u32 x, u32 y, u32 z, u32 bpp, u32 tileMode) noexcept nogil:
+    return (pixelBitsZ[computeSurfaceThickness(tileMode) >> 2][z & 7]
+            | pixelIndexTables[microTileBppClass(bpp)][(y & 7) << 3 | x & 7])
 
-cdef u32 computeBankFromCoordWoRotation(u32 x, u32 y):
-    return ((y >> 5) ^ (x >> 3)) & 1 | 2 * (((y >> 4) ^ (x >> 4)) & 1)
 
+cdef u32 computePipeFromCoordWoRotation(u32 x, u32 y) noexcept nogil:
+    return pipeTable[(y & 15) << 4 | x & 15]
 
-cdef u32 isThickMacroTiled(u32 tileMode):
+
+cdef u32 computeBankFromCoordWoRotation(u32 x, u32 y) noexcept nogil:
+    return bankTable[(y & 63) << 5 | x & 31]
+
+
+cdef u32 computeSurfaceRotationFromTileMode(u32 tileMode) noexcept nogil:
+    if tileMode in [4, 5, 6, 7, 8, 9, 10, 11]:
+        return 2
+
+    elif tileMode in [12, 13, 14, 15]:
+        return 1
+
+    return 0
+
+
+cdef u32 isThickMacroTiled(u32 tileMode) noexcept nogil:
     if tileMode in [7, 11, 13, 15]:
         return 1
 
     return 0
 
 
-cdef u32 isBankSwappedTileMode(u32 tileMode):
+cdef u32 isBankSwappedTileMode(u32 tileMode) noexcept nogil:
     if tileMode in [8, 9, 10, 11, 14, 15]:
         return 1
 
     return 0
 
 
-cdef u32 computeMacroTileAspectRatio(u32 tileMode):
+cdef u32 computeMacroTileAspectRatio(u32 tileMode) noexcept nogil:
     if tileMode in [5, 9]:
         return 2
 
@@ -198,7 +503,7 @@ cdef u32 computeMacroTileAspectRatio(u32 tileMode):
     return 1
 
 
-cdef u32 computeSurfaceBankSwappedWidth(u32 tileMode, u32 bpp, u32 pitch, u32 numSamples):
+cdef u32 computeSurfaceBankSwappedWidth(u32 tileMode, u32 bpp, u32 pitch, u32 numSamples) noexcept nogil:
     if isBankSwappedTileMode(tileMode) == 0:
         return 0
 
@@ -235,8 +540,8 @@ cdef u32 computeSurfaceBankSwappedWidth(u32 tileMode, u32 bpp, u32 pitch, u32 nu
     return bankSwapWidth
 
 
-cdef u64 computeSurfaceAddrFromCoordMicroTiled(u32 x, u32 y, u32 bpp, u32 pitch,
-                                                       u32 tileMode):
+cdef u64 computeSurfaceAddrFromCoordMicroTiled(u32 x, u32 y, u32 slice_, u32 bpp, u32 pitch,
+                                                       u32 height, u32 tileMode) noexcept nogil:
     cdef int microTileThickness = 1
 
     if tileMode == 3:
@@ -247,21 +552,25 @@ cdef u64 computeSurfaceAddrFromCoordMicroTiled(u32 x, u32 y, u32 bpp, u32 pitch,
         u32 microTilesPerRow = pitch >> 3
         u32 microTileIndexX = x >> 3
         u32 microTileIndexY = y >> 3
+        u32 microTileIndexZ = slice_ // microTileThickness
 
-        u64 microTileOffset = microTileBytes * (microTileIndexX + microTileIndexY * microTilesPerRow)
-        u32 pixelIndex = computePixelIndexWithinMicroTile(x, y, bpp)
+        u64 microTileOffset = <u64>microTileBytes * (microTileIndexX + microTileIndexY * microTilesPerRow)
+        u64 sliceBytes = (<u64>pitch * height * microTileThickness * bpp + 7) // 8
+        u64 sliceOffset = microTileIndexZ * sliceBytes
+
+        u32 pixelIndex = computePixelIndexWithinMicroTile(x, y, slice_, bpp, tileMode)
         u64 pixelOffset = (bpp * pixelIndex) >> 3
 
-    return pixelOffset + microTileOffset
+    return pixelOffset + microTileOffset + sliceOffset
 
 
 cdef u8 bankSwapOrder[10]
 bankSwapOrder[:] = [0, 1, 3, 2, 6, 7, 5, 4, 0, 0]
 
 
-cdef u64 computeSurfaceAddrFromCoordMacroTiled(u32 x, u32 y, u32 bpp, u32 pitch, u32 height,
+cdef u64 computeSurfaceAddrFromCoordMacroTiled(u32 x, u32 y, u32 slice_, u32 bpp, u32 pitch, u32 height,
                                                        u32 tileMode, u32 pipeSwizzle,
-                                                       u32 bankSwizzle):
+                                                       u32 bankSwizzle) noexcept nogil:
 
     cdef:
         u32 sampleSlice, numSamples, samplesPerSlice
@@ -272,13 +581,14 @@ cdef u64 computeSurfaceAddrFromCoordMacroTiled(u32 x, u32 y, u32 bpp, u32 pitch,
         u32 microTileBits = bpp * (microTileThickness * 64)
         u32 microTileBytes = (microTileBits + 7) // 8
 
-        u32 pixelIndex = computePixelIndexWithinMicroTile(x, y, bpp)
+        u32 pixelIndex = computePixelIndexWithinMicroTile(x, y, slice_, bpp, tileMode)
         u64 elemOffset = bpp * pixelIndex
 
         u32 bytesPerSample = microTileBytes
 
     if microTileBytes <= 2048:
         numSamples = 1
+        numSampleSplits = 1
         sampleSlice = 0
 
     else:
@@ -290,19 +600,25 @@ cdef u64 computeSurfaceAddrFromCoordMacroTiled(u32 x, u32 y, u32 bpp, u32 pitch,
 
     elemOffset = (elemOffset + 7) // 8
 
+    # Every slice (every group of 4 slices for thick tile modes) is rotated to a different pipe and bank
+    cdef u32 sliceIn = slice_
+    if isThickMacroTiled(tileMode):
+        sliceIn >>= 2
+
     cdef:
         u32 pipe = computePipeFromCoordWoRotation(x, y)
         u32 bank = computeBankFromCoordWoRotation(x, y)
 
         u32 swizzle_ = pipeSwizzle + 2 * bankSwizzle
-        u32 bankPipe = ((pipe + 2 * bank) ^ (6 * sampleSlice ^ swizzle_)) % 8
+        u32 rotation = computeSurfaceRotationFromTileMode(tileMode)
+        u32 bankPipe = ((pipe + 2 * bank) ^ (6 * sampleSlice ^ (swizzle_ + sliceIn * rotation))) % 8
 
     pipe = bankPipe % 2
     bank = bankPipe // 2
 
     cdef:
-        u32 sliceBytes = (height * pitch * microTileThickness * bpp * numSamples + 7) // 8
-        u32 sliceOffset = sliceBytes * (sampleSlice // microTileThickness)
+        u64 sliceBytes = (<u64>height * pitch * microTileThickness * bpp * numSamples + 7) // 8
+        u64 sliceOffset = sliceBytes * ((sampleSlice + numSampleSplits * slice_) // microTileThickness)
 
         u32 macroTilePitch = 32
         u32 macroTileHeight = 16
@@ -332,6 +648,122 @@ cdef u64 computeSurfaceAddrFromCoordMacroTiled(u32 x, u32 y, u32 bpp, u32 pitch,
     return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
 
 
+cdef u64 computeSurfaceAddrFromCoord(u32 x, u32 y, u32 slice_, u32 bpp, u32 pitch, u32 height, u32 tileMode,
+                                     u32 pipeSwizzle, u32 bankSwizzle) noexcept nogil:
+    if tileMode == 0 or tileMode == 1:
+        return ((<u64>slice_ * height + y) * pitch + x) * (bpp // 8)
+
+    elif tileMode == 2 or tileMode == 3:
+        return computeSurfaceAddrFromCoordMicroTiled(x, y, slice_, bpp, pitch, height, tileMode)
+
+    return computeSurfaceAddrFromCoordMacroTiled(x, y, slice_, bpp, pitch, height, tileMode,
+                                                 pipeSwizzle, bankSwizzle)
+
+
+@cython.final
+cdef class SwizzleContext:
+    # What computeSurfaceAddrFromCoord works out from the surface alone (thickness, tile and slice sizes,
+    # rotation, bank swapped width...), computed once per surface and mip level instead of for every element.
+    # computeAddr(x, y, slice_) returns the same address as computeSurfaceAddrFromCoord, and runs without the GIL.
+    cdef:
+        u32 bpp, pitch, height, tileMode, thickness, bytesPerPixel, bppClass
+        const u32 *pixelBitsZ
+        const u32 *pixelIndexTable
+        u32 microTileBytes, microTilesPerRow
+        u32 numSampleSplits, sampleBits, sliceShift, swizzle, rotation
+        u32 macroTilePitch, macroTileHeight, macroTilesPerRow, macroTileBytes, bankSwapWidth
+        u64 sliceBytes
+
+    def __init__(self, u32 bpp, u32 pitch, u32 height, u32 tileMode, u32 swizzle_):
+        cdef u32 microTileBits, microTileBytes, numSamples, aspectRatio
+
+        self.bpp = bpp
+        self.pitch = pitch
+        self.height = height
+        self.tileMode = tileMode
+        self.bytesPerPixel = bpp // 8
+
+        self.thickness = computeSurfaceThickness(tileMode)
+        self.pixelBitsZ = pixelBitsZ[self.thickness >> 2]
+        self.bppClass = microTileBppClass(bpp)
+        self.pixelIndexTable = pixelIndexTables[self.bppClass]
+
+        if tileMode == 2 or tileMode == 3:
+            self.microTileBytes = (64 * self.thickness * bpp + 7) // 8
+            self.microTilesPerRow = pitch >> 3
+            self.sliceBytes = (<u64>pitch * height * self.thickness * bpp + 7) // 8
+
+        elif tileMode > 3:
+            microTileBits = bpp * (self.thickness * 64)
+            microTileBytes = (microTileBits + 7) // 8
+            self.numSampleSplits = 1
+
+            if microTileBytes <= 2048:
+                numSamples = 1
+                self.sampleBits = 0
+
+            else:
+                numSamples = 2048 // microTileBytes
+                self.sampleBits = microTileBits
+
+            self.sliceShift = 2 if isThickMacroTiled(tileMode) else 0
+            self.swizzle = ((swizzle_ >> 8) & 1) + 2 * ((swizzle_ >> 9) & 3)
+            self.rotation = computeSurfaceRotationFromTileMode(tileMode)
+            self.sliceBytes = (<u64>height * pitch * self.thickness * bpp * numSamples + 7) // 8
+
+            aspectRatio = computeMacroTileAspectRatio(tileMode)
+            self.macroTilePitch = 32 // aspectRatio
+            self.macroTileHeight = 16 * aspectRatio
+            self.macroTilesPerRow = pitch // self.macroTilePitch
+            self.macroTileBytes = (numSamples * self.thickness * bpp * self.macroTileHeight
+                                   * self.macroTilePitch + 7) // 8
+
+            # 0 if the tile mode isn't bank swapped
+            self.bankSwapWidth = computeSurfaceBankSwappedWidth(tileMode, bpp, pitch, 1)
+
+    cpdef u64 computeAddr(self, u32 x, u32 y, u32 slice_) noexcept nogil:
+        cdef:
+            u32 pixelIndex, sampleSlice, bankPipe, pipe, bank, macroTileIndexX
+            u64 elemOffset, sliceOffset, macroTileOffset, totalOffset
+
+        if self.tileMode == 0 or self.tileMode == 1:
+            return ((<u64>slice_ * self.height + y) * self.pitch + x) * self.bytesPerPixel
+
+        pixelIndex = self.pixelBitsZ[slice_ & 7] | self.pixelIndexTable[(y & 7) << 3 | x & 7]
+
+        if self.tileMode == 2 or self.tileMode == 3:
+            return (((self.bpp * pixelIndex) >> 3)
+                    + <u64>self.microTileBytes * ((x >> 3) + (y >> 3) * self.microTilesPerRow)
+                    + (slice_ // self.thickness) * self.sliceBytes)
+
+        elemOffset = self.bpp * pixelIndex
+        sampleSlice = 0
+
+        if self.sampleBits:
+            sampleSlice = elemOffset // self.sampleBits
+            elemOffset %= self.sampleBits
+
+        elemOffset = (elemOffset + 7) // 8
+
+        bankPipe = ((pipeTable[(y & 15) << 4 | x & 15] + 2 * bankTable[(y & 63) << 5 | x & 31])
+                    ^ (6 * sampleSlice ^ (self.swizzle + (slice_ >> self.sliceShift) * self.rotation))) % 8
+
+        pipe = bankPipe % 2
+        bank = bankPipe // 2
+
+        sliceOffset = self.sliceBytes * ((sampleSlice + self.numSampleSplits * slice_) // self.thickness)
+
+        macroTileIndexX = x // self.macroTilePitch
+        macroTileOffset = ((macroTileIndexX + self.macroTilesPerRow * (y // self.macroTileHeight))
+                           * self.macroTileBytes)
+
+        if self.bankSwapWidth:
+            bank ^= bankSwapOrder[(self.macroTilePitch * macroTileIndexX // self.bankSwapWidth) & 3]
+
+        totalOffset = elemOffset + ((macroTileOffset + sliceOffset) >> 3)
+        return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
+
+
 cdef:
     u32 expPitch = 0
     u32 expHeight = 0
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# reference.py
+# A frozen copy of the per-element address and swizzle functions of addrlib.py,
+# as of the commit that added verify.py (e45f540), before the fast paths replaced them.
+# verify.py checks every backend against it, so it mustn't be optimized or changed along with addrlib.py.
+# The surface info functions weren't changed by the fast paths, they are only in addrlib.py.
+
+
+################################################################
+################################################################
+
+BCn_formats = [
+    0x31, 0x431, 0x32, 0x432,
+    0x33, 0x433, 0x34, 0x234,
+    0x35, 0x235,
+]
+
+
+def swizzleSurf(width, height, height_, format_, tileMode, swizzle_,
+                pitch, bitsPerPixel, data, swizzle, depth=1):
+
+    bytesPerPixel = bitsPerPixel // 8
+    result = bytearray(len(data))
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    pipeSwizzle = (swizzle_ >> 8) & 1
+    bankSwizzle = (swizzle_ >> 9) & 3
+
+    # The slices (of 3D, cube and array surfaces) are stored one after the other in the linear data
+    for z in range(depth):
+        for y in range(height):
+            for x in range(width):
+                if tileMode in [0, 1]:
+                    pos = ((z * height_ + y) * pitch + x) * bytesPerPixel
+
+                elif tileMode in [2, 3]:
+                    pos = computeSurfaceAddrFromCoordMicroTiled(x, y, z, bitsPerPixel, pitch, height_, tileMode)
+
+                else:
+                    pos = computeSurfaceAddrFromCoordMacroTiled(x, y, z, bitsPerPixel, pitch, height_, tileMode,
+                                                                pipeSwizzle, bankSwizzle)
+
+                pos_ = ((z * height + y) * width + x) * bytesPerPixel
+
+                if pos_ + bytesPerPixel <= len(data) and pos + bytesPerPixel <= len(data):
+                    if swizzle == 0:
+                        result[pos_:pos_ + bytesPerPixel] = data[pos:pos + bytesPerPixel]
+
+                    else:
+                        result[pos:pos + bytesPerPixel] = data[pos_:pos_ + bytesPerPixel]
+
+    return bytes(result)
+
+
+def deswizzle(width, height, height_, format_, tileMode, swizzle_,
+              pitch, bpp, data, depth=1):
+
+    return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, 0, depth)
+
+
+def swizzle(width, height, height_, format_, tileMode, swizzle_,
+            pitch, bpp, data, depth=1):
+
+    return swizzleSurf(width, height, height_, format_, tileMode, swizzle_, pitch, bpp, data, 1, depth)
+
+
+def computeSurfaceThickness(tileMode):
+    if tileMode in [3, 7, 11, 13, 15]:
+        return 4
+
+    elif tileMode in [16, 17]:
+        return 8
+
+    return 1
+
+
+def computePixelIndexWithinMicroTile(x, y, z, bpp, tileMode):
+    # Thick tiles hold 4 (or 8) slices, z picks the slice
+    thickness = computeSurfaceThickness(tileMode)
+
+    if thickness == 1:
+        pixelBitZ = 0
+
+    elif thickness == 4:
+        pixelBitZ = 128 * ((z & 2) >> 1) | 64 * (z & 1)
+
+    else:
+        pixelBitZ = 256 * ((z & 4) >> 2) | 128 * ((z & 2) >> 1) | 64 * (z & 1)
+
+    if bpp == 0x08:
+        return pixelBitZ | (32 * ((y & 4) >> 2) | 16 * (y & 1) | 8 * ((y & 2) >> 1) |
+                            4 * ((x & 4) >> 2) | 2 * ((x & 2) >> 1) | x & 1)
+
+    elif bpp == 0x10:
+        return pixelBitZ | (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * (y & 1) |
+                            4 * ((x & 4) >> 2) | 2 * ((x & 2) >> 1) | x & 1)
+
+    elif bpp in [0x20, 0x60]:
+        return pixelBitZ | (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
+                            4 * (y & 1) | 2 * ((x & 2) >> 1) | x & 1)
+
+    elif bpp == 0x40:
+        return pixelBitZ | (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
+                            4 * ((x & 2) >> 1) | 2 * (y & 1) | x & 1)
+
+    elif bpp == 0x80:
+        return pixelBitZ | (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
+                            4 * ((x & 2) >> 1) | 2 * (x & 1) | y & 1)
+
+    else:
+        return pixelBitZ | (32 * ((y & 4) >> 2) | 16 * ((y & 2) >> 1) | 8 * ((x & 4) >> 2) |
+                            4 * (y & 1) | 2 * ((x & 2) >> 1) | x & 1)
+
+
+def computePipeFromCoordWoRotation(x, y):
+    return ((y >> 3) ^ (x >> 3)) & 1
+
+
+def computeBankFromCoordWoRotation(x, y):
+    return ((y >> 5) ^ (x >> 3)) & 1 | 2 * (((y >> 4) ^ (x >> 4)) & 1)
+
+
+def computeSurfaceRotationFromTileMode(tileMode):
+    if tileMode in [4, 5, 6, 7, 8, 9, 10, 11]:
+        return 2
+
+    elif tileMode in [12, 13, 14, 15]:
+        return 1
+
+    return 0
+
+
+def isThickMacroTiled(tileMode):
+    if tileMode in [7, 11, 13, 15]:
+        return 1
+
+    return 0
+
+
+def isBankSwappedTileMode(tileMode):
+    if tileMode in [8, 9, 10, 11, 14, 15]:
+        return 1
+
+    return 0
+
+
+def computeMacroTileAspectRatio(tileMode):
+    if tileMode in [5, 9]:
+        return 2
+
+    elif tileMode in [6, 10]:
+        return 4
+
+    return 1
+
+
+def computeSurfaceBankSwappedWidth(tileMode, bpp, pitch, numSamples=1):
+    if isBankSwappedTileMode(tileMode) == 0:
+        return 0
+
+    bytesPerSample = 8 * bpp
+
+    if bytesPerSample != 0:
+        samplesPerTile = 2048 // bytesPerSample
+        slicesPerTile = max(1, numSamples // samplesPerTile)
+
+    else:
+        slicesPerTile = 1
+
+    if isThickMacroTiled(tileMode) != 0:
+        numSamples = 4
+
+    bytesPerTileSlice = numSamples * bytesPerSample // slicesPerTile
+
+    factor = computeMacroTileAspectRatio(tileMode)
+    swapTiles = max(1, 128 // bpp)
+
+    swapWidth = swapTiles * 32
+    heightBytes = numSamples * factor * bpp * 2 // slicesPerTile
+    swapMax = 0x4000 // heightBytes
+    swapMin = 256 // bytesPerTileSlice
+
+    bankSwapWidth = min(swapMax, max(swapMin, swapWidth))
+    while bankSwapWidth >= 2 * pitch:
+        bankSwapWidth >>= 1
+
+    return bankSwapWidth
+
+
+def computeSurfaceAddrFromCoordMicroTiled(x, y, slice_, bpp, pitch, height, tileMode):
+    microTileThickness = 1
+
+    if tileMode == 3:
+        microTileThickness = 4
+
+    microTileBytes = (64 * microTileThickness * bpp + 7) // 8
+    microTilesPerRow = pitch >> 3
+    microTileIndexX = x >> 3
+    microTileIndexY = y >> 3
+    microTileIndexZ = slice_ // microTileThickness
+
+    microTileOffset = microTileBytes * (microTileIndexX + microTileIndexY * microTilesPerRow)
+    sliceBytes = (pitch * height * microTileThickness * bpp + 7) // 8
+    sliceOffset = microTileIndexZ * sliceBytes
+
+    pixelIndex = computePixelIndexWithinMicroTile(x, y, slice_, bpp, tileMode)
+    pixelOffset = (bpp * pixelIndex) >> 3
+
+    return pixelOffset + microTileOffset + sliceOffset
+
+
+bankSwapOrder = [0, 1, 3, 2, 6, 7, 5, 4, 0, 0]
+
+
+def computeSurfaceAddrFromCoordMacroTiled(x, y, slice_, bpp, pitch, height,
+                                          tileMode, pipeSwizzle,
+                                          bankSwizzle):
+
+    microTileThickness = computeSurfaceThickness(tileMode)
+
+    microTileBits = bpp * (microTileThickness * 64)
+    microTileBytes = (microTileBits + 7) // 8
+
+    pixelIndex = computePixelIndexWithinMicroTile(x, y, slice_, bpp, tileMode)
+    elemOffset = bpp * pixelIndex
+
+    bytesPerSample = microTileBytes
+
+    if microTileBytes <= 2048:
+        numSamples = 1
+        numSampleSplits = 1
+        sampleSlice = 0
+
+    else:
+        samplesPerSlice = 2048 // bytesPerSample
+        numSampleSplits = max(1, 1 // samplesPerSlice)
+        numSamples = samplesPerSlice
+        sampleSlice = elemOffset // (microTileBits // numSampleSplits)
+        elemOffset %= microTileBits // numSampleSplits
+
+    elemOffset = (elemOffset + 7) // 8
+
+    pipe = computePipeFromCoordWoRotation(x, y)
+    bank = computeBankFromCoordWoRotation(x, y)
+
+    # Every slice (every group of 4 slices for thick tile modes) is rotated to a different pipe and bank
+    sliceIn = slice_
+    if isThickMacroTiled(tileMode):
+        sliceIn >>= 2
+
+    swizzle_ = pipeSwizzle + 2 * bankSwizzle
+    rotation = computeSurfaceRotationFromTileMode(tileMode)
+    bankPipe = ((pipe + 2 * bank) ^ (6 * sampleSlice ^ (swizzle_ + sliceIn * rotation))) % 8
+
+    pipe = bankPipe % 2
+    bank = bankPipe // 2
+
+    sliceBytes = (height * pitch * microTileThickness * bpp * numSamples + 7) // 8
+    sliceOffset = sliceBytes * ((sampleSlice + numSampleSplits * slice_) // microTileThickness)
+
+    macroTilePitch = 32
+    macroTileHeight = 16
+
+    if tileMode in [5, 9]:  # GX2_TILE_MODE_2D_TILED_THIN2 and GX2_TILE_MODE_2B_TILED_THIN2
+        macroTilePitch >>= 1
+        macroTileHeight *= 2
+
+    elif tileMode in [6, 10]:  # GX2_TILE_MODE_2D_TILED_THIN4 and GX2_TILE_MODE_2B_TILED_THIN4
+        macroTilePitch >>= 2
+        macroTileHeight *= 4
+
+    macroTilesPerRow = pitch // macroTilePitch
+    macroTileBytes = (numSamples * microTileThickness * bpp * macroTileHeight
+                      * macroTilePitch + 7) // 8
+    macroTileIndexX = x // macroTilePitch
+    macroTileIndexY = y // macroTileHeight
+    macroTileOffset = (macroTileIndexX + macroTilesPerRow * macroTileIndexY) * macroTileBytes
+
+    if tileMode in [8, 9, 10, 11, 14, 15]:
+        bankSwapWidth = computeSurfaceBankSwappedWidth(tileMode, bpp, pitch, 1)
+        swapIndex = macroTilePitch * macroTileIndexX // bankSwapWidth
+        bank ^= bankSwapOrder[swapIndex & 3]
+
+    totalOffset = elemOffset + ((macroTileOffset + sliceOffset) >> 3)
+    return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
+
+
+def computeSurfaceAddrFromCoord(x, y, slice_, bpp, pitch, height, tileMode, pipeSwizzle, bankSwizzle):
+    if tileMode in [0, 1]:
+        return ((slice_ * height + y) * pitch + x) * (bpp // 8)
+
+    elif tileMode in [2, 3]:
+        return computeSurfaceAddrFromCoordMicroTiled(x, y, slice_, bpp, pitch, height, tileMode)
+
+    return computeSurfaceAddrFromCoordMacroTiled(x, y, slice_, bpp, pitch, height, tileMode,
+                                                 pipeSwizzle, bankSwizzle)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Addrlib
+# Copyright © 2018 AboodXD
+
+"""verify.py: Differential check of every swizzling backend against reference.py.
+
+    python3 -m addrlib.verify [-seed <n>] [-count <n>] [-start <n>] [-maxSize <n>]
+
+Random surfaces (every format, tile modes 0 to 16, swizzle values, dims, odd sizes and mipmap levels)
+are swizzled and deswizzled by every backend and fast path, and compared with reference.py,
+a frozen copy of the address functions of addrlib.py that doesn't change along with it.
+The surface info comes from addrlib.py, the other engines are checked against it.
+Every case has its own seed, so a failing one can be run again on its own with -start <case> -count 1.
+"""
+
+import random
+import sys
+import time
+
+import addrlib
+from addrlib import reference
+
+addrlib_py = addrlib.addrlib_py
+
+################################################################
+################################################################
+
+# Formats with a bpp addrlib knows, except the 96 bpp ones, which are stored expanded to 3 32 bpp elements
+FORMATS = [format_ for format_ in range(1, 0x40) if addrlib_py.surfaceGetBitsPerPixel(format_) not in [0, 96]]
+
+TILE_MODES = list(range(17))
+
+# 2D, 3D, cube and 2D array surfaces
+DIMS = [1, 2, 3, 5]
+
+# The surface info fields the swizzling backends and gtx_extract use
+SURFACE_FIELDS = ['pitch', 'height', 'depth', 'surfSize', 'tileMode', 'baseAlign', 'bpp', 'sliceSize']
+
+
+class Mismatch(Exception):
+    pass
+
+
+class Case:
+    """
+    A random surface: format, size, dim, mipmap level, tile mode and swizzle value,
+    with its surface info (from addrlib.py) and random linear data.
+    """
+    def __init__(self, seed, maxSize):
+        rng = random.Random(seed)
+
+        self.format_ = rng.choice(FORMATS)
+        self.tileMode = rng.choice(TILE_MODES)
+        self.swizzle_ = rng.randrange(8) << 8 | (0 if self.tileMode in [1, 2, 3, 16] else 0xd0000)
+        self.dim = rng.choice(DIMS)
+
+        # Mostly odd and non power of 2 sizes, where the padding is the most likely to go wrong
+        self.width = rng.choice([rng.randrange(1, maxSize + 1) | 1, rng.randrange(1, maxSize + 1), 1 << rng.randrange(7)])
+        self.height = rng.choice([rng.randrange(1, maxSize + 1) | 1, rng.randrange(1, maxSize + 1), 1 << rng.randrange(7)])
+
+        if self.dim == 3:
+            self.depth = 6
+            self.height = self.width
+
+        elif self.dim in [2, 5]:
+            self.depth = rng.randrange(1, 9)
+
+        else:
+            self.depth = 1
+
+        self.mipLevel = rng.choice([0, 0, 0, 1, 2])
+
+        self.surfOut = addrlib_py.getSurfaceInfo(self.format_, self.width, self.height, self.depth, self.dim,
+                                                 self.tileMode, 0, self.mipLevel)
+
+        self.mipWidth = max(1, self.width >> self.mipLevel)
+        self.mipHeight = max(1, self.height >> self.mipLevel)
+
+        if self.dim == 2:
+            self.numSlices = max(1, self.depth >> self.mipLevel)
+
+        else:
+            self.numSlices = self.depth
+
+        if self.format_ in reference.BCn_formats:
+            self.elemWidth = (self.mipWidth + 3) // 4
+            self.elemHeight = (self.mipHeight + 3) // 4
+
+        else:
+            self.elemWidth = self.mipWidth
+            self.elemHeight = self.mipHeight
+
+        self.bytesPerPixel = self.surfOut.bpp // 8
+        self.size = self.surfOut.surfSize
+        self.linearSize = self.elemWidth * self.elemHeight * self.numSlices * self.bytesPerPixel
+        self.linear = (rng.getrandbits(self.linearSize * 8).to_bytes(self.linearSize, 'little')
+                       + bytes(self.size - self.linearSize))
+        self.rng = rng
+
+    def args(self, data):
+        surfOut = self.surfOut
+        return (self.mipWidth, self.mipHeight, surfOut.height, self.format_, surfOut.tileMode, self.swizzle_,
+                surfOut.pitch, surfOut.bpp, data, self.numSlices)
+
+    def describe(self):
+        return ("format " + hex(self.format_) + ", tileMode " + str(self.tileMode) + " (" + str(self.surfOut.tileMode)
+                + " at this level), swizzle " + hex(self.swizzle_) + ", dim " + str(self.dim) + ", "
+                + str(self.width) + "x" + str(self.height) + "x" + str(self.depth) + ", mip " + str(self.mipLevel))
+
+    def address(self, x, y, z):
+        surfOut = self.surfOut
+        return reference.computeSurfaceAddrFromCoord(x, y, z, surfOut.bpp, surfOut.pitch, surfOut.height,
+                                                     surfOut.tileMode, (self.swizzle_ >> 8) & 1,
+                                                     (self.swizzle_ >> 9) & 3)
+
+    def texel(self, element):
+        x = element % self.elemWidth
+        y = element // self.elemWidth % self.elemHeight
+        z = element // (self.elemWidth * self.elemHeight)
+        return x, y, z
+
+    def checkLinear(self, name, result, expected):
+        # Only the elements of the surface are compared, the rest of the linear data is padding
+        result = bytes(result[:self.linearSize])
+        expected = bytes(expected[:self.linearSize])
+
+        if result != expected:
+            pos = next(i for i in range(self.linearSize) if result[i] != expected[i])
+            x, y, z = self.texel(pos // self.bytesPerPixel)
+
+            raise Mismatch(name + ": texel " + str((x, y, z)) + " at address " + hex(self.address(x, y, z))
+                           + " differs")
+
+    def checkSwizzled(self, name, result, expected):
+        if bytes(result) != bytes(expected):
+            pos = next(i for i in range(min(len(result), len(expected))) if result[i] != expected[i])
+            pos -= pos % self.bytesPerPixel
+
+            texel = None
+            for element in range(self.linearSize // self.bytesPerPixel):
+                if self.address(*self.texel(element)) == pos:
+                    texel = self.texel(element)
+                    break
+
+            raise Mismatch(name + ": address " + hex(pos) + " (texel " + str(texel) + ") differs"
+                           + ("" if len(result) == len(expected) else ", size " + str(len(result))
+                              + " instead of " + str(len(expected))))
+
+
+def getEngines():
+    """
+    The address library modules whose fast paths are checked, name -> module.
+    """
+    engines = {'python': addrlib_py}
+
+    if addrlib.addrlib is not addrlib_py:
+        engines['cython'] = addrlib.addrlib
+
+    return engines
+
+
+def checkCase(case):
+    """
+    Run every check on a case, raises Mismatch on the first difference. Returns the number of checks.
+    """
+    swizzled = reference.swizzle(*case.args(case.linear))
+    checks = 0
+
+    for name, (deswizzle, swizzle) in addrlib.backends.items():
+        result = swizzle(*case.args(case.linear))
+        case.checkSwizzled(name + " swizzle", result, swizzled)
+        case.checkLinear(name + " round trip", deswizzle(*case.args(result)), case.linear)
+        case.checkLinear(name + " deswizzle", deswizzle(*case.args(swizzled)), case.linear)
+        checks += 3
+
+    surfOut = case.surfOut
+
+    for name, engine in getEngines().items():
+        # The surface info every backend is called with
+        engineSurfOut = engine.getSurfaceInfo(case.format_, case.width, case.height, case.depth, case.dim,
+                                              case.tileMode, 0, case.mipLevel)
+
+        for field in SURFACE_FIELDS:
+            if getattr(engineSurfOut, field) != getattr(surfOut, field):
+                raise Mismatch(name + " getSurfaceInfo: " + field + " " + str(getattr(engineSurfOut, field))
+                               + " instead of " + str(getattr(surfOut, field)))
+
+        # The addresses of the swizzle context, which every swizzling loop uses,
+        # against the ones computed from scratch for every element
+        context = engine.SwizzleContext(surfOut.bpp, surfOut.pitch, surfOut.height, surfOut.tileMode, case.swizzle_)
+
+        for element in range(case.linearSize // case.bytesPerPixel):
+            x, y, z = case.texel(element)
+            pos = context.computeAddr(x, y, z)
+
+            if pos != case.address(x, y, z):
+                raise Mismatch(name + " SwizzleContext: texel " + str((x, y, z)) + " at " + hex(pos) + " instead of "
+                               + hex(case.address(x, y, z)))
+
+        # Every tile swizzled separately
+        tiles = [(x, y, z) for z in range(case.numSlices)
+                 for y in range(0, case.elemHeight, 8) for x in range(0, case.elemWidth, 8)]
+
+        result = bytearray(case.size)
+        engine.swizzleTiles(case.mipWidth, case.mipHeight, surfOut.height, case.format_, surfOut.tileMode,
+                            case.swizzle_, surfOut.pitch, surfOut.bpp, case.linear, result, tiles)
+
+        case.checkSwizzled(name + " swizzleTiles", result, swizzled)
+
+        # A random region of a random slice, and a texel in it
+        z = case.rng.randrange(case.numSlices)
+        x = case.rng.randrange(case.mipWidth)
+        y = case.rng.randrange(case.mipHeight)
+        w = case.rng.randrange(1, case.mipWidth - x + 1)
+        h = case.rng.randrange(1, case.mipHeight - y + 1)
+
+        result = engine.deswizzleRegion(x, y, w, h, z, surfOut.height, case.format_, surfOut.tileMode,
+                                        case.swizzle_, surfOut.pitch, surfOut.bpp, swizzled)
+
+        if case.format_ in reference.BCn_formats:
+            x0, y0, x1, y1 = x // 4, y // 4, (x + w + 3) // 4, (y + h + 3) // 4
+
+        else:
+            x0, y0, x1, y1 = x, y, x + w, y + h
+
+        rowSize = case.elemWidth * case.bytesPerPixel
+        sliceStart = z * case.elemHeight * rowSize
+        expected = b''.join(case.linear[sliceStart + row * rowSize + x0 * case.bytesPerPixel:
+                                        sliceStart + row * rowSize + x1 * case.bytesPerPixel]
+                            for row in range(y0, y1))
+
+        if result != expected:
+            raise Mismatch(name + " deswizzleRegion: region " + str((x, y, w, h)) + " of slice " + str(z) + " differs")
+
+        pos = engine.getTexelAddr(x, y, z, surfOut.height, case.format_, surfOut.tileMode, case.swizzle_,
+                                  surfOut.pitch, surfOut.bpp)
+
+        if pos != case.address(x0, y0, z):
+            raise Mismatch(name + " getTexelAddr: texel " + str((x, y, z)) + " at " + hex(pos) + " instead of "
+                           + hex(case.address(x0, y0, z)))
+
+        # Retiled to another tile mode and swizzle value, like swizzling the linear data with them
+        tileMode = case.rng.choice(TILE_MODES)
+        swizzle_ = case.rng.randrange(8) << 8
+        dstSurfOut = addrlib_py.getSurfaceInfo(case.format_, case.width, case.height, case.depth, case.dim,
+                                               tileMode, 0, case.mipLevel)
+
+        result = engine.retile(case.mipWidth, case.mipHeight, case.numSlices, case.format_, surfOut.bpp,
+                               surfOut.height, surfOut.tileMode, case.swizzle_, surfOut.pitch,
+                               dstSurfOut.height, dstSurfOut.tileMode, swizzle_, dstSurfOut.pitch,
+                               swizzled, dstSurfOut.surfSize)
+
+        linear = case.linear + bytes(max(0, dstSurfOut.surfSize - case.size))
+        expected = reference.swizzle(case.mipWidth, case.mipHeight, dstSurfOut.height, case.format_,
+                                     dstSurfOut.tileMode, swizzle_, dstSurfOut.pitch, dstSurfOut.bpp,
+                                     linear[:dstSurfOut.surfSize], case.numSlices)
+
+        if result != expected:
+            raise Mismatch(name + " retile to tileMode " + str(tileMode) + " (" + str(dstSurfOut.tileMode)
+                           + " at this level), swizzle " + hex(swizzle_) + " differs")
+
+        checks += 6
+
+    return checks
+
+
+def printInfo():
+    print("")
+    print("Usage:")
+    print("  python3 -m addrlib.verify [option...]")
+    print("")
+    print("Options:")
+    print(" -seed <n>             seed of the random surfaces (a random one is picked by default)")
+    print(" -count <n>            number of surfaces to check (100 is the default)")
+    print(" -start <n>            first case to check, to run a failing one again (0 is the default)")
+    print(" -maxSize <n>          largest width and height of the surfaces (64 is the default)")
+    print("")
+    print("Exiting in 5 seconds...")
+    time.sleep(5)
+    sys.exit(1)
+
+
+def main():
+    if "-seed" in sys.argv:
+        seed = int(sys.argv[sys.argv.index("-seed") + 1], 0)
+    else:
+        seed = random.randrange(1 << 32)
+
+    if "-count" in sys.argv:
+        count = int(sys.argv[sys.argv.index("-count") + 1], 0)
+    else:
+        count = 100
+
+    if "-start" in sys.argv:
+        start = int(sys.argv[sys.argv.index("-start") + 1], 0)
+    else:
+        start = 0
+
+    if "-maxSize" in sys.argv:
+        maxSize = int(sys.argv[sys.argv.index("-maxSize") + 1], 0)
+    else:
+        maxSize = 64
+
+    if count < 1 or start < 0 or maxSize < 1:
+        printInfo()
+
+    print("Seed: " + str(seed))
+    print("Backends: " + ", ".join(addrlib.backends) + ", engines: " + ", ".join(getEngines()))
+
+    checks = 0
+
+    for n in range(start, start + count):
+        case = Case(str(seed) + ":" + str(n), maxSize)
+
+        try:
+            checks += checkCase(case)
+
+        except Mismatch as e:
+            print("")
+            print("Case " + str(n) + " failed (" + case.describe() + "):")
+            print("  " + str(e))
+            print("")
+            print("Run it again with: -seed " + str(seed) + " -start " + str(n) + " -count 1")
+            sys.exit(1)
+
+    print("")
+    print("All " + str(checks) + " checks of " + str(count) + " surfaces passed")
+
+
+if __name__ == '__main__':
+    main()
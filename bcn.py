@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+# Supported formats:
+#  -BC1
+#  -BC2
+#  -BC3
+#  -BC4U
+#  -BC4S
+#  -BC5U
+#  -BC5S
+
+"""bcn.py: BC1-BC5 decoder (outputs RGBA8) and BC1/BC3/BC4/BC5 encoder."""
+
+import math
+
+################################################################
+################################################################
+
+
+def _expand565(color):
+    red = (color >> 11) & 0x1F
+    green = (color >> 5) & 0x3F
+    blue = color & 0x1F
+
+    return (red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2)
+
+
+def _colorPalette(data, pos, fourColors):
+    c0 = data[pos] | data[pos + 1] << 8
+    c1 = data[pos + 2] | data[pos + 3] << 8
+
+    r0, g0, b0 = _expand565(c0)
+    r1, g1, b1 = _expand565(c1)
+
+    if fourColors or c0 > c1:
+        return [
+            bytes((r0, g0, b0, 0xFF)),
+            bytes((r1, g1, b1, 0xFF)),
+            bytes(((2 * r0 + r1 + 1) // 3, (2 * g0 + g1 + 1) // 3, (2 * b0 + b1 + 1) // 3, 0xFF)),
+            bytes(((r0 + 2 * r1 + 1) // 3, (g0 + 2 * g1 + 1) // 3, (b0 + 2 * b1 + 1) // 3, 0xFF)),
+        ]
+
+    return [
+        bytes((r0, g0, b0, 0xFF)),
+        bytes((r1, g1, b1, 0xFF)),
+        bytes(((r0 + r1) // 2, (g0 + g1) // 2, (b0 + b1) // 2, 0xFF)),
+        bytes(4),
+    ]
+
+
+def _snormToUnorm(value):
+    return ((value + 127) * 255 + 127) // 254
+
+
+def _alphaPalette(data, pos, SNORM):
+    a0 = data[pos]
+    a1 = data[pos + 1]
+
+    if SNORM:
+        a0 = max(-127, a0 - 256 if a0 > 127 else a0)
+        a1 = max(-127, a1 - 256 if a1 > 127 else a1)
+        minValue, maxValue = -127, 127
+
+    else:
+        minValue, maxValue = 0, 255
+
+    palette = [a0, a1]
+
+    if a0 > a1:
+        for i in range(1, 7):
+            palette.append(((7 - i) * a0 + i * a1 + 3) // 7)
+
+    else:
+        for i in range(1, 5):
+            palette.append(((5 - i) * a0 + i * a1 + 2) // 5)
+
+        palette.append(minValue)
+        palette.append(maxValue)
+
+    if SNORM:
+        palette = [_snormToUnorm(value) for value in palette]
+
+    return palette
+
+
+def _alphaIndices(data, pos):
+    bits = int.from_bytes(data[pos + 2:pos + 8], 'little')
+    return [(bits >> (3 * i)) & 7 for i in range(16)]
+
+
+def _colorIndices(data, pos):
+    bits = data[pos + 4] | data[pos + 5] << 8 | data[pos + 6] << 16 | data[pos + 7] << 24
+    return [(bits >> (2 * i)) & 3 for i in range(16)]
+
+
+def _decodeBC1Block(data, pos):
+    palette = _colorPalette(data, pos, False)
+    return [palette[i] for i in _colorIndices(data, pos)]
+
+
+def _decodeBC2Block(data, pos):
+    palette = _colorPalette(data, pos + 8, True)
+    alpha = int.from_bytes(data[pos:pos + 8], 'little')
+
+    texels = []
+    for i, index in enumerate(_colorIndices(data, pos + 8)):
+        texels.append(palette[index][:3] + bytes((((alpha >> (4 * i)) & 0xF) * 0x11,)))
+
+    return texels
+
+
+def _decodeBC3Block(data, pos):
+    palette = _colorPalette(data, pos + 8, True)
+    alphaPalette = _alphaPalette(data, pos, False)
+
+    return [palette[c][:3] + bytes((alphaPalette[a],))
+            for c, a in zip(_colorIndices(data, pos + 8), _alphaIndices(data, pos))]
+
+
+def _decodeBC4Block(data, pos, SNORM):
+    palette = [bytes((red, 0, 0, 0xFF)) for red in _alphaPalette(data, pos, SNORM)]
+    return [palette[i] for i in _alphaIndices(data, pos)]
+
+
+def _decodeBC5Block(data, pos, SNORM):
+    redPalette = _alphaPalette(data, pos, SNORM)
+    greenPalette = _alphaPalette(data, pos + 8, SNORM)
+
+    return [bytes((redPalette[r], greenPalette[g], 0, 0xFF))
+            for r, g in zip(_alphaIndices(data, pos), _alphaIndices(data, pos + 8))]
+
+
+def _decompress(data, width, height, blockSize, decodeBlock, *args):
+    blocksX = (width + 3) // 4
+    blocksY = (height + 3) // 4
+
+    if len(data) < blocksX * blocksY * blockSize:
+        raise ValueError("Not enough data for a " + str(width) + "x" + str(height) + " surface!")
+
+    output = bytearray(width * height * 4)
+    pos = 0
+
+    for blockY in range(blocksY):
+        rows = min(4, height - blockY * 4)
+
+        for blockX in range(blocksX):
+            texels = decodeBlock(data, pos, *args)
+            pos += blockSize
+
+            x = blockX * 4
+            cols = min(4, width - x)
+
+            for row in range(rows):
+                offset = ((blockY * 4 + row) * width + x) * 4
+                output[offset:offset + cols * 4] = b''.join(texels[row * 4:row * 4 + cols])
+
+    return bytes(output)
+
+
+def decompressBC1(data, width, height):
+    return _decompress(data, width, height, 8, _decodeBC1Block)
+
+
+def decompressBC2(data, width, height):
+    return _decompress(data, width, height, 16, _decodeBC2Block)
+
+
+def decompressBC3(data, width, height):
+    return _decompress(data, width, height, 16, _decodeBC3Block)
+
+
+def decompressBC4(data, width, height, SNORM=0):
+    return _decompress(data, width, height, 8, _decodeBC4Block, SNORM)
+
+
+def decompressBC5(data, width, height, SNORM=0):
+    return _decompress(data, width, height, 16, _decodeBC5Block, SNORM)
+
+
+def decompress(data, width, height, format_):
+    """
+    Decode a deswizzled BCn surface (as returned by addrlib.deswizzle)
+    of the given GX2 surface format to RGBA8.
+    BC4 is decoded to the red channel and BC5 to red and green,
+    SNORM values are remapped to the 0-255 range.
+    """
+    if format_ in [0x31, 0x431]:
+        return decompressBC1(data, width, height)
+
+    elif format_ in [0x32, 0x432]:
+        return decompressBC2(data, width, height)
+
+    elif format_ in [0x33, 0x433]:
+        return decompressBC3(data, width, height)
+
+    elif format_ in [0x34, 0x234]:
+        return decompressBC4(data, width, height, format_ == 0x234)
+
+    elif format_ in [0x35, 0x235]:
+        return decompressBC5(data, width, height, format_ == 0x235)
+
+    raise ValueError("Unsupported BCn format: " + hex(format_))
+
+
+################################################################
+################################################################
+
+# Palette index -> weight of the first endpoint, in thirds / halves / sevenths
+_colorWeights = [3, 0, 2, 1]
+_colorWeights3 = [2, 0, 1]
+_alphaWeights = [7, 0, 6, 5, 4, 3, 2, 1]
+
+
+def _pack565(color):
+    red, green, blue = color
+    return ((min(31, max(0, (red * 31 + 127) // 255)) << 11)
+            | (min(63, max(0, (green * 63 + 127) // 255)) << 5)
+            | min(31, max(0, (blue * 31 + 127) // 255)))
+
+
+def _colorDistance(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def _boundingBox(colors):
+    mins = [min(c[i] for c in colors) for i in range(3)]
+    maxs = [max(c[i] for c in colors) for i in range(3)]
+
+    # Use the diagonal of the bounding box that follows the colors,
+    # flipping channels that go against the one with the largest range
+    main = max(range(3), key=lambda i: maxs[i] - mins[i])
+    mean = [sum(c[i] for c in colors) / len(colors) for i in range(3)]
+
+    for i in range(3):
+        if i != main:
+            covariance = sum((c[main] - mean[main]) * (c[i] - mean[i]) for c in colors)
+            if covariance < 0:
+                mins[i], maxs[i] = maxs[i], mins[i]
+
+    # Inset the endpoints a bit, the extremes are rarely the best choice
+    for i in range(3):
+        inset = (maxs[i] - mins[i]) // 16
+        maxs[i] -= inset
+        mins[i] += inset
+
+    return maxs, mins
+
+
+def _fitColorIndices(colors, palette):
+    indices = []
+    error = 0
+
+    for color in colors:
+        distances = [_colorDistance(color, entry) for entry in palette]
+        index = distances.index(min(distances))
+        indices.append(index)
+        error += distances[index]
+
+    return indices, error
+
+
+def _refineColors(colors, indices, weights, denominator):
+    # Least squares fit of the endpoints for the given indices
+    aa = ab = bb = 0
+    ap = [0, 0, 0]
+    bp = [0, 0, 0]
+
+    for color, index in zip(colors, indices):
+        a = weights[index]
+        b = denominator - a
+
+        aa += a * a
+        ab += a * b
+        bb += b * b
+
+        for i in range(3):
+            ap[i] += a * color[i]
+            bp[i] += b * color[i]
+
+    determinant = aa * bb - ab * ab
+    if not determinant:
+        return None
+
+    first = [min(255, max(0, math.floor(denominator * (bb * ap[i] - ab * bp[i]) / determinant + 0.5))) for i in range(3)]
+    second = [min(255, max(0, math.floor(denominator * (aa * bp[i] - ab * ap[i]) / determinant + 0.5))) for i in range(3)]
+
+    return first, second
+
+
+def _encodeColorEndpoints(first, second, fourColors):
+    c0 = _pack565(first)
+    c1 = _pack565(second)
+
+    if fourColors and c0 < c1 or not fourColors and c0 > c1:
+        c0, c1 = c1, c0
+
+    return c0, c1
+
+
+def _colorBlockPalette(c0, c1, fourColors):
+    block = bytes((c0 & 0xFF, c0 >> 8, c1 & 0xFF, c1 >> 8))
+    palette = [tuple(entry[:3]) for entry in _colorPalette(block, 0, fourColors)]
+
+    return palette if fourColors or c0 > c1 else palette[:3]
+
+
+def _encodeColorBlock(texels, quality, punchThrough):
+    """
+    Encode 16 RGBA texels to a BC1 color block.
+    If punchThrough is set, texels with alpha < 128 use the transparent index.
+    """
+    transparent = [punchThrough and texel[3] < 128 for texel in texels]
+    opaque = [texel[:3] for texel, skip in zip(texels, transparent) if not skip]
+
+    fourColors = not any(transparent)
+
+    if not opaque:
+        return bytes((0, 0, 0, 0, 0xFF, 0xFF, 0xFF, 0xFF))
+
+    first, second = _boundingBox(opaque)
+    c0, c1 = _encodeColorEndpoints(first, second, fourColors)
+    palette = _colorBlockPalette(c0, c1, fourColors)
+    indices, error = _fitColorIndices(opaque, palette)
+
+    if quality:
+        weights, denominator = (_colorWeights, 3) if c0 > c1 else (_colorWeights3, 2)
+
+        for _ in range(quality * 2):
+            endpoints = _refineColors(opaque, indices, weights, denominator)
+            if endpoints is None:
+                break
+
+            c0_, c1_ = _encodeColorEndpoints(endpoints[0], endpoints[1], fourColors)
+            palette_ = _colorBlockPalette(c0_, c1_, fourColors)
+            indices_, error_ = _fitColorIndices(opaque, palette_)
+
+            if error_ >= error:
+                break
+
+            c0, c1, indices, error = c0_, c1_, indices_, error_
+            weights, denominator = (_colorWeights, 3) if c0 > c1 else (_colorWeights3, 2)
+
+    if fourColors and c0 == c1:
+        indices = [0] * 16
+
+    bits = 0
+    opaqueIndices = iter(indices)
+
+    for i, skip in enumerate(transparent):
+        bits |= (3 if skip else next(opaqueIndices)) << (2 * i)
+
+    return bytes((c0 & 0xFF, c0 >> 8, c1 & 0xFF, c1 >> 8)) + bits.to_bytes(4, 'little')
+
+
+def _alphaBlockPalette(a0, a1, eightValues, minValue, maxValue):
+    palette = [a0, a1]
+
+    if eightValues:
+        for i in range(1, 7):
+            palette.append(((7 - i) * a0 + i * a1 + 3) // 7)
+
+    else:
+        for i in range(1, 5):
+            palette.append(((5 - i) * a0 + i * a1 + 2) // 5)
+
+        palette.append(minValue)
+        palette.append(maxValue)
+
+    return palette
+
+
+def _fitAlphaIndices(values, palette):
+    indices = []
+    error = 0
+
+    for value in values:
+        distances = [(value - entry) ** 2 for entry in palette]
+        index = distances.index(min(distances))
+        indices.append(index)
+        error += distances[index]
+
+    return indices, error
+
+
+def _refineAlpha(values, indices, weights, denominator, minValue, maxValue):
+    aa = ab = bb = ap = bp = 0
+    used = 0
+
+    for value, index in zip(values, indices):
+        if index >= len(weights):  # The fixed minValue / maxValue entries
+            continue
+
+        a = weights[index]
+        b = denominator - a
+
+        aa += a * a
+        ab += a * b
+        bb += b * b
+        ap += a * value
+        bp += b * value
+        used += 1
+
+    determinant = aa * bb - ab * ab
+    if not used or not determinant:
+        return None
+
+    first = min(maxValue, max(minValue, math.floor(denominator * (bb * ap - ab * bp) / determinant + 0.5)))
+    second = min(maxValue, max(minValue, math.floor(denominator * (aa * bp - ab * ap) / determinant + 0.5)))
+
+    return first, second
+
+
+def _encodeAlphaBlock(values, quality, minValue=0, maxValue=255):
+    """
+    Encode 16 values to a BC4 block (also used for BC3 alpha and BC5).
+    minValue and maxValue are -127 and 127 for SNORM.
+    """
+    high = max(values)
+    low = min(values)
+
+    candidates = []
+
+    # Eight value mode, a0 > a1
+    a0, a1 = high, low
+    palette = _alphaBlockPalette(a0, a1, True, minValue, maxValue)
+    indices, error = _fitAlphaIndices(values, palette)
+    candidates.append((error, a0, a1, indices))
+
+    if quality:
+        for _ in range(quality * 2):
+            endpoints = _refineAlpha(values, indices, _alphaWeights, 7, minValue, maxValue)
+            if endpoints is None:
+                break
+
+            a0_, a1_ = max(endpoints), min(endpoints)
+            if a0_ == a1_:
+                break
+
+            palette = _alphaBlockPalette(a0_, a1_, True, minValue, maxValue)
+            indices_, error_ = _fitAlphaIndices(values, palette)
+
+            if error_ >= error:
+                break
+
+            a0, a1, indices, error = a0_, a1_, indices_, error_
+            candidates.append((error, a0, a1, indices))
+
+        # Six value mode, a0 <= a1, with explicit minValue and maxValue entries
+        inner = [value for value in values if minValue < value < maxValue] or values
+        a0, a1 = min(inner), max(inner)
+        palette = _alphaBlockPalette(a0, a1, False, minValue, maxValue)
+        indices, error = _fitAlphaIndices(values, palette)
+        candidates.append((error, a0, a1, indices))
+
+    error, a0, a1, indices = min(candidates, key=lambda candidate: candidate[0])
+
+    if a0 == a1:
+        indices = [0] * 16
+
+    bits = 0
+    for i, index in enumerate(indices):
+        bits |= index << (3 * i)
+
+    return bytes((a0 & 0xFF, a1 & 0xFF)) + bits.to_bytes(6, 'little')
+
+
+def _blockTexels(data, width, height, blockX, blockY):
+    # Texels outside of the image repeat the last row/column
+    texels = []
+
+    for y in range(4):
+        row = min(blockY * 4 + y, height - 1) * width
+
+        for x in range(4):
+            pos = (row + min(blockX * 4 + x, width - 1)) * 4
+            texels.append(data[pos:pos + 4])
+
+    return texels
+
+
+def _toSNORM(value):
+    return (value * 254 + 127) // 255 - 127
+
+
+def _compressBlock(texels, type_, quality, SNORM):
+    if type_ == 1:
+        return _encodeColorBlock(texels, quality, True)
+
+    elif type_ == 3:
+        return (_encodeAlphaBlock([texel[3] for texel in texels], quality)
+                + _encodeColorBlock(texels, quality, False))
+
+    if SNORM:
+        red = [_toSNORM(texel[0]) for texel in texels]
+        limits = (-127, 127)
+
+    else:
+        red = [texel[0] for texel in texels]
+        limits = (0, 255)
+
+    if type_ == 4:
+        return _encodeAlphaBlock(red, quality, *limits)
+
+    if SNORM:
+        green = [_toSNORM(texel[1]) for texel in texels]
+
+    else:
+        green = [texel[1] for texel in texels]
+
+    return _encodeAlphaBlock(red, quality, *limits) + _encodeAlphaBlock(green, quality, *limits)
+
+
+def _compressRows(data, width, height, firstRow, lastRow, type_, quality, SNORM):
+    blocksX = (width + 3) // 4
+    output = []
+
+    for blockY in range(firstRow, lastRow):
+        for blockX in range(blocksX):
+            output.append(_compressBlock(_blockTexels(data, width, height, blockX, blockY), type_, quality, SNORM))
+
+    return b''.join(output)
+
+
+def compress(data, width, height, format_, quality=1, executor=None):
+    """
+    Encode RGBA8 data to BC1, BC3, BC4 or BC5 (given as a GX2 surface format).
+    The blocks are returned in the order expected by addrlib.swizzle.
+    quality 0 uses the bounding box of each block as endpoints,
+    higher values refine the endpoints iteratively.
+    If an executor is given, rows of blocks are encoded on it in parallel.
+    """
+    if format_ in [0x31, 0x431]:
+        type_ = 1
+
+    elif format_ in [0x33, 0x433]:
+        type_ = 3
+
+    elif format_ in [0x34, 0x234]:
+        type_ = 4
+
+    elif format_ in [0x35, 0x235]:
+        type_ = 5
+
+    else:
+        raise ValueError("Unsupported BCn format: " + hex(format_))
+
+    if len(data) < width * height * 4:
+        raise ValueError("Not enough data for a " + str(width) + "x" + str(height) + " image!")
+
+    SNORM = format_ in [0x234, 0x235]
+    blocksY = (height + 3) // 4
+
+    if executor is None:
+        return _compressRows(data, width, height, 0, blocksY, type_, quality, SNORM)
+
+    rowsPerTask = max(1, blocksY // 16)
+    futures = [executor.submit(_compressRows, data, width, height, row, min(blocksY, row + rowsPerTask),
+                               type_, quality, SNORM)
+               for row in range(0, blocksY, rowsPerTask)]
+
+    return b''.join(future.result() for future in futures)
@@ -0,0 +1,797 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+# Supported formats:
+#  -BC1
+#  -BC2
+#  -BC3
+#  -BC4U
+#  -BC4S
+#  -BC5U
+#  -BC5S
+
+"""bcn_cy.pyx: BC1-BC5 decoder (outputs RGBA8) and BC1/BC3/BC4/BC5 encoder."""
+
+################################################################
+################################################################
+
+from libc.math cimport floor
+from libc.stdlib cimport malloc, free
+
+
+ctypedef unsigned char u8
+ctypedef unsigned short u16
+ctypedef unsigned int u32
+ctypedef unsigned long long u64
+
+
+cdef void _colorPalette(const u8 *data, u8 *palette, int fourColors) noexcept nogil:
+    cdef:
+        u16 c0 = data[0] | data[1] << 8
+        u16 c1 = data[2] | data[3] << 8
+        u32 r0 = (c0 >> 11) & 0x1F, g0 = (c0 >> 5) & 0x3F, b0 = c0 & 0x1F
+        u32 r1 = (c1 >> 11) & 0x1F, g1 = (c1 >> 5) & 0x3F, b1 = c1 & 0x1F
+
+    r0 = (r0 << 3) | (r0 >> 2); g0 = (g0 << 2) | (g0 >> 4); b0 = (b0 << 3) | (b0 >> 2)
+    r1 = (r1 << 3) | (r1 >> 2); g1 = (g1 << 2) | (g1 >> 4); b1 = (b1 << 3) | (b1 >> 2)
+
+    palette[0] = r0; palette[1] = g0; palette[2] = b0; palette[3] = 0xFF
+    palette[4] = r1; palette[5] = g1; palette[6] = b1; palette[7] = 0xFF
+
+    if fourColors or c0 > c1:
+        palette[8] = (2 * r0 + r1 + 1) // 3
+        palette[9] = (2 * g0 + g1 + 1) // 3
+        palette[10] = (2 * b0 + b1 + 1) // 3
+        palette[11] = 0xFF
+        palette[12] = (r0 + 2 * r1 + 1) // 3
+        palette[13] = (g0 + 2 * g1 + 1) // 3
+        palette[14] = (b0 + 2 * b1 + 1) // 3
+        palette[15] = 0xFF
+
+    else:
+        palette[8] = (r0 + r1) // 2
+        palette[9] = (g0 + g1) // 2
+        palette[10] = (b0 + b1) // 2
+        palette[11] = 0xFF
+        palette[12] = 0
+        palette[13] = 0
+        palette[14] = 0
+        palette[15] = 0
+
+
+cdef void _alphaPalette(const u8 *data, u8 *palette, int SNORM):
+    cdef:
+        int a0 = data[0]
+        int a1 = data[1]
+        int minValue = 0, maxValue = 255
+        int values[8]
+        int i
+
+    if SNORM:
+        if a0 > 127:
+            a0 -= 256
+
+        if a1 > 127:
+            a1 -= 256
+
+        a0 = max(-127, a0)
+        a1 = max(-127, a1)
+        minValue, maxValue = -127, 127
+
+    values[0] = a0
+    values[1] = a1
+
+    if a0 > a1:
+        for i in range(1, 7):
+            values[i + 1] = ((7 - i) * a0 + i * a1 + 3) // 7
+
+    else:
+        for i in range(1, 5):
+            values[i + 1] = ((5 - i) * a0 + i * a1 + 2) // 5
+
+        values[6] = minValue
+        values[7] = maxValue
+
+    for i in range(8):
+        if SNORM:
+            palette[i] = ((values[i] + 127) * 255 + 127) // 254
+
+        else:
+            palette[i] = values[i]
+
+
+cdef inline u64 _alphaBits(const u8 *data):
+    cdef:
+        u64 bits = 0
+        int i
+
+    for i in range(6):
+        bits |= (<u64>data[2 + i]) << (8 * i)
+
+    return bits
+
+
+cdef inline u32 _colorBits(const u8 *data):
+    return data[4] | data[5] << 8 | data[6] << 16 | (<u32>data[7]) << 24
+
+
+cdef void _decodeBlock(const u8 *data, u8 *texels, int type_, int SNORM):
+    cdef:
+        u8 palette[16]
+        u8 alphaPalette[8]
+        u8 greenPalette[8]
+        u64 alphaBits, greenBits
+        u64 alphaRaw
+        u32 colorBits
+        int i, n
+
+    if type_ == 1:
+        _colorPalette(data, palette, 0)
+        colorBits = _colorBits(data)
+
+        for i in range(16):
+            n = (colorBits >> (2 * i)) & 3
+            texels[4 * i + 0] = palette[4 * n + 0]
+            texels[4 * i + 1] = palette[4 * n + 1]
+            texels[4 * i + 2] = palette[4 * n + 2]
+            texels[4 * i + 3] = palette[4 * n + 3]
+
+    elif type_ == 2:
+        _colorPalette(data + 8, palette, 1)
+        colorBits = _colorBits(data + 8)
+
+        alphaRaw = 0
+        for i in range(8):
+            alphaRaw |= (<u64>data[i]) << (8 * i)
+
+        for i in range(16):
+            n = (colorBits >> (2 * i)) & 3
+            texels[4 * i + 0] = palette[4 * n + 0]
+            texels[4 * i + 1] = palette[4 * n + 1]
+            texels[4 * i + 2] = palette[4 * n + 2]
+            texels[4 * i + 3] = ((alphaRaw >> (4 * i)) & 0xF) * 0x11
+
+    elif type_ == 3:
+        _colorPalette(data + 8, palette, 1)
+        colorBits = _colorBits(data + 8)
+
+        _alphaPalette(data, alphaPalette, 0)
+        alphaBits = _alphaBits(data)
+
+        for i in range(16):
+            n = (colorBits >> (2 * i)) & 3
+            texels[4 * i + 0] = palette[4 * n + 0]
+            texels[4 * i + 1] = palette[4 * n + 1]
+            texels[4 * i + 2] = palette[4 * n + 2]
+            texels[4 * i + 3] = alphaPalette[(alphaBits >> (3 * i)) & 7]
+
+    elif type_ == 4:
+        _alphaPalette(data, alphaPalette, SNORM)
+        alphaBits = _alphaBits(data)
+
+        for i in range(16):
+            texels[4 * i + 0] = alphaPalette[(alphaBits >> (3 * i)) & 7]
+            texels[4 * i + 1] = 0
+            texels[4 * i + 2] = 0
+            texels[4 * i + 3] = 0xFF
+
+    else:
+        _alphaPalette(data, alphaPalette, SNORM)
+        alphaBits = _alphaBits(data)
+
+        _alphaPalette(data + 8, greenPalette, SNORM)
+        greenBits = _alphaBits(data + 8)
+
+        for i in range(16):
+            texels[4 * i + 0] = alphaPalette[(alphaBits >> (3 * i)) & 7]
+            texels[4 * i + 1] = greenPalette[(greenBits >> (3 * i)) & 7]
+            texels[4 * i + 2] = 0
+            texels[4 * i + 3] = 0xFF
+
+
+cdef bytes _decompress(const u8[::1] data, u32 width, u32 height, u32 blockSize, int type_, int SNORM):
+    cdef:
+        u32 blocksX = (width + 3) // 4
+        u32 blocksY = (height + 3) // 4
+
+        u8 texels[64]
+        u8 *output
+        u32 blockX, blockY, row, col, rows, cols, x, offset
+        u64 pos = 0
+
+    if <u64>data.shape[0] < <u64>blocksX * blocksY * blockSize:
+        raise ValueError("Not enough data for a " + str(width) + "x" + str(height) + " surface!")
+
+    output = <u8 *>malloc(width * height * 4)
+
+    try:
+        for blockY in range(blocksY):
+            rows = min(4, height - blockY * 4)
+
+            for blockX in range(blocksX):
+                _decodeBlock(&data[pos], texels, type_, SNORM)
+                pos += blockSize
+
+                x = blockX * 4
+                cols = min(4, width - x)
+
+                for row in range(rows):
+                    offset = ((blockY * 4 + row) * width + x) * 4
+                    for col in range(cols * 4):
+                        output[offset + col] = texels[row * 16 + col]
+
+        return bytes(<u8[:width * height * 4]>output)
+
+    finally:
+        free(output)
+
+
+cpdef bytes decompressBC1(data, u32 width, u32 height):
+    return _decompress(data, width, height, 8, 1, 0)
+
+
+cpdef bytes decompressBC2(data, u32 width, u32 height):
+    return _decompress(data, width, height, 16, 2, 0)
+
+
+cpdef bytes decompressBC3(data, u32 width, u32 height):
+    return _decompress(data, width, height, 16, 3, 0)
+
+
+cpdef bytes decompressBC4(data, u32 width, u32 height, int SNORM=0):
+    return _decompress(data, width, height, 8, 4, SNORM)
+
+
+cpdef bytes decompressBC5(data, u32 width, u32 height, int SNORM=0):
+    return _decompress(data, width, height, 16, 5, SNORM)
+
+
+cpdef bytes decompress(data, u32 width, u32 height, u32 format_):
+    """
+    Decode a deswizzled BCn surface (as returned by addrlib.deswizzle)
+    of the given GX2 surface format to RGBA8.
+    BC4 is decoded to the red channel and BC5 to red and green,
+    SNORM values are remapped to the 0-255 range.
+    """
+    if format_ in [0x31, 0x431]:
+        return decompressBC1(data, width, height)
+
+    elif format_ in [0x32, 0x432]:
+        return decompressBC2(data, width, height)
+
+    elif format_ in [0x33, 0x433]:
+        return decompressBC3(data, width, height)
+
+    elif format_ in [0x34, 0x234]:
+        return decompressBC4(data, width, height, format_ == 0x234)
+
+    elif format_ in [0x35, 0x235]:
+        return decompressBC5(data, width, height, format_ == 0x235)
+
+    raise ValueError("Unsupported BCn format: " + hex(format_))
+
+
+################################################################
+################################################################
+
+# Palette index -> weight of the first endpoint, in thirds / halves / sevenths
+cdef int _colorWeights[4]
+_colorWeights[:] = [3, 0, 2, 1]
+
+cdef int _colorWeights3[3]
+_colorWeights3[:] = [2, 0, 1]
+
+cdef int _alphaWeights[8]
+_alphaWeights[:] = [7, 0, 6, 5, 4, 3, 2, 1]
+
+
+cdef inline int _clamp(int value, int minValue, int maxValue) noexcept nogil:
+    if value < minValue:
+        return minValue
+
+    elif value > maxValue:
+        return maxValue
+
+    return value
+
+
+cdef inline u32 _pack565(const int *color) noexcept nogil:
+    return ((<u32>_clamp((color[0] * 31 + 127) // 255, 0, 31) << 11)
+            | (<u32>_clamp((color[1] * 63 + 127) // 255, 0, 63) << 5)
+            | <u32>_clamp((color[2] * 31 + 127) // 255, 0, 31))
+
+
+cdef void _boundingBox(const int *colors, int n, int *first, int *second) noexcept nogil:
+    cdef:
+        int mins[3]
+        int maxs[3]
+        double mean[3]
+        double covariance
+        int i, j, main, inset, tmp
+
+    for i in range(3):
+        mins[i] = 255
+        maxs[i] = 0
+        mean[i] = 0
+
+        for j in range(n):
+            mins[i] = min(mins[i], colors[3 * j + i])
+            maxs[i] = max(maxs[i], colors[3 * j + i])
+            mean[i] += colors[3 * j + i]
+
+        mean[i] /= n
+
+    # Use the diagonal of the bounding box that follows the colors,
+    # flipping channels that go against the one with the largest range
+    main = 0
+    for i in range(1, 3):
+        if maxs[i] - mins[i] > maxs[main] - mins[main]:
+            main = i
+
+    for i in range(3):
+        if i != main:
+            covariance = 0
+            for j in range(n):
+                covariance += (colors[3 * j + main] - mean[main]) * (colors[3 * j + i] - mean[i])
+
+            if covariance < 0:
+                tmp = mins[i]
+                mins[i] = maxs[i]
+                maxs[i] = tmp
+
+    # Inset the endpoints a bit, the extremes are rarely the best choice
+    for i in range(3):
+        inset = (maxs[i] - mins[i]) // 16
+        first[i] = maxs[i] - inset
+        second[i] = mins[i] + inset
+
+
+cdef int _colorBlockPalette(u32 c0, u32 c1, int fourColors, int *palette) noexcept nogil:
+    cdef:
+        u8 block[4]
+        u8 entries[16]
+        int i
+
+    block[0] = c0 & 0xFF
+    block[1] = c0 >> 8
+    block[2] = c1 & 0xFF
+    block[3] = c1 >> 8
+
+    _colorPalette(block, entries, fourColors)
+
+    for i in range(4):
+        palette[3 * i + 0] = entries[4 * i + 0]
+        palette[3 * i + 1] = entries[4 * i + 1]
+        palette[3 * i + 2] = entries[4 * i + 2]
+
+    if fourColors or c0 > c1:
+        return 4
+
+    return 3
+
+
+cdef long _fitColorIndices(const int *colors, int n, const int *palette, int numEntries, int *indices) noexcept nogil:
+    cdef:
+        long error = 0
+        long distance, best
+        int i, j, k, d
+
+    for i in range(n):
+        best = -1
+        for j in range(numEntries):
+            distance = 0
+            for k in range(3):
+                d = colors[3 * i + k] - palette[3 * j + k]
+                distance += d * d
+
+            if best < 0 or distance < best:
+                best = distance
+                indices[i] = j
+
+        error += best
+
+    return error
+
+
+cdef int _refineColors(const int *colors, int n, const int *indices, const int *weights, int denominator,
+                       int *first, int *second) noexcept nogil:
+    # Least squares fit of the endpoints for the given indices
+    cdef:
+        double aa = 0, ab = 0, bb = 0, determinant
+        double ap[3]
+        double bp[3]
+        int i, k, a, b
+
+    for k in range(3):
+        ap[k] = 0
+        bp[k] = 0
+
+    for i in range(n):
+        a = weights[indices[i]]
+        b = denominator - a
+
+        aa += a * a
+        ab += a * b
+        bb += b * b
+
+        for k in range(3):
+            ap[k] += a * colors[3 * i + k]
+            bp[k] += b * colors[3 * i + k]
+
+    determinant = aa * bb - ab * ab
+    if determinant == 0:
+        return 0
+
+    for k in range(3):
+        first[k] = _clamp(<int>floor(denominator * (bb * ap[k] - ab * bp[k]) / determinant + 0.5), 0, 255)
+        second[k] = _clamp(<int>floor(denominator * (aa * bp[k] - ab * ap[k]) / determinant + 0.5), 0, 255)
+
+    return 1
+
+
+cdef void _encodeColorEndpoints(const int *first, const int *second, int fourColors, u32 *c0, u32 *c1) noexcept nogil:
+    cdef u32 tmp
+
+    c0[0] = _pack565(first)
+    c1[0] = _pack565(second)
+
+    if fourColors and c0[0] < c1[0] or not fourColors and c0[0] > c1[0]:
+        tmp = c0[0]
+        c0[0] = c1[0]
+        c1[0] = tmp
+
+
+cdef void _encodeColorBlock(const int *texels, int quality, int punchThrough, u8 *output) noexcept nogil:
+    """
+    Encode 16 RGBA texels to a BC1 color block.
+    If punchThrough is set, texels with alpha < 128 use the transparent index.
+    """
+    cdef:
+        int transparent[16]
+        int opaque[48]
+        int palette[12]
+        int indices[16]
+        int indices_[16]
+        int first[3]
+        int second[3]
+        int n = 0, fourColors = 1, numEntries, denominator, i, k, iteration
+        const int *weights
+        u32 c0, c1, c0_, c1_, bits = 0
+        long error, error_
+
+    for i in range(16):
+        transparent[i] = punchThrough and texels[4 * i + 3] < 128
+
+        if transparent[i]:
+            fourColors = 0
+
+        else:
+            for k in range(3):
+                opaque[3 * n + k] = texels[4 * i + k]
+
+            n += 1
+
+    if not n:
+        output[0] = output[1] = output[2] = output[3] = 0
+        output[4] = output[5] = output[6] = output[7] = 0xFF
+        return
+
+    _boundingBox(opaque, n, first, second)
+    _encodeColorEndpoints(first, second, fourColors, &c0, &c1)
+    numEntries = _colorBlockPalette(c0, c1, fourColors, palette)
+    error = _fitColorIndices(opaque, n, palette, numEntries, indices)
+
+    if quality:
+        if c0 > c1:
+            weights = _colorWeights
+            denominator = 3
+
+        else:
+            weights = _colorWeights3
+            denominator = 2
+
+        for iteration in range(quality * 2):
+            if not _refineColors(opaque, n, indices, weights, denominator, first, second):
+                break
+
+            _encodeColorEndpoints(first, second, fourColors, &c0_, &c1_)
+            numEntries = _colorBlockPalette(c0_, c1_, fourColors, palette)
+            error_ = _fitColorIndices(opaque, n, palette, numEntries, indices_)
+
+            if error_ >= error:
+                break
+
+            c0, c1, error = c0_, c1_, error_
+            for i in range(n):
+                indices[i] = indices_[i]
+
+            if c0 > c1:
+                weights = _colorWeights
+                denominator = 3
+
+            else:
+                weights = _colorWeights3
+                denominator = 2
+
+    if fourColors and c0 == c1:
+        for i in range(n):
+            indices[i] = 0
+
+    n = 0
+    for i in range(16):
+        if transparent[i]:
+            bits |= 3 << (2 * i)
+
+        else:
+            bits |= (<u32>indices[n]) << (2 * i)
+            n += 1
+
+    output[0] = c0 & 0xFF
+    output[1] = c0 >> 8
+    output[2] = c1 & 0xFF
+    output[3] = c1 >> 8
+    output[4] = bits & 0xFF
+    output[5] = (bits >> 8) & 0xFF
+    output[6] = (bits >> 16) & 0xFF
+    output[7] = bits >> 24
+
+
+cdef void _alphaBlockPalette(int a0, int a1, int eightValues, int minValue, int maxValue, int *palette) noexcept nogil:
+    cdef int i
+
+    palette[0] = a0
+    palette[1] = a1
+
+    if eightValues:
+        for i in range(1, 7):
+            palette[i + 1] = ((7 - i) * a0 + i * a1 + 3) // 7
+
+    else:
+        for i in range(1, 5):
+            palette[i + 1] = ((5 - i) * a0 + i * a1 + 2) // 5
+
+        palette[6] = minValue
+        palette[7] = maxValue
+
+
+cdef long _fitAlphaIndices(const int *values, const int *palette, int *indices) noexcept nogil:
+    cdef:
+        long error = 0
+        long distance, best
+        int i, j
+
+    for i in range(16):
+        best = -1
+        for j in range(8):
+            distance = (values[i] - palette[j]) * (values[i] - palette[j])
+            if best < 0 or distance < best:
+                best = distance
+                indices[i] = j
+
+        error += best
+
+    return error
+
+
+cdef int _refineAlpha(const int *values, const int *indices, int minValue, int maxValue,
+                      int *first, int *second) noexcept nogil:
+    cdef:
+        double aa = 0, ab = 0, bb = 0, ap = 0, bp = 0, determinant
+        int i, a, b, used = 0
+
+    for i in range(16):
+        a = _alphaWeights[indices[i]]
+        b = 7 - a
+
+        aa += a * a
+        ab += a * b
+        bb += b * b
+        ap += a * values[i]
+        bp += b * values[i]
+        used += 1
+
+    determinant = aa * bb - ab * ab
+    if not used or determinant == 0:
+        return 0
+
+    first[0] = _clamp(<int>floor(7 * (bb * ap - ab * bp) / determinant + 0.5), minValue, maxValue)
+    second[0] = _clamp(<int>floor(7 * (aa * bp - ab * ap) / determinant + 0.5), minValue, maxValue)
+
+    return 1
+
+
+cdef void _encodeAlphaBlock(const int *values, int quality, int minValue, int maxValue, u8 *output) noexcept nogil:
+    """
+    Encode 16 values to a BC4 block (also used for BC3 alpha and BC5).
+    minValue and maxValue are -127 and 127 for SNORM.
+    """
+    cdef:
+        int palette[8]
+        int indices[16]
+        int indices_[16]
+        int bestIndices[16]
+        int high = values[0], low = values[0]
+        int innerHigh = minValue, innerLow = maxValue, hasInner = 0
+        int a0, a1, a0_, a1_, first, second, bestA0, bestA1, i, iteration
+        long error, error_, bestError
+        u64 bits = 0
+
+    for i in range(16):
+        high = max(high, values[i])
+        low = min(low, values[i])
+
+    # Eight value mode, a0 > a1
+    a0, a1 = high, low
+    _alphaBlockPalette(a0, a1, 1, minValue, maxValue, palette)
+    error = _fitAlphaIndices(values, palette, indices)
+
+    if quality:
+        for iteration in range(quality * 2):
+            if not _refineAlpha(values, indices, minValue, maxValue, &first, &second):
+                break
+
+            a0_, a1_ = max(first, second), min(first, second)
+            if a0_ == a1_:
+                break
+
+            _alphaBlockPalette(a0_, a1_, 1, minValue, maxValue, palette)
+            error_ = _fitAlphaIndices(values, palette, indices_)
+
+            if error_ >= error:
+                break
+
+            a0, a1, error = a0_, a1_, error_
+            for i in range(16):
+                indices[i] = indices_[i]
+
+    bestA0, bestA1, bestError = a0, a1, error
+    for i in range(16):
+        bestIndices[i] = indices[i]
+
+    if quality:
+        # Six value mode, a0 <= a1, with explicit minValue and maxValue entries
+        for i in range(16):
+            if minValue < values[i] < maxValue:
+                innerHigh = max(innerHigh, values[i])
+                innerLow = min(innerLow, values[i])
+                hasInner = 1
+
+        if hasInner:
+            a0, a1 = innerLow, innerHigh
+
+        else:
+            a0, a1 = low, high
+
+        _alphaBlockPalette(a0, a1, 0, minValue, maxValue, palette)
+        error = _fitAlphaIndices(values, palette, indices)
+
+        if error < bestError:
+            bestA0, bestA1, bestError = a0, a1, error
+            for i in range(16):
+                bestIndices[i] = indices[i]
+
+    if bestA0 == bestA1:
+        for i in range(16):
+            bestIndices[i] = 0
+
+    for i in range(16):
+        bits |= (<u64>bestIndices[i]) << (3 * i)
+
+    output[0] = bestA0 & 0xFF
+    output[1] = bestA1 & 0xFF
+
+    for i in range(6):
+        output[2 + i] = (bits >> (8 * i)) & 0xFF
+
+
+cdef inline int _toSNORM(int value) noexcept nogil:
+    return (value * 254 + 127) // 255 - 127
+
+
+cdef void _compressRows(const u8 *data, u32 width, u32 height, u32 firstRow, u32 lastRow,
+                        int type_, int quality, int SNORM, u8 *output) noexcept nogil:
+    cdef:
+        u32 blocksX = (width + 3) // 4
+        u32 blockX, blockY, x, y, pos
+        u32 blockSize = 8 if type_ in [1, 4] else 16
+        int texels[64]
+        int values[16]
+        int minValue = -127 if SNORM else 0
+        int maxValue = 127 if SNORM else 255
+        int i, k
+
+    for blockY in range(firstRow, lastRow):
+        for blockX in range(blocksX):
+            # Texels outside of the image repeat the last row/column
+            for y in range(4):
+                for x in range(4):
+                    pos = (min(blockY * 4 + y, height - 1) * width + min(blockX * 4 + x, width - 1)) * 4
+                    for k in range(4):
+                        texels[(y * 4 + x) * 4 + k] = data[pos + k]
+
+            if type_ == 1:
+                _encodeColorBlock(texels, quality, 1, output)
+
+            elif type_ == 3:
+                for i in range(16):
+                    values[i] = texels[4 * i + 3]
+
+                _encodeAlphaBlock(values, quality, 0, 255, output)
+                _encodeColorBlock(texels, quality, 0, output + 8)
+
+            else:
+                for i in range(16):
+                    values[i] = _toSNORM(texels[4 * i]) if SNORM else texels[4 * i]
+
+                _encodeAlphaBlock(values, quality, minValue, maxValue, output)
+
+                if type_ == 5:
+                    for i in range(16):
+                        values[i] = _toSNORM(texels[4 * i + 1]) if SNORM else texels[4 * i + 1]
+
+                    _encodeAlphaBlock(values, quality, minValue, maxValue, output + 8)
+
+            output += blockSize
+
+
+def _compressRowsPy(const u8[::1] data, u32 width, u32 height, u32 firstRow, u32 lastRow,
+                    int type_, int quality, int SNORM):
+    cdef:
+        u32 blockSize = 8 if type_ in [1, 4] else 16
+        u32 size = ((width + 3) // 4) * (lastRow - firstRow) * blockSize
+        u8 *output = <u8 *>malloc(max(1, size))
+
+    try:
+        # Releasing the GIL lets rows of blocks be encoded in parallel threads
+        with nogil:
+            _compressRows(&data[0], width, height, firstRow, lastRow, type_, quality, SNORM, output)
+
+        return bytes(<u8[:size]>output) if size else b''
+
+    finally:
+        free(output)
+
+
+def compress(data, u32 width, u32 height, u32 format_, int quality=1, executor=None):
+    """
+    Encode RGBA8 data to BC1, BC3, BC4 or BC5 (given as a GX2 surface format).
+    The blocks are returned in the order expected by addrlib.swizzle.
+    quality 0 uses the bounding box of each block as endpoints,
+    higher values refine the endpoints iteratively.
+    If an executor is given, rows of blocks are encoded on it in parallel.
+    """
+    cdef int type_
+
+    if format_ in [0x31, 0x431]:
+        type_ = 1
+
+    elif format_ in [0x33, 0x433]:
+        type_ = 3
+
+    elif format_ in [0x34, 0x234]:
+        type_ = 4
+
+    elif format_ in [0x35, 0x235]:
+        type_ = 5
+
+    else:
+        raise ValueError("Unsupported BCn format: " + hex(format_))
+
+    if len(data) < width * height * 4:
+        raise ValueError("Not enough data for a " + str(width) + "x" + str(height) + " image!")
+
+    data = bytes(data)
+    SNORM = format_ in [0x234, 0x235]
+    blocksY = (height + 3) // 4
+
+    if executor is None:
+        return _compressRowsPy(data, width, height, 0, blocksY, type_, quality, SNORM)
+
+    rowsPerTask = max(1, blocksY // 16)
+    futures = [executor.submit(_compressRowsPy, data, width, height, row, min(blocksY, row + rowsPerTask),
+                               type_, quality, SNORM)
+               for row in range(0, blocksY, rowsPerTask)]
+
+    return b''.join([future.result() for future in futures])
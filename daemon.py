@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""daemon.py: GTX conversion daemon.
+
+Keeps the conversion backends loaded and serves jobs over HTTP,
+either on localhost or on a Unix socket:
+
+  GET  /status                  queue status (JSON)
+  POST /inspect                 body: GTX file, returns the surface info of every image (JSON)
+  POST /extract?image=&mip=&maxMip=&format=dds|png|tga
+                                body: GTX file, returns the extracted image
+  POST /pack?tileMode=&autoTileMode=size|2d&swizzle=&SRGB=&format=&quality=&mipFilter=
+                                body: DDS or PNG file, returns the GTX file
+
+Jobs with an invalid or unsupported file return 400 with the error as text, other failures return 500,
+503 means the queue is full and the job should be sent again later.
+"""
+
+import json
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import jobs
+
+################################################################
+################################################################
+
+# Largest request body that gets accepted
+MAX_REQUEST_SIZE = 0x10000000
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class ConversionDaemon:
+    """
+    Runs jobs on a pool of worker processes, which keep the backends and their caches loaded.
+    At most workers jobs run at once, and at most queueSize more wait for a worker.
+    """
+    def __init__(self, workers=None, queueSize=16):
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        self.workers = workers
+        self.queueSize = queueSize
+
+        self.executor = ProcessPoolExecutor(workers)
+        self.slots = threading.BoundedSemaphore(workers + queueSize)
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.done = 0
+        self.rejected = 0
+
+        for future in [self.executor.submit(jobs.warmUp) for _ in range(workers)]:
+            future.result()
+
+    def run(self, function, *args):
+        if not self.slots.acquire(False):
+            with self.lock:
+                self.rejected += 1
+
+            raise QueueFullError()
+
+        with self.lock:
+            self.pending += 1
+
+        try:
+            return self.executor.submit(function, *args).result()
+
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.done += 1
+
+            self.slots.release()
+
+    def status(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'queueSize': self.queueSize,
+                'pending': self.pending,
+                'done': self.done,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def _intParam(params, name, default):
+    if name not in params:
+        return default
+
+    return int(params[name], 0)
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format_, *args):
+        # Unix socket clients have no address, and editors poll a lot
+        pass
+
+    def sendResponse(self, code, body, contentType='application/octet-stream'):
+        self.send_response(code)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendError(self, code, message):
+        self.sendResponse(code, message.encode('utf-8'), 'text/plain; charset=utf-8')
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/status':
+            self.sendError(404, "Unknown request: " + self.path)
+            return
+
+        self.sendResponse(200, json.dumps(self.server.conversionDaemon.status()).encode('utf-8'), 'application/json')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        params = dict((name, values[-1]) for name, values in parse_qs(url.query).items())
+        size = int(self.headers.get('Content-Length', 0))
+
+        if size > MAX_REQUEST_SIZE:
+            self.sendError(413, "The request is too large!")
+            self.close_connection = True
+            return
+
+        data = self.rfile.read(size)
+
+        try:
+            if url.path == '/inspect':
+                result = json.dumps(self.server.conversionDaemon.run(jobs.inspect, data)).encode('utf-8')
+                contentType = 'application/json'
+
+            elif url.path == '/extract':
+                if 'mip' in params:
+                    baseMip = maxMip = _intParam(params, 'mip', 0)
+
+                else:
+                    baseMip = 0
+                    maxMip = None
+
+                maxMip = _intParam(params, 'maxMip', maxMip)
+
+                result = self.server.conversionDaemon.run(jobs.extract, data, _intParam(params, 'image', 0),
+                                                          baseMip, maxMip, params.get('format', 'dds'))
+                contentType = 'application/octet-stream'
+
+            elif url.path == '/pack':
+                result = self.server.conversionDaemon.run(jobs.pack, data,
+                                                          params.get('autoTileMode') or _intParam(params, 'tileMode', 4),
+                                                          _intParam(params, 'swizzle', 0),
+                                                          _intParam(params, 'SRGB', 0),
+                                                          _intParam(params, 'format', 0x1a),
+                                                          _intParam(params, 'quality', 1),
+                                                          params.get('mipFilter'))
+                contentType = 'application/octet-stream'
+
+            else:
+                self.sendError(404, "Unknown request: " + url.path)
+                return
+
+        except QueueFullError:
+            self.sendError(503, "The queue is full!")
+            return
+
+        except (ValueError, struct.error) as e:
+            self.sendError(400, str(e) or "Invalid input file!")
+            return
+
+        except Exception as e:
+            self.sendError(500, str(e) or e.__class__.__name__)
+            return
+
+        self.sendResponse(200, result, contentType)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(daemon, port=8765, socketPath=None):
+    """
+    Serve the daemon's jobs on localhost:port, or on a Unix socket if socketPath is given.
+    """
+    if socketPath is not None:
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+
+        server = ThreadingUnixHTTPServer(socketPath, ConversionHandler)
+        os.chmod(socketPath, 0o600)
+
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), ConversionHandler)
+
+    server.conversionDaemon = daemon
+
+    try:
+        server.serve_forever()
+
+    finally:
+        server.server_close()
+
+        if socketPath is not None and os.path.exists(socketPath):
+            os.remove(socketPath)
+
+
+def printInfo():
+    print("")
+    print("Usage:")
+    print("  daemon [option...]")
+    print("")
+    print("Options:")
+    print(" -port <port>          localhost port to listen on (8765 is the default)")
+    print(" -socket <path>        listen on this Unix socket instead")
+    print(" -workers <n>          number of jobs that run at once (the number of CPUs is the default)")
+    print(" -queue <n>            number of jobs that can wait for a worker, more are rejected (16 is the default)")
+    print("")
+    print("Exiting in 5 seconds...")
+    time.sleep(5)
+    sys.exit(1)
+
+
+def main():
+    print("GTX Extractor v5.3 daemon")
+    print("(C) 2015-2018 AboodXD")
+
+    if "-port" in sys.argv:
+        port = int(sys.argv[sys.argv.index("-port") + 1], 0)
+    else:
+        port = 8765
+
+    if "-socket" in sys.argv:
+        socketPath = sys.argv[sys.argv.index("-socket") + 1]
+    else:
+        socketPath = None
+
+    if "-workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("-workers") + 1], 0)
+    else:
+        workers = None
+
+    if "-queue" in sys.argv:
+        queueSize = int(sys.argv[sys.argv.index("-queue") + 1], 0)
+    else:
+        queueSize = 16
+
+    if not 0 < port < 0x10000 or (workers is not None and workers < 1) or queueSize < 0:
+        printInfo()
+
+    daemon = ConversionDaemon(workers, queueSize)
+
+    print("")
+    print("Listening on " + (socketPath if socketPath is not None else "127.0.0.1:" + str(port)))
+
+    try:
+        serve(daemon, port, socketPath)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        daemon.shutdown()
+
+
+if __name__ == '__main__':
+    main()
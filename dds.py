@@ -38,10 +38,21 @@ except ImportError:
 
 dx10_formats = ["BC4U", "BC4S", "BC5U", "BC5S"]
 
+# DXGI formats used in DX10 headers, only compressed formats are written with one
+dxgi_formats = {"BC1": 71, "BC2": 74, "BC3": 77, "BC4U": 80, "BC4S": 81, "BC5U": 83, "BC5S": 84}
+
 
 def readDDS(f, SRGB):
-    with open(f, "rb") as inf:
-        inb = inf.read()
+    """
+    Read a DDS file, f can be its path or its contents.
+    """
+    if isinstance(f, str):
+        with open(f, "rb") as inf:
+            inb = inf.read()
+
+    else:
+        inb = bytes(f)
+        f = "The input"
 
     if len(inb) < 0x80 or inb[:4] != b'DDS ':
         print("")
@@ -154,22 +165,38 @@ def readDDS(f, SRGB):
             format_ = 0x235
             bpp = 16
 
-        elif fourcc == b'DX10':
-            if inb[128:148] == b"\x50\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00":
-                format_ = 0x34
-                bpp = 8
+        elif fourcc == b'DX10' and len(inb) >= 0x94:
+            # DXGI format and resource dimension, only the first layer of an array is read
+            dxgi, dimension = struct.unpack("<2I", inb[128:136])
+
+            if dimension == 3:
+                if dxgi in [71, 72]:
+                    format_ = 0x431 if SRGB or dxgi == 72 else 0x31
+                    bpp = 8
+
+                elif dxgi in [74, 75]:
+                    format_ = 0x432 if SRGB or dxgi == 75 else 0x32
+                    bpp = 16
+
+                elif dxgi in [77, 78]:
+                    format_ = 0x433 if SRGB or dxgi == 78 else 0x33
+                    bpp = 16
+
+                elif dxgi == 80:
+                    format_ = 0x34
+                    bpp = 8
 
-            elif inb[128:148] == b"\x51\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00":
-                format_ = 0x234
-                bpp = 8
+                elif dxgi == 81:
+                    format_ = 0x234
+                    bpp = 8
 
-            elif inb[128:148] == b"\x53\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00":
-                format_ = 0x35
-                bpp = 16
+                elif dxgi == 83:
+                    format_ = 0x35
+                    bpp = 16
 
-            elif inb[128:148] == b"\x54\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00":
-                format_ = 0x235
-                bpp = 16
+                elif dxgi == 84:
+                    format_ = 0x235
+                    bpp = 16
 
         size = ((width + 3) >> 2) * ((height + 3) >> 2) * bpp
 
@@ -277,8 +304,15 @@ def get_mipSize(width, height, bpp, numMips, compressed):
     return size
 
 
-def generateHeader(num_mipmaps, w, h, format_, compSel, size, compressed):
+def generateHeader(num_mipmaps, w, h, format_, compSel, size, compressed, depth=1, cubemap=False, arraySize=1):
+    """
+    depth is the number of slices of a volume texture, arraySize the number of layers
+    (of cube maps, if cubemap is set) of an array texture.
+    Compressed arrays need a DX10 header, uncompressed ones keep their channel masks
+    in a legacy header, which only describes the first layer.
+    """
     hdr = bytearray(128)
+    dx10 = compressed and (format_ in dx10_formats or arraySize > 1)
 
     luminance = False
     RGB = False
@@ -336,6 +370,7 @@ def generateHeader(num_mipmaps, w, h, format_, compSel, size, compressed):
     flags = 0x00000001 | 0x00001000 | 0x00000004 | 0x00000002
 
     caps = 0x00001000
+    caps2 = 0
 
     if num_mipmaps == 0:
         num_mipmaps = 1
@@ -344,6 +379,15 @@ def generateHeader(num_mipmaps, w, h, format_, compSel, size, compressed):
         flags |= 0x00020000
         caps |= 0x00000008 | 0x00400000
 
+    if depth > 1:  # VOLUME
+        flags |= 0x00800000
+        caps |= 0x00000008
+        caps2 |= 0x00200000
+
+    elif cubemap:  # CUBEMAP, with all 6 faces
+        caps |= 0x00000008
+        caps2 |= 0x00000200 | 0x0000FC00
+
     if not compressed:
         flags |= 0x00000008
 
@@ -383,15 +427,19 @@ def generateHeader(num_mipmaps, w, h, format_, compSel, size, compressed):
         elif format_ == "BC3":
             fourcc = b'DXT5'
 
-        elif format_ in dx10_formats:
+        if dx10:
             fourcc = b'DX10'
 
+    if dx10:
+        pflags = 0x00000004
+
     hdr[0:0 + 4] = b'DDS '
     hdr[4:4 + 4] = 124 .to_bytes(4, 'little')
     hdr[8:8 + 4] = flags.to_bytes(4, 'little')
     hdr[12:12 + 4] = h.to_bytes(4, 'little')
     hdr[16:16 + 4] = w.to_bytes(4, 'little')
     hdr[20:20 + 4] = size.to_bytes(4, 'little')
+    hdr[24:24 + 4] = (depth if depth > 1 else 0).to_bytes(4, 'little')
     hdr[28:28 + 4] = num_mipmaps.to_bytes(4, 'little')
     hdr[76:76 + 4] = 32 .to_bytes(4, 'little')
     hdr[80:80 + 4] = pflags.to_bytes(4, 'little')
@@ -427,17 +475,10 @@ def generateHeader(num_mipmaps, w, h, format_, compSel, size, compressed):
             hdr[104:104 + 4] = compSels[3].to_bytes(4, 'little')
 
     hdr[108:108 + 4] = caps.to_bytes(4, 'little')
+    hdr[112:112 + 4] = caps2.to_bytes(4, 'little')
 
-    if format_ == "BC4U":
-        hdr += bytearray(b"\x50\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00")
-
-    elif format_ == "BC4S":
-        hdr += bytearray(b"\x51\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00")
-
-    elif format_ == "BC5U":
-        hdr += bytearray(b"\x53\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00")
-
-    elif format_ == "BC5S":
-        hdr += bytearray(b"\x54\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00")
+    if dx10:
+        # DXGI format, TEXTURE2D, TEXTURECUBE flag, array size, alpha mode
+        hdr += struct.pack("<5I", dxgi_formats.get(format_, format_), 3, 0x4 if cubemap else 0, arraySize, 0)
 
     return hdr
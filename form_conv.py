@@ -150,3 +150,218 @@ def swapRB_32bpp(data, format_):
         new_data[4 * i + 0] = new_pixel & 0xFF
 
     return bytes(new_data)
+
+
+def _rgb565_to_rgba8(pixel):
+    red = pixel & 0x1F
+    green = (pixel & 0x7E0) >> 5
+    blue = (pixel & 0xF800) >> 11
+
+    return (red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2), 0xFF
+
+
+def _rgb5a1_to_rgba8(pixel):
+    red = pixel & 0x1F
+    green = (pixel & 0x3E0) >> 5
+    blue = (pixel & 0x7c00) >> 10
+    alpha = (pixel & 0x8000) >> 15
+
+    return (red << 3) | (red >> 2), (green << 3) | (green >> 2), (blue << 3) | (blue >> 2), alpha * 0xFF
+
+
+def _rgba4_to_rgba8(pixel):
+    red = pixel & 0xF
+    green = (pixel & 0xF0) >> 4
+    blue = (pixel & 0xF00) >> 8
+    alpha = (pixel & 0xF000) >> 12
+
+    return red * 0x11, green * 0x11, blue * 0x11, alpha * 0x11
+
+
+def _la8_to_rgba8(pixel):
+    luminance = pixel & 0xFF
+    alpha = (pixel & 0xFF00) >> 8
+
+    return luminance, luminance, luminance, alpha
+
+
+def _bgr10a2_to_rgba8(pixel):
+    red = (pixel & 0x3FF00000) >> 20
+    green = (pixel & 0xFFC00) >> 10
+    blue = pixel & 0x3FF
+    alpha = (pixel & 0xC0000000) >> 30
+
+    return red >> 2, green >> 2, blue >> 2, alpha * 0x55
+
+
+def _l8_to_rgba8(pixel):
+    return pixel, pixel, pixel, 0xFF
+
+
+def _la4_to_rgba8(pixel):
+    luminance = (pixel & 0xF) * 0x11
+    alpha = ((pixel & 0xF0) >> 4) * 0x11
+
+    return luminance, luminance, luminance, alpha
+
+
+def torgba8(data, format_):
+    if format_ == 'rgba8':
+        return bytes(data)
+
+    if format_ == 'bgr10a2':
+        bytesPerPixel = 4
+        convert = _bgr10a2_to_rgba8
+
+    elif format_ in ['rgb565', 'rgb5a1', 'rgba4', 'la8']:
+        bytesPerPixel = 2
+        convert = {'rgb565': _rgb565_to_rgba8, 'rgb5a1': _rgb5a1_to_rgba8,
+                   'rgba4': _rgba4_to_rgba8, 'la8': _la8_to_rgba8}[format_]
+
+    else:
+        bytesPerPixel = 1
+        convert = _la4_to_rgba8 if format_ == 'la4' else _l8_to_rgba8
+
+    numPixels = len(data) // bytesPerPixel
+
+    new_data = bytearray(numPixels * 4)
+
+    for i in range(numPixels):
+        pixel = int.from_bytes(data[bytesPerPixel * i:bytesPerPixel * (i + 1)], 'little')
+        new_data[4 * i:4 * i + 4] = bytes(convert(pixel))
+
+    return bytes(new_data)
+
+
+def _quantizeTable(bits, shift):
+    maxValue = (1 << bits) - 1
+    return bytes(((((value * maxValue + 127) // 255) << shift) & 0xFF) for value in range(256))
+
+
+def _quantizeTableHigh(bits, lowBits, shift):
+    # The part of a quantized channel that does not fit in the low byte
+    maxValue = (1 << bits) - 1
+    return bytes(((((value * maxValue + 127) // 255) >> lowBits) << shift) & 0xFF for value in range(256))
+
+
+def _combine(*channels):
+    # Bitwise OR of byte strings with disjoint bits, done on big integers
+    value = 0
+    for channel in channels:
+        value |= int.from_bytes(channel, 'little')
+
+    return value.to_bytes(len(channels[0]), 'little')
+
+
+def fromrgba8(data, format_):
+    numPixels = len(data) // 4
+
+    if format_ == 'rgba8':
+        return bytes(data[:numPixels * 4])
+
+    data = bytes(data[:numPixels * 4])
+
+    red = data[0::4]
+    green = data[1::4]
+    blue = data[2::4]
+    alpha = data[3::4]
+
+    if format_ == 'l8':
+        return red
+
+    elif format_ == 'la8':
+        new_data = bytearray(numPixels * 2)
+        new_data[0::2] = red
+        new_data[1::2] = alpha
+
+        return bytes(new_data)
+
+    if format_ == 'rgb565':
+        low = _combine(red.translate(_quantizeTable(5, 0)), green.translate(_quantizeTable(6, 5)))
+        high = _combine(green.translate(_quantizeTableHigh(6, 3, 0)), blue.translate(_quantizeTable(5, 3)))
+
+    elif format_ == 'rgb5a1':
+        low = _combine(red.translate(_quantizeTable(5, 0)), green.translate(_quantizeTable(5, 5)))
+        high = _combine(green.translate(_quantizeTableHigh(5, 3, 0)), blue.translate(_quantizeTable(5, 2)),
+                        alpha.translate(_quantizeTable(1, 7)))
+
+    else:  # rgba4
+        low = _combine(red.translate(_quantizeTable(4, 0)), green.translate(_quantizeTable(4, 4)))
+        high = _combine(blue.translate(_quantizeTable(4, 0)), alpha.translate(_quantizeTable(4, 4)))
+
+    new_data = bytearray(numPixels * 2)
+    new_data[0::2] = low
+    new_data[1::2] = high
+
+    return bytes(new_data)
+
+
+def unfilter(raw, height, bytesPerPixel, rowSize):
+    # Undo the filter of every row of PNG image data, each row starts with its filter type
+    data = bytearray(rowSize * height)
+    prev = bytearray(rowSize)
+
+    for y in range(height):
+        pos = y * (rowSize + 1)
+        filterType = raw[pos]
+        row = bytearray(raw[pos + 1:pos + 1 + rowSize])
+
+        if filterType == 1:  # Sub
+            for i in range(bytesPerPixel, rowSize):
+                row[i] = (row[i] + row[i - bytesPerPixel]) & 0xFF
+
+        elif filterType == 2:  # Up
+            for i in range(rowSize):
+                row[i] = (row[i] + prev[i]) & 0xFF
+
+        elif filterType == 3:  # Average
+            for i in range(rowSize):
+                left = row[i - bytesPerPixel] if i >= bytesPerPixel else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xFF
+
+        elif filterType == 4:  # Paeth
+            for i in range(rowSize):
+                if i >= bytesPerPixel:
+                    a = row[i - bytesPerPixel]
+                    c = prev[i - bytesPerPixel]
+
+                else:
+                    a = c = 0
+
+                b = prev[i]
+                p = a + b - c
+                pa = abs(p - a)
+                pb = abs(p - b)
+                pc = abs(p - c)
+
+                if pa <= pb and pa <= pc:
+                    row[i] = (row[i] + a) & 0xFF
+
+                elif pb <= pc:
+                    row[i] = (row[i] + b) & 0xFF
+
+                else:
+                    row[i] = (row[i] + c) & 0xFF
+
+        elif filterType != 0:
+            raise ValueError("Invalid PNG filter type!")
+
+        data[y * rowSize:(y + 1) * rowSize] = row
+        prev = row
+
+    return data
+
+
+def unpackBits(data, width, height, rowSize, bitDepth):
+    # Expand 1, 2 and 4 bit samples to one byte each
+    samples = bytearray(width * height)
+    perByte = 8 // bitDepth
+    mask = (1 << bitDepth) - 1
+
+    for y in range(height):
+        row = data[y * rowSize:(y + 1) * rowSize]
+        for x in range(width):
+            shift = 8 - bitDepth * (x % perByte + 1)
+            samples[y * width + x] = (row[x // perByte] >> shift) & mask
+
+    return samples
@@ -8,7 +8,8 @@
 
 from cpython cimport array
 from cython cimport view
-from libc.stdlib cimport malloc, free
+from libc.stdlib cimport malloc, calloc, free
+from libc.string cimport memcpy
 
 
 ctypedef unsigned char u8
@@ -16,6 +17,39 @@ ctypedef unsigned short u16
 ctypedef unsigned int u32
 
 
+# The formats as C ints, so the loops don't compare strings for every pixel
+cdef enum:
+    FORMAT_OTHER, FORMAT_RGBA8, FORMAT_BGR10A2, FORMAT_RGB565, FORMAT_RGB5A1, FORMAT_RGBA4, FORMAT_LA8, FORMAT_LA4, FORMAT_L8
+
+
+cdef int _formatId(str format_):
+    if format_ == 'rgba8':
+        return FORMAT_RGBA8
+
+    elif format_ == 'bgr10a2':
+        return FORMAT_BGR10A2
+
+    elif format_ == 'rgb565':
+        return FORMAT_RGB565
+
+    elif format_ == 'rgb5a1':
+        return FORMAT_RGB5A1
+
+    elif format_ == 'rgba4':
+        return FORMAT_RGBA4
+
+    elif format_ == 'la8':
+        return FORMAT_LA8
+
+    elif format_ == 'la4':
+        return FORMAT_LA4
+
+    elif format_ == 'l8':
+        return FORMAT_L8
+
+    return FORMAT_OTHER
+
+
 cpdef bytes rgb8torgbx8(bytearray data):
     cdef:
         u32 numPixels = len(data) // 3
@@ -82,6 +116,7 @@ cpdef bytes swapRB_16bpp(bytes data, str format_):
         u8 *new_data = <u8 *>malloc(numPixels * 2)
         u16 pixel, new_pixel
         u32 i
+        int formatId = _formatId(format_)
 
     try:
         for i in range(numPixels):
@@ -90,13 +125,13 @@ cpdef bytes swapRB_16bpp(bytes data, str format_):
                 data[2 * i + 0]
             )
 
-            if format_ == 'rgb565':
+            if formatId == FORMAT_RGB565:
                 new_pixel = _swapRB_rgb565(pixel)
 
-            elif format_ == 'rgb5a1':
+            elif formatId == FORMAT_RGB5A1:
                 new_pixel = _swapRB_rgb5a1(pixel)
 
-            elif format_ == 'rgba4':
+            elif formatId == FORMAT_RGBA4:
                 new_pixel = _swapRB_rgba4(pixel)
 
             else:
@@ -167,6 +202,7 @@ cpdef bytes swapRB_32bpp(bytes data, str format_):
 
         u8 *new_data = <u8 *>malloc(numPixels * 4)
         u32 i, pixel, new_pixel
+        int formatId = _formatId(format_)
 
     try:
         for i in range(numPixels):
@@ -177,7 +213,7 @@ cpdef bytes swapRB_32bpp(bytes data, str format_):
                 data[4 * i + 0]
             )
 
-            if format_ == 'bgr10a2':
+            if formatId == FORMAT_BGR10A2:
                 new_pixel = _swapRB_bgr10a2(pixel)
 
             else:
@@ -192,3 +228,272 @@ cpdef bytes swapRB_32bpp(bytes data, str format_):
 
     finally:
         free(new_data)
+
+
+cdef void _torgba8(u32 pixel, int formatId, u8 *rgba):
+    cdef u32 red, green, blue, alpha
+
+    if formatId == FORMAT_BGR10A2:
+        red = (pixel & 0x3FF00000) >> 20
+        green = (pixel & 0xFFC00) >> 10
+        blue = pixel & 0x3FF
+        alpha = (pixel & 0xC0000000) >> 30
+
+        rgba[0] = red >> 2
+        rgba[1] = green >> 2
+        rgba[2] = blue >> 2
+        rgba[3] = alpha * 0x55
+
+    elif formatId == FORMAT_RGB565:
+        red = pixel & 0x1F
+        green = (pixel & 0x7E0) >> 5
+        blue = (pixel & 0xF800) >> 11
+
+        rgba[0] = (red << 3) | (red >> 2)
+        rgba[1] = (green << 2) | (green >> 4)
+        rgba[2] = (blue << 3) | (blue >> 2)
+        rgba[3] = 0xFF
+
+    elif formatId == FORMAT_RGB5A1:
+        red = pixel & 0x1F
+        green = (pixel & 0x3E0) >> 5
+        blue = (pixel & 0x7c00) >> 10
+        alpha = (pixel & 0x8000) >> 15
+
+        rgba[0] = (red << 3) | (red >> 2)
+        rgba[1] = (green << 3) | (green >> 2)
+        rgba[2] = (blue << 3) | (blue >> 2)
+        rgba[3] = alpha * 0xFF
+
+    elif formatId == FORMAT_RGBA4:
+        rgba[0] = (pixel & 0xF) * 0x11
+        rgba[1] = ((pixel & 0xF0) >> 4) * 0x11
+        rgba[2] = ((pixel & 0xF00) >> 8) * 0x11
+        rgba[3] = ((pixel & 0xF000) >> 12) * 0x11
+
+    elif formatId == FORMAT_LA8:
+        rgba[0] = rgba[1] = rgba[2] = pixel & 0xFF
+        rgba[3] = (pixel & 0xFF00) >> 8
+
+    elif formatId == FORMAT_LA4:
+        rgba[0] = rgba[1] = rgba[2] = (pixel & 0xF) * 0x11
+        rgba[3] = ((pixel & 0xF0) >> 4) * 0x11
+
+    else:
+        rgba[0] = rgba[1] = rgba[2] = pixel
+        rgba[3] = 0xFF
+
+
+cpdef bytes torgba8(bytes data, str format_):
+    cdef:
+        int formatId = _formatId(format_)
+        u32 bytesPerPixel
+
+    if formatId == FORMAT_RGBA8:
+        return data
+
+    elif formatId == FORMAT_BGR10A2:
+        bytesPerPixel = 4
+
+    elif formatId in [FORMAT_RGB565, FORMAT_RGB5A1, FORMAT_RGBA4, FORMAT_LA8]:
+        bytesPerPixel = 2
+
+    else:
+        bytesPerPixel = 1
+
+    cdef:
+        u32 numPixels = len(data) // bytesPerPixel
+
+        u8 *new_data = <u8 *>malloc(numPixels * 4)
+        u32 i, n, pixel
+
+    try:
+        for i in range(numPixels):
+            pixel = 0
+            for n in range(bytesPerPixel):
+                pixel |= (<u32>data[bytesPerPixel * i + n]) << (8 * n)
+
+            _torgba8(pixel, formatId, &new_data[4 * i])
+
+        return bytes(<u8[:numPixels * 4]>new_data)
+
+    finally:
+        free(new_data)
+
+
+cdef inline u32 _quantize(u32 value, u32 bits):
+    return (value * ((1 << bits) - 1) + 127) // 255
+
+
+cpdef bytes fromrgba8(bytes data, str format_):
+    cdef int formatId = _formatId(format_)
+
+    if formatId == FORMAT_RGBA8:
+        return data
+
+    cdef:
+        u32 numPixels = len(data) // 4
+        u32 bytesPerPixel = 1 if formatId == FORMAT_L8 else 2
+
+        u8 *new_data = <u8 *>malloc(numPixels * bytesPerPixel)
+        u8 red, green, blue, alpha
+        u16 new_pixel
+        u32 i
+
+    try:
+        for i in range(numPixels):
+            red = data[4 * i + 0]
+            green = data[4 * i + 1]
+            blue = data[4 * i + 2]
+            alpha = data[4 * i + 3]
+
+            if formatId == FORMAT_L8:
+                new_data[i] = red
+                continue
+
+            elif formatId == FORMAT_LA8:
+                new_pixel = (alpha << 8) | red
+
+            elif formatId == FORMAT_RGB565:
+                new_pixel = (_quantize(blue, 5) << 11) | (_quantize(green, 6) << 5) | _quantize(red, 5)
+
+            elif formatId == FORMAT_RGB5A1:
+                new_pixel = ((_quantize(alpha, 1) << 15) | (_quantize(blue, 5) << 10)
+                             | (_quantize(green, 5) << 5) | _quantize(red, 5))
+
+            else:
+                new_pixel = ((_quantize(alpha, 4) << 12) | (_quantize(blue, 4) << 8)
+                             | (_quantize(green, 4) << 4) | _quantize(red, 4))
+
+            new_data[2 * i + 1] = (new_pixel & 0xFF00) >> 8
+            new_data[2 * i + 0] = new_pixel & 0xFF
+
+        return bytes(<u8[:numPixels * bytesPerPixel]>new_data)
+
+    finally:
+        free(new_data)
+
+
+cdef int _unfilter(const u8 *raw, u8 *data, const u8 *zeroes, u32 height, u32 bytesPerPixel, u32 rowSize) noexcept nogil:
+    cdef:
+        const u8 *row
+        const u8 *prev
+        u8 *out
+        u8 filterType
+        int a, b, c, pa, pb, pc
+        u32 y, i, first = min(bytesPerPixel, rowSize)
+
+    for y in range(height):
+        row = raw + y * (rowSize + 1)
+        filterType = row[0]
+        row += 1
+
+        out = data + y * rowSize
+        # The row above the first one is all zeroes
+        prev = out - rowSize if y else zeroes
+
+        if filterType == 0:  # None
+            memcpy(out, row, rowSize)
+
+        elif filterType == 1:  # Sub
+            memcpy(out, row, first)
+            for i in range(first, rowSize):
+                out[i] = row[i] + out[i - bytesPerPixel]
+
+        elif filterType == 2:  # Up
+            for i in range(rowSize):
+                out[i] = row[i] + prev[i]
+
+        elif filterType == 3:  # Average
+            for i in range(first):
+                out[i] = row[i] + (prev[i] >> 1)
+
+            for i in range(first, rowSize):
+                out[i] = row[i] + ((out[i - bytesPerPixel] + prev[i]) >> 1)
+
+        elif filterType == 4:  # Paeth, the left and upper left bytes of the first pixel are 0
+            for i in range(first):
+                out[i] = row[i] + prev[i]
+
+            for i in range(first, rowSize):
+                a = out[i - bytesPerPixel]
+                b = prev[i]
+                c = prev[i - bytesPerPixel]
+
+                pa = abs(b - c)
+                pb = abs(a - c)
+                pc = abs(a + b - 2 * c)
+
+                if pa <= pb and pa <= pc:
+                    out[i] = row[i] + a
+
+                elif pb <= pc:
+                    out[i] = row[i] + b
+
+                else:
+                    out[i] = row[i] + c
+
+        else:
+            return -1
+
+    return 0
+
+
+cpdef bytes unfilter(bytes raw, u32 height, u32 bytesPerPixel, u32 rowSize):
+    # Undo the filter of every row of PNG image data, each row starts with its filter type
+    if len(raw) < <Py_ssize_t>height * (rowSize + 1):
+        raise ValueError("Not enough PNG image data!")
+
+    cdef:
+        const u8 *src = raw
+        u32 size = height * rowSize
+        u8 *data = <u8 *>malloc(max(1, size))
+        u8 *zeroes = <u8 *>calloc(max(1, rowSize), 1)
+        int result
+
+    try:
+        if data == NULL or zeroes == NULL:
+            raise MemoryError()
+
+        with nogil:
+            result = _unfilter(src, data, zeroes, height, bytesPerPixel, rowSize)
+
+        if result:
+            raise ValueError("Invalid PNG filter type!")
+
+        return bytes(<u8[:size]>data) if size else b''
+
+    finally:
+        free(data)
+        free(zeroes)
+
+
+cpdef bytes unpackBits(data, u32 width, u32 height, u32 rowSize, u32 bitDepth):
+    # Expand 1, 2 and 4 bit samples to one byte each
+    if bitDepth not in [1, 2, 4] or len(data) < <Py_ssize_t>height * rowSize or rowSize < (width * bitDepth + 7) // 8:
+        raise ValueError("Invalid PNG image data!")
+
+    cdef:
+        bytes data_ = bytes(data)
+        const u8 *src = data_
+        u32 size = width * height
+        u8 *samples = <u8 *>malloc(max(1, size))
+        u32 perByte = 8 // bitDepth
+        u8 mask = (1 << bitDepth) - 1
+        const u8 *row
+        u32 x, y
+
+    if samples == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for y in range(height):
+                row = src + y * rowSize
+                for x in range(width):
+                    samples[y * width + x] = (row[x // perByte] >> (8 - bitDepth * (x % perByte + 1))) & mask
+
+        return bytes(<u8[:size]>samples) if size else b''
+
+    finally:
+        free(samples)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""gtx_async.py: asyncio API for GTX conversions (Python 3.5 or higher).
+
+    gtx = await pack_dds("texture.dds", "texture.gtx")
+    dds = await extract_gtx("texture.gtx", "texture.dds")
+
+The files are read and written in threads, and the conversions run on an executor,
+so the event loop is never blocked. Cancelling a call drops its job if it hasn't started yet.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import jobs
+
+################################################################
+################################################################
+
+
+def _readFile(path):
+    with open(path, "rb") as inf:
+        return inf.read()
+
+
+def _writeFile(path, data):
+    with open(path, "wb+") as output:
+        output.write(data)
+
+
+class Converter:
+    """
+    Runs conversion jobs on an executor, a ProcessPoolExecutor by default.
+    With a thread pool, jobs take turns in the addrlib backend.
+    At most maxJobs jobs are given to the executor at once, more calls wait for one of them to finish,
+    so a flood of requests doesn't pile up in the executor's queue.
+    """
+    def __init__(self, executor=None, maxJobs=None):
+        if executor is None:
+            executor = ProcessPoolExecutor()
+
+        if maxJobs is None:
+            maxJobs = getattr(executor, '_max_workers', 4) * 2
+
+        self.executor = executor
+        self.maxJobs = maxJobs
+        self.semaphore = None
+
+    async def run(self, function, *args):
+        # Created here so it belongs to the running event loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.maxJobs)
+
+        async with self.semaphore:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, jobs.runLocked, function, *args)
+
+    async def readFile(self, path):
+        return await asyncio.get_event_loop().run_in_executor(None, _readFile, path)
+
+    async def writeFile(self, path, data):
+        await asyncio.get_event_loop().run_in_executor(None, _writeFile, path, data)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
+
+
+_converter = None
+
+
+def getConverter():
+    """
+    The Converter used when none is given.
+    """
+    global _converter
+
+    if _converter is None:
+        _converter = Converter()
+
+    return _converter
+
+
+async def inspect_gtx(path, converter=None):
+    """
+    Return the surface info of every image in a GTX file, see jobs.inspect.
+    """
+    converter = converter or getConverter()
+    return await converter.run(jobs.inspect, await converter.readFile(path))
+
+
+async def extract_gtx(path, output=None, image=0, baseMip=0, maxMip=None, outFormat='dds', converter=None):
+    """
+    Extract an image of a GTX file as a DDS, PNG or TGA file (see jobs.extract).
+    The result is saved to output if it's given, and returned.
+    """
+    converter = converter or getConverter()
+
+    data = await converter.readFile(path)
+    result = await converter.run(jobs.extract, data, image, baseMip, maxMip, outFormat)
+
+    if output is not None:
+        await converter.writeFile(output, result)
+
+    return result
+
+
+async def pack_dds(path, output=None, tileMode=4, swizzle_=0, SRGB=0, format_=0x1a, quality=1, mipFilter=None,
+                   converter=None):
+    """
+    Pack a DDS (or PNG) file into a GTX file (see jobs.pack).
+    The result is saved to output if it's given, and returned.
+    """
+    converter = converter or getConverter()
+
+    data = await converter.readFile(path)
+    result = await converter.run(jobs.pack, data, tileMode, swizzle_, SRGB, format_, quality, mipFilter)
+
+    if output is not None:
+        await converter.writeFile(output, result)
+
+    return result
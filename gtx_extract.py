@@ -22,19 +22,49 @@
 
 """gtx_extract.py: Decode GTX images."""
 
+import hashlib
+import json
+import logging
+import mmap
 import os
 import struct
 import sys
 import time
+from collections import OrderedDict
+from functools import lru_cache
 
 import addrlib
 import dds
-from texRegisters import makeRegsBytearray
+import png_tga
+import profiling
+import sarc
+import watch
+from texRegisters import makeRegsBytearray, setRegsTiling
+
+try:
+    import pyximport
+
+    pyximport.install()
+    import mipmap_cy as mipmap
+
+except ImportError:
+    import mipmap
 
 __author__ = "AboodXD"
 __copyright__ = "Copyright 2015-2018 AboodXD"
 __credits__ = ["AboodXD", "AddrLib", "Exzap"]
 
+# Archives the GTX files in get extracted from
+archiveExts = ['.szs', '.sarc', '.pack']
+
+# Progress messages, only shown once setupLogging has been called
+log = logging.getLogger('gtx_extract')
+
+# One JSON line per converted image, off until setupLogging is given a destination
+eventLog = logging.getLogger('gtx_extract.events')
+eventLog.propagate = False
+eventLog.setLevel(logging.CRITICAL)
+
 formats = {0x00000000: 'GX2_SURFACE_FORMAT_INVALID',
            0x0000001a: 'GX2_SURFACE_FORMAT_TCS_R8_G8_B8_A8_UNORM',
            0x0000041a: 'GX2_SURFACE_FORMAT_TCS_R8_G8_B8_A8_SRGB',
@@ -152,6 +182,10 @@ def readGFD(f):
 
     gfd.majorVersion = header.majorVersion
 
+    # Image and mipmap blocks are kept as views into the file data,
+    # so they are only copied when they actually get deswizzled.
+    view = memoryview(f)
+
     pos = header.size
 
     blockB = False
@@ -205,12 +239,7 @@ def readGFD(f):
             pos += surface.size
 
             if surface.numMips > 14:
-                print("")
-                print("Invalid number of mipmaps for image " + str(imgInfo - 1))
-                print("")
-                print("Exiting in 5 seconds...")
-                time.sleep(5)
-                sys.exit(1)
+                raise ValueError("Invalid number of mipmaps for image " + str(imgInfo - 1) + "!")
 
             mipOffsets = []
             for i in range(13):
@@ -275,57 +304,53 @@ def readGFD(f):
             blockC = True
 
             gfd.dataSize.append(block.dataSize)
-            gfd.data.append(f[pos:pos + block.dataSize])
+            gfd.data.append(view[pos:pos + block.dataSize])
             pos += block.dataSize
 
         elif block.type_ == mipBlkType:
-            gfd.mipData[images - 1] = f[pos:pos + block.dataSize]
+            gfd.mipData[images - 1] = view[pos:pos + block.dataSize]
             pos += block.dataSize
 
         else:
             pos += block.dataSize
 
     if images != imgInfo:
-        print("")
-        print("GX2 Surface and Image data count mismatch.")
-        print("")
-        print("Exiting in 5 seconds...")
-        time.sleep(5)
-        sys.exit(1)
+        raise ValueError("GX2 Surface and Image data count mismatch!")
 
     if blockB:
         if not blockC:
-            print("")
-            print("GX2 Surface was found but no Image data was found.")
-            print("")
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+            raise ValueError("GX2 Surface was found but no Image data was found!")
+
     if not blockB:
         if not blockC:
-            print("")
-            print("No Image was found in this file.")
-            print("")
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+            raise ValueError("No Image was found in this file!")
 
         elif blockC:
-            print("")
-            print("Image data was found but no GX2 Surface was found.")
-            print("")
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+            raise ValueError("Image data was found but no GX2 Surface was found!")
 
     gfd.numImages = images
 
     return gfd
 
 
-def get_deswizzled_data(i, gfd):
-    majorVersion = gfd.majorVersion
-    numImages = gfd.numImages
+def getNumSlices(dim, depth, mipLevel=0):
+    """
+    Number of slices in a mipmap level of a surface:
+    the depth of 3D surfaces, the faces of cube maps or the layers of arrays.
+    """
+    if dim == 2:
+        return max(1, depth >> mipLevel)
+
+    elif dim == 3:
+        return max(6, depth)
+
+    elif dim in [4, 5, 7]:
+        return max(1, depth)
+
+    return 1
+
+
+def get_deswizzled_data(i, gfd, baseMip=0, maxMip=None):
     numMips = gfd.numMips[i]
     width = gfd.width[i]
     height = gfd.height[i]
@@ -340,7 +365,10 @@ def get_deswizzled_data(i, gfd):
     realSize = gfd.realSize[i]
     mipOffsets = gfd.mipOffsets[i]
 
-    surfOut = addrlib.getSurfaceInfo(format_, width, height, depth, dim, tileMode, aa, 0)
+    with profiling.stage('getSurfaceInfo', image=i, mip=0):
+        surfOut = addrlib.getSurfaceInfo(format_, width, height, depth, dim, tileMode, aa, 0)
+
+    baseSurfSize = surfOut.surfSize
     bpp = divRoundUp(surfOut.bpp, 8)
 
     try:
@@ -351,34 +379,10 @@ def get_deswizzled_data(i, gfd):
 
     if format_ in formats:
         if aa != 0:
-            print("")
-            print("Unsupported aa!")
-            print("")
-
-            if i != (numImages - 1):
-                print("Continuing in 5 seconds...")
-                time.sleep(5)
-                return b'', []
-
-            else:
-                print("Exiting in 5 seconds...")
-                time.sleep(5)
-                sys.exit(1)
+            raise ValueError("Unsupported aa!")
 
         if format_ == 0x00:
-            print("")
-            print("Invalid texture format!")
-            print("")
-
-            if i != (numImages - 1):
-                print("Continuing in 5 seconds...")
-                time.sleep(5)
-                return b'', []
-
-            else:
-                print("Exiting in 5 seconds...")
-                time.sleep(5)
-                sys.exit(1)
+            raise ValueError("Invalid texture format!")
 
         else:
             if format_ in [0x1a, 0x41a]:
@@ -426,24 +430,15 @@ def get_deswizzled_data(i, gfd):
             elif format_ == 0x235:
                 format__ = "BC5S"
 
-            if surfOut.depth != 1:
-                print("")
-                print("Unsupported depth!")
-                print("")
-
-                if i != (numImages - 1):
-                    print("Continuing in 5 seconds...")
-                    time.sleep(5)
-                    return b'', b'', b''
+            if maxMip is None or maxMip >= numMips:
+                maxMip = numMips - 1
 
-                else:
-                    print("Exiting in 5 seconds...")
-                    time.sleep(5)
-                    sys.exit(1)
+            if not 0 <= baseMip <= maxMip:
+                raise ValueError("Invalid mipmap range!")
 
-            if numMips > 1:
-                print("")
-                print("Processing " + str(numMips - 1) + " mipmap(s):")
+            if maxMip > max(baseMip, 0):
+                log.info("")
+                log.info("Processing %d mipmap(s):", maxMip - max(baseMip, 1) + 1)
 
             if format_ in BCn_formats:
                 blkWidth, blkHeight = 4, 4
@@ -452,49 +447,129 @@ def get_deswizzled_data(i, gfd):
                 blkWidth, blkHeight = 1, 1
 
             result = []
-            for mipLevel in range(numMips):
+            sizes = []
+            for mipLevel in range(baseMip, maxMip + 1):
                 width_ = max(1, width >> mipLevel)
                 height_ = max(1, height >> mipLevel)
+                slices = getNumSlices(dim, depth, mipLevel)
 
                 size = divRoundUp(width_, blkWidth) * divRoundUp(height_, blkHeight) * bpp
 
                 if mipLevel != 0:
-                    print(str(mipLevel) + ": " + str(width_) + "x" + str(height_))
+                    log.info("%d: %dx%d", mipLevel, width_, height_)
 
                     mipOffset = mipOffsets[mipLevel - 1]
                     if mipLevel == 1:
-                        mipOffset -= surfOut.surfSize
+                        mipOffset -= baseSurfSize
+
+                    with profiling.stage('getSurfaceInfo', image=i, mip=mipLevel):
+                        surfOut = addrlib.getSurfaceInfo(format_, width, height, depth, dim, tileMode, aa, mipLevel)
 
-                    surfOut = addrlib.getSurfaceInfo(format_, width, height, depth, dim, tileMode, aa, mipLevel)
                     data = mipData[mipOffset:mipOffset + surfOut.surfSize]
 
-                result_ = addrlib.deswizzle(
-                    width_, height_, surfOut.height, format_, surfOut.tileMode,
-                    swizzle_, surfOut.pitch, surfOut.bpp, data,
-                )
+                with profiling.stage('deswizzle', len(data), image=i, mip=mipLevel):
+                    result_ = addrlib.deswizzle(
+                        width_, height_, surfOut.height, format_, surfOut.tileMode,
+                        swizzle_, surfOut.pitch, surfOut.bpp, bytes(data), slices,
+                    )
 
-                result.append(result_[:size])
+                result.append(result_[:size * slices])
+                sizes.append(size)
 
-            hdr = dds.generateHeader(numMips, width, height, format__, compSel, realSize, format_ in BCn_formats)
+            numSlices = getNumSlices(dim, depth)
 
-    else:
-        print("")
-        print("Unsupported texture format_: " + hex(format_))
-        print("")
+            if dim != 2 and numSlices > 1:
+                # DDS files store all the mipmaps of a cube face or array layer together
+                result = [result[j][slice_ * sizes[j]:(slice_ + 1) * sizes[j]]
+                          for slice_ in range(numSlices) for j in range(len(result))]
 
-        if i != (numImages - 1):
-            print("Continuing in 5 seconds...")
-            time.sleep(5)
-            hdr, result = b'', []
+            if dim == 2:
+                ddsDepth, arraySize = getNumSlices(dim, depth, baseMip), 1
 
-        else:
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+            elif dim == 3:
+                ddsDepth, arraySize = 1, numSlices // 6
+
+            else:
+                ddsDepth, arraySize = 1, numSlices
+
+            if baseMip:
+                realSize = divRoundUp(max(1, width >> baseMip), blkWidth) * divRoundUp(max(1, height >> baseMip), blkHeight) * bpp
+
+            with profiling.stage('ddsHeader', image=i):
+                hdr = dds.generateHeader(maxMip - baseMip + 1, max(1, width >> baseMip), max(1, height >> baseMip),
+                                         format__, compSel, realSize, format_ in BCn_formats,
+                                         ddsDepth, dim == 3, arraySize)
+
+    else:
+        raise ValueError("Unsupported texture format: " + hex(format_))
 
     return hdr, result
 
 
+def getMipSurface(gfd, i, mipLevel):
+    """
+    The surface info of a mipmap level of image i and its swizzled data (a view into the file).
+    """
+    if gfd.aa[i] != 0:
+        raise ValueError("Unsupported aa!")
+
+    if not 0 <= mipLevel < gfd.numMips[i]:
+        raise ValueError("Invalid mipmap level!")
+
+    surfOut = addrlib.getSurfaceInfo(gfd.format[i], gfd.width[i], gfd.height[i], gfd.depth[i], gfd.dim[i],
+                                     gfd.tileMode[i], 0, mipLevel)
+
+    if mipLevel == 0:
+        return surfOut, gfd.data[i]
+
+    mipOffset = gfd.mipOffsets[i][mipLevel - 1]
+    if mipLevel == 1:
+        mipOffset -= gfd.imageSize[i]
+
+    return surfOut, gfd.mipData[i][mipOffset:mipOffset + surfOut.surfSize]
+
+
+def readRegion(gfd, i, x, y, w, h, mipLevel=0, slice_=0):
+    """
+    Deswizzle a w*h rectangle of a mipmap level (and slice) of image i, without going through the rest of it.
+    Returns its linear data, for BCn formats the one of the 4x4 blocks that cover it.
+    Only the tiles of the rectangle are read, so with mapGFD only they get loaded from the disk.
+    """
+    surfOut, data = getMipSurface(gfd, i, mipLevel)
+
+    if (w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > max(1, gfd.width[i] >> mipLevel)
+            or y + h > max(1, gfd.height[i] >> mipLevel)
+            or not 0 <= slice_ < getNumSlices(gfd.dim[i], gfd.depth[i], mipLevel)):
+        raise ValueError("Invalid region!")
+
+    return addrlib.deswizzleRegion(x, y, w, h, slice_, surfOut.height, gfd.format[i], surfOut.tileMode,
+                                   gfd.swizzle[i], surfOut.pitch, surfOut.bpp, data)
+
+
+def readTexel(gfd, i, x, y, mipLevel=0, slice_=0):
+    """
+    The bytes of the element of image i at texel x, y (the 4x4 block it's in, for BCn formats).
+    """
+    surfOut, data = getMipSurface(gfd, i, mipLevel)
+
+    if (not 0 <= x < max(1, gfd.width[i] >> mipLevel) or not 0 <= y < max(1, gfd.height[i] >> mipLevel)
+            or not 0 <= slice_ < getNumSlices(gfd.dim[i], gfd.depth[i], mipLevel)):
+        raise ValueError("Invalid texel!")
+
+    pos = addrlib.getTexelAddr(x, y, slice_, surfOut.height, gfd.format[i], surfOut.tileMode, gfd.swizzle[i],
+                               surfOut.pitch, surfOut.bpp)
+
+    return bytes(data[pos:pos + surfOut.bpp // 8])
+
+
+def mapGFD(path):
+    """
+    readGFD on a memory-mapped GTX file, its image data is only read from the disk when it's accessed.
+    """
+    with open(path, "rb") as inf:
+        return readGFD(mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ))
+
+
 def getCurrentMipOffset_Size(width, height, blkWidth, blkHeight, bpp, currLevel):
     offset = 0
 
@@ -517,6 +592,64 @@ def warn_color():
     print("Warning: colors might mess up!!")
 
 
+def getSwizzleValue(tileMode, swizzle_):
+    """
+    The GX2Surface swizzle value for the initial swizzle value swizzle_ (0 to 7).
+    """
+    if tileMode in [1, 2, 3, 16]:
+        return swizzle_ << 8
+
+    return 0xd0000 | swizzle_ << 8
+
+
+def getMipLayout(format_, width, height, depth, dim, tileMode, numMips):
+    """
+    Lay out all the mipmap levels of a surface.
+    Returns the surface info of each level, imageSize, mipSize and the mipOffsets (as stored in the GX2Surface).
+    """
+    surfOuts = []
+    imageSize = mipSize = 0
+    mipOffsets = []
+
+    for mipLevel in range(numMips):
+        surfOut = addrlib.getSurfaceInfo(format_, width, height, depth, dim, tileMode, 0, mipLevel)
+        surfOuts.append(surfOut)
+
+        if mipLevel == 0:
+            imageSize = surfOut.surfSize
+            continue
+
+        offset = roundUp(mipSize, surfOut.baseAlign)
+        mipOffsets.append(imageSize if mipLevel == 1 else offset)
+        mipSize = offset + surfOut.surfSize
+
+    return surfOuts, imageSize, mipSize, mipOffsets
+
+
+# Tile modes tried by chooseTileMode for each policy, the first one is used if there are several smallest ones
+autoTileModes = OrderedDict([
+    ('size', [4, 5, 6, 8, 9, 10, 12, 14, 2, 1]),
+    ('2d', [4, 5, 6, 8, 9, 10, 12, 14]),
+])
+
+
+@lru_cache(maxsize=256)
+def chooseTileMode(format_, width, height, numMips, policy='size', depth=1, dim=1):
+    """
+    The tile mode of the policy's ones that gives a surface with its mipmaps
+    the smallest imageSize + mipSize.
+    """
+    best = None
+
+    for tileMode in autoTileModes[policy]:
+        _, imageSize, mipSize, _ = getMipLayout(format_, width, height, depth, dim, tileMode, numMips)
+
+        if best is None or imageSize + mipSize < best[1]:
+            best = tileMode, imageSize + mipSize
+
+    return best[0]
+
+
 def getAlignBlockSize(dataOffset, alignment):
     alignSize = roundUp(dataOffset, alignment) - dataOffset - 32
 
@@ -528,87 +661,127 @@ def getAlignBlockSize(dataOffset, alignment):
     return alignSize
 
 
-def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
-    width, height, format_, fourcc, dataSize, compSel, numMips, data = dds.readDDS(f, SRGB)
+def readPNG(f, format_, SRGB, quality=1):
+    try:
+        width, height, rgba = png_tga.readPNG(f)
 
-    if 0 in [width, dataSize] and data == []:
+    except ValueError:
         print("")
+        print((f if isinstance(f, str) else "The input") + " is not a valid PNG file!")
 
-        if n != (numImages - 1):
-            print("Continuing in 5 seconds...")
-            time.sleep(5)
-            return b''
+        return 0, 0, 0, b'', 0, [], 0, []
 
-        else:
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+    if SRGB and format_ in [0x1a, 0x31, 0x33]:
+        format_ |= 0x400
 
-    if format_ not in formats:
-        print("")
-        print("Unsupported DDS format!")
+    if format_ not in png_tga.gx2_formats:
         print("")
+        print("Unsupported format for PNG input: " + hex(format_))
 
-        if n != (numImages - 1):
-            print("")
-            print("Continuing in 5 seconds...")
-            time.sleep(5)
-            return b''
+        return 0, 0, 0, b'', 0, [], 0, []
 
-        else:
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+    return png_tga.packRGBA8(width, height, rgba, format_, quality)
 
-    if numMips > 13:
-        print("")
-        print("Invalid number of mipmaps for " + f)
+
+def generateMips(f, image, mipFilter, quality=1):
+    """
+    Replace the mipmaps of an image (a tuple as returned by dds.readDDS)
+    with ones generated from its first level, down to 1x1.
+    """
+    width, height, format_, fourcc, dataSize, compSel, numMips, data = image
+
+    if 0 in [width, dataSize] and data == []:
+        return image
+
+    if format_ not in png_tga.gx2_formats:
         print("")
+        print("Can't generate mipmaps for " + formats.get(format_, hex(format_)) + ", keeping the ones in " + f)
 
-        if n != (numImages - 1):
-            print("")
-            print("Continuing in 5 seconds...")
-            time.sleep(5)
-            return b''
+        return image
 
-        else:
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
+    data = bytes(data[:dataSize])
+    rgba = png_tga.toRGBA8(data, width, height, format_)
+
+    # GX2 surfaces can't have more than 13 mipmaps
+    numMips = min(13, max(width, height).bit_length() - 1)
+    levels = mipmap.generateMipmaps(rgba, width, height, format_ in [0x41a, 0x431, 0x433], mipFilter, numMips)
+
+    mipData = [png_tga.packRGBA8(max(1, width >> mipLevel), max(1, height >> mipLevel), level, format_, quality)[7]
+               for mipLevel, level in enumerate(levels, 1)]
+
+    return width, height, format_, fourcc, dataSize, compSel, numMips, data + b''.join(mipData)
+
+
+def readImage(f, SRGB, n=0, format_=0x1a, quality=1, mipFilter=None):
+    """
+    Read a DDS or PNG file (PNG files are converted to format_), generating its mipmaps if mipFilter is set.
+    Returns a tuple as returned by dds.readDDS.
+    """
+    if f.lower().endswith('.png'):
+        with profiling.stage('readPNG', file=f, image=n):
+            image = readPNG(f, format_, SRGB, quality)
+
+    else:
+        with profiling.stage('readDDS', file=f, image=n):
+            image = dds.readDDS(f, SRGB)
+
+    if mipFilter is not None:
+        with profiling.stage('generateMips', file=f, image=n):
+            image = generateMips(f, image, mipFilter, quality)
+
+    return image
+
+
+def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages, format_=0x1a, quality=1, mipFilter=None):
+    image = readImage(f, SRGB, n, format_, quality, mipFilter)
+
+    return writeGFDSurface(f, image, tileMode, swizzle_, n, pos, numImages)
+
+
+def writeGFDSurface(f, image, tileMode, swizzle_, n, pos, numImages):
+    """
+    Build the GX2Surface, image and mipmap blocks for one image.
+    image is a tuple as returned by dds.readDDS or png_tga.packRGBA8,
+    so raw RGBA8 data can be packed without going through a file.
+    tileMode can also be the name of an autoTileModes policy, see chooseTileMode.
+    """
+    width, height, format_, fourcc, dataSize, compSel, numMips, data = image
+
+    if 0 in [width, dataSize] and data == []:
+        raise ValueError("Invalid or unsupported input file!")
+
+    if format_ not in formats:
+        raise ValueError("Unsupported DDS format!")
+
+    if numMips > 13:
+        raise ValueError("Invalid number of mipmaps for " + f + "!")
 
     numMips += 1
 
+    if tileMode in autoTileModes:
+        policy = tileMode
+        tileMode = chooseTileMode(format_, width, height, numMips, policy)
+
+        log.info("")
+        log.info("Picked tileMode %d (%s policy)", tileMode, policy)
+
     bpp = addrlib.surfaceGetBitsPerPixel(format_) >> 3
-    surfOut = addrlib.getSurfaceInfo(format_, width, height, 1, 1, tileMode, 0, 0)
+
+    with profiling.stage('getSurfaceInfo', image=n, mip=0):
+        surfOut = addrlib.getSurfaceInfo(format_, width, height, 1, 1, tileMode, 0, 0)
 
     alignment = surfOut.baseAlign
     imageSize = surfOut.surfSize
     pitch = surfOut.pitch
 
     if surfOut.depth != 1:
-        print("")
-        print("Unsupported depth!")
-        print("")
-
-        if n != (numImages - 1):
-            print("Continuing in 5 seconds...")
-            time.sleep(5)
-            return b''
-
-        else:
-            print("Exiting in 5 seconds...")
-            time.sleep(5)
-            sys.exit(1)
-
-    if tileMode in [1, 2, 3, 16]:
-        s = swizzle_ << 8
+        raise ValueError("Unsupported depth!")
 
-    else:
-        s = 0xd0000 | swizzle_ << 8
+    s = getSwizzleValue(tileMode, swizzle_)
 
     if numMips > 1:
-        print("")
-        print("Processing " + str(numMips - 1) + " mipmap(s):")
+        log.info("")
+        log.info("Processing %d mipmap(s):", numMips - 1)
 
     if format_ in BCn_formats:
         blkWidth, blkHeight = 4, 4
@@ -628,8 +801,9 @@ def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
         height_ = max(1, height >> mipLevel)
 
         if mipLevel:
-            print(str(mipLevel) + ": " + str(width_) + "x" + str(height_))
-            surfOut = addrlib.getSurfaceInfo(format_, width, height, 1, 1, tileMode, 0, mipLevel)
+            log.info("%d: %dx%d", mipLevel, width_, height_)
+            with profiling.stage('getSurfaceInfo', image=n, mip=mipLevel):
+                surfOut = addrlib.getSurfaceInfo(format_, width, height, 1, 1, tileMode, 0, mipLevel)
 
             if mipLevel == 1:
                 mipOffsets.append(imageSize)
@@ -643,38 +817,40 @@ def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
         if mipLevel:
             mipSize += surfOut.surfSize + len(dataAlignBytes)
 
-        swizzled_data.append(bytearray(dataAlignBytes) + addrlib.swizzle(
-            width_, height_, surfOut.height, format_, surfOut.tileMode,
-            s, surfOut.pitch, surfOut.bpp, data_))
+        with profiling.stage('swizzle', len(data_), image=n, mip=mipLevel):
+            swizzled_data.append(bytearray(dataAlignBytes) + addrlib.swizzle(
+                width_, height_, surfOut.height, format_, surfOut.tileMode,
+                s, surfOut.pitch, surfOut.bpp, data_))
 
     compSels = ["R", "G", "B", "A", "0", "1"]
 
-    print("")
-    print("// ----- GX2Surface Info ----- ")
-    print("  dim             = 1")
-    print("  width           = " + str(width))
-    print("  height          = " + str(height))
-    print("  depth           = 1")
-    print("  numMips         = " + str(numMips))
-    print("  format          = " + formats[format_])
-    print("  aa              = 0")
-    print("  use             = 1")
-    print("  imageSize       = " + str(imageSize))
-    print("  mipSize         = " + str(mipSize))
-    print("  tileMode        = " + str(tileMode))
-    print("  swizzle         = " + str(s) + ", " + hex(s))
-    print("  alignment       = " + str(alignment))
-    print("  pitch           = " + str(pitch))
-    print("")
-    print("  GX2 Component Selector:")
-    print("    Red Channel:    " + str(compSels[compSel[0]]))
-    print("    Green Channel:  " + str(compSels[compSel[1]]))
-    print("    Blue Channel:   " + str(compSels[compSel[2]]))
-    print("    Alpha Channel:  " + str(compSels[compSel[3]]))
-    print("")
-    print("  bits per pixel  = " + str(bpp << 3))
-    print("  bytes per pixel = " + str(bpp))
-    print("  realSize        = " + str(divRoundUp(width, blkWidth) * divRoundUp(height, blkHeight) * bpp))
+    if log.isEnabledFor(logging.INFO):
+        log.info("")
+        log.info("// ----- GX2Surface Info ----- ")
+        log.info("  dim             = 1")
+        log.info("  width           = " + str(width))
+        log.info("  height          = " + str(height))
+        log.info("  depth           = 1")
+        log.info("  numMips         = " + str(numMips))
+        log.info("  format          = " + formats[format_])
+        log.info("  aa              = 0")
+        log.info("  use             = 1")
+        log.info("  imageSize       = " + str(imageSize))
+        log.info("  mipSize         = " + str(mipSize))
+        log.info("  tileMode        = " + str(tileMode))
+        log.info("  swizzle         = " + str(s) + ", " + hex(s))
+        log.info("  alignment       = " + str(alignment))
+        log.info("  pitch           = " + str(pitch))
+        log.info("")
+        log.info("  GX2 Component Selector:")
+        log.info("    Red Channel:    " + str(compSels[compSel[0]]))
+        log.info("    Green Channel:  " + str(compSels[compSel[1]]))
+        log.info("    Blue Channel:   " + str(compSels[compSel[2]]))
+        log.info("    Alpha Channel:  " + str(compSels[compSel[3]]))
+        log.info("")
+        log.info("  bits per pixel  = " + str(bpp << 3))
+        log.info("  bytes per pixel = " + str(bpp))
+        log.info("  realSize        = " + str(divRoundUp(width, blkWidth) * divRoundUp(height, blkHeight) * bpp))
 
     if format_ == 1:
         if compSel not in [[0, 0, 0, 5], [0, 5, 5, 5]]:
@@ -693,7 +869,8 @@ def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
             warn_color()
 
         if compSel[0] == 2 and compSel[2] == 0:
-            swizzled_data = [dds.form_conv.swapRB_16bpp(data, 'rgb565') for data in swizzled_data]
+            with profiling.stage('form_conv', sum(map(len, swizzled_data)), image=n):
+                swizzled_data = [dds.form_conv.swapRB_16bpp(data, 'rgb565') for data in swizzled_data]
 
         compSel = [0, 1, 2, 5]
 
@@ -703,10 +880,12 @@ def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
 
         if compSel[0] == 2 and compSel[2] == 0:
             if format_ == 0xb:
-                swizzled_data = [dds.form_conv.swapRB_16bpp(data, 'rgba4') for data in swizzled_data]
+                with profiling.stage('form_conv', sum(map(len, swizzled_data)), image=n):
+                    swizzled_data = [dds.form_conv.swapRB_16bpp(data, 'rgba4') for data in swizzled_data]
 
             else:
-                swizzled_data = [dds.form_conv.swapRB_16bpp(data, 'rgb5a1') for data in swizzled_data]
+                with profiling.stage('form_conv', sum(map(len, swizzled_data)), image=n):
+                    swizzled_data = [dds.form_conv.swapRB_16bpp(data, 'rgb5a1') for data in swizzled_data]
 
         compSel = [0, 1, 2, 3]
 
@@ -716,10 +895,12 @@ def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
 
         if compSel[0] == 2 and compSel[2] == 0:
             if format_ == 0x19:
-                swizzled_data = [dds.form_conv.swapRB_32bpp(data, 'bgr10a2') for data in swizzled_data]
+                with profiling.stage('form_conv', sum(map(len, swizzled_data)), image=n):
+                    swizzled_data = [dds.form_conv.swapRB_32bpp(data, 'bgr10a2') for data in swizzled_data]
 
             else:
-                swizzled_data = [dds.form_conv.swapRB_32bpp(data, 'rgba8') for data in swizzled_data]
+                with profiling.stage('form_conv', sum(map(len, swizzled_data)), image=n):
+                    swizzled_data = [dds.form_conv.swapRB_32bpp(data, 'rgba8') for data in swizzled_data]
 
         compSel = [0, 1, 2, 3]
 
@@ -781,190 +962,1487 @@ def writeGFD(f, tileMode, swizzle_, SRGB, n, pos, numImages):
     return output
 
 
-def printInfo():
-    print("")
-    print("Usage:")
-    print("  gtx_extract [option...] input")
-    print("")
-    print("Options:")
-    print(
-        " -o <output>           Output file, if not specified, the output file will have the same name as the intput file")
-    print("                       Will be ignored if the GTX has multiple images")
-    print("")
-    print("DDS to GTX options:")
-    print(" -tileMode <tileMode>  tileMode (4 is the default)")
-    print(" -swizzle <swizzle>    the intial swizzle value, a value from 0 to 7 (0 is the default)")
-    print(" -SRGB <n>             1 if the desired destination format is SRGB, else 0 (0 is the default)")
-    print(
-        " -multi <numImages>    number of images to pack into the GTX file (input file must be the first image, 1 is the default)")
-    print("")
-    print("Supported formats:")
-    print(" - GX2_SURFACE_FORMAT_TCS_R8_G8_B8_A8_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TCS_R8_G8_B8_A8_SRGB")
-    print(" - GX2_SURFACE_FORMAT_TCS_R10_G10_B10_A2_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TCS_R5_G6_B5_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TC_R5_G5_B5_A1_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TC_R4_G4_B4_A4_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TC_R8_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TC_R8_G8_UNORM")
-    print(" - GX2_SURFACE_FORMAT_TC_R4_G4_UNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC1_UNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC1_SRGB")
-    print(" - GX2_SURFACE_FORMAT_T_BC2_UNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC2_SRGB")
-    print(" - GX2_SURFACE_FORMAT_T_BC3_UNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC3_SRGB")
-    print(" - GX2_SURFACE_FORMAT_T_BC4_UNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC4_SNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC5_UNORM")
-    print(" - GX2_SURFACE_FORMAT_T_BC5_SNORM")
-    print("")
-    print("Exiting in 5 seconds...")
-    time.sleep(5)
-    sys.exit(1)
-
+def retileSurface(gfd, i, tileMode, swizzle_):
+    """
+    Move image i of a GTX file (as returned by readGFD) to a new tile mode and swizzle value.
+    Every mipmap level is retiled in a single pass with addrlib.retile, without deswizzling it first.
+    Returns the new surface info, image data and mipmap data.
+    """
+    format_ = gfd.format[i]
+    width = gfd.width[i]
+    height = gfd.height[i]
+    depth = gfd.depth[i]
+    dim = gfd.dim[i]
+    numMips = gfd.numMips[i]
+    mipData = gfd.mipData.get(i, b'')
 
-def main():
-    print("GTX Extractor v5.3")
-    print("(C) 2015-2018 AboodXD")
+    if gfd.aa[i] != 0:
+        raise ValueError("Unsupported aa!")
 
-    input_ = sys.argv[-1]
+    if addrlib.surfaceGetBitsPerPixel(format_) == 0:
+        raise ValueError("Invalid texture format!")
 
-    if not (input_.endswith('.gtx') or input_.endswith('.dds')):
-        printInfo()
+    srcSurfOuts, srcImageSize, _, _ = getMipLayout(format_, width, height, depth, dim, gfd.tileMode[i], numMips)
+    surfOuts, imageSize, mipSize, mipOffsets = getMipLayout(format_, width, height, depth, dim, tileMode, numMips)
 
-    toGTX = False
+    s = getSwizzleValue(tileMode, swizzle_)
+    imageData = b''
+    mipData_ = bytearray(mipSize)
 
-    if input_.endswith('.dds'):
-        toGTX = True
+    for mipLevel in range(numMips):
+        srcSurfOut = srcSurfOuts[mipLevel]
+        surfOut = surfOuts[mipLevel]
 
-    if "-o" in sys.argv:
-        output_ = sys.argv[sys.argv.index("-o") + 1]
-    else:
-        output_ = os.path.splitext(input_)[0] + (".gtx" if toGTX else ".dds")
+        if mipLevel == 0:
+            data = gfd.data[i][:srcSurfOut.surfSize]
 
-    if toGTX:
-        if "-tileMode" in sys.argv:
-            tileMode = int(sys.argv[sys.argv.index("-tileMode") + 1], 0)
         else:
-            tileMode = 4
+            mipOffset = gfd.mipOffsets[i][mipLevel - 1]
+            if mipLevel == 1:
+                mipOffset -= srcImageSize
 
-        if "-swizzle" in sys.argv:
-            swizzle = int(sys.argv[sys.argv.index("-swizzle") + 1], 0)
-        else:
-            swizzle = 0
+            data = mipData[mipOffset:mipOffset + srcSurfOut.surfSize]
+
+        with profiling.stage('retile', len(data), image=i, mip=mipLevel):
+            result = addrlib.retile(
+                max(1, width >> mipLevel), max(1, height >> mipLevel), getNumSlices(dim, depth, mipLevel),
+                format_, surfOut.bpp,
+                srcSurfOut.height, srcSurfOut.tileMode, gfd.swizzle[i], srcSurfOut.pitch,
+                surfOut.height, surfOut.tileMode, s, surfOut.pitch, bytes(data), surfOut.surfSize,
+            )
+
+        if mipLevel == 0:
+            imageData = result
 
-        if "-SRGB" in sys.argv:
-            SRGB = int(sys.argv[sys.argv.index("-SRGB") + 1], 0)
         else:
-            SRGB = 0
+            offset = 0 if mipLevel == 1 else mipOffsets[mipLevel - 1]
+            mipData_[offset:offset + len(result)] = result
 
-        multi = False
-        if "-multi" in sys.argv:
-            multi = True
-            numImages = int(sys.argv[sys.argv.index("-multi") + 1], 0)
+    return surfOuts[0], s, imageSize, mipSize, mipOffsets, imageData, bytes(mipData_)
 
-        if SRGB > 1 or not 0 <= tileMode <= 16 or not 0 <= swizzle <= 7:
-            printInfo()
 
-        if "-o" not in sys.argv and "-multi" in sys.argv:
-            output_ = output_[:-5] + ".gtx"
+def getBlockTypes(majorVersion):
+    """
+    The types of the GX2Surface, image and mipmap blocks in a GTX file of this version.
+    """
+    if majorVersion == 6:
+        return 0x0A, 0x0B, 0x0C
 
-        outBuffer = bytearray()
-        head_struct = GFDHeader()
-        head = head_struct.pack(b"Gfx2", 32, 7, 1, 2, 1, 0, 0)
+    return 0x0B, 0x0C, 0x0D
 
-        pos = 32
 
-        outBuffer += head
+def retileGFD(f, tileMode, swizzle_=0):
+    """
+    Change the tile mode and swizzle value of every image of a GTX file (its contents),
+    returns the new file. The GX2Surface, mipOffsets and texture registers are rewritten,
+    the other blocks are kept.
+    tileMode can also be the name of an autoTileModes policy, see chooseTileMode.
+    """
+    gfd = readGFD(f)
+    surfBlkType, dataBlkType, mipBlkType = getBlockTypes(gfd.majorVersion)
+
+    header = GFDHeader()
+    header.data(f, 0)
+
+    block = GFDBlockHeader()
+    output = bytearray(f[:header.size])
+    pos = header.size
+    i = -1
+
+    while pos < len(f):
+        block.data(f, pos)
+        blockData = f[pos + block.size:pos + block.size + block.dataSize]
+        pos += block.size + block.dataSize
+
+        if block.type_ == 2:
+            # The padding depends on the new alignment, it's added again before the image data
+            continue
+
+        if block.type_ == surfBlkType:
+            i += 1
+            tileMode_ = tileMode
+            if tileMode in autoTileModes:
+                tileMode_ = chooseTileMode(gfd.format[i], gfd.width[i], gfd.height[i], gfd.numMips[i], tileMode,
+                                           gfd.depth[i], gfd.dim[i])
+
+            surfOut, s, imageSize, mipSize, mipOffsets, imageData, mipData = retileSurface(gfd, i, tileMode_, swizzle_)
+
+            pitch = surfOut.pitch * 4 if gfd.format[i] in BCn_formats else surfOut.pitch
+
+            surface = bytearray(blockData)
+            struct.pack_into('>I', surface, 32, imageSize)
+            struct.pack_into('>I', surface, 40, mipSize)
+            struct.pack_into('>4I', surface, 48, tileMode_, s, surfOut.baseAlign, surfOut.pitch)
+            struct.pack_into('>13I', surface, 64, *(mipOffsets + [0] * (13 - len(mipOffsets))))
+            surface[136:156] = setRegsTiling(surface[136:156], tileMode_, pitch)
+            blockData = surface
+
+        elif block.type_ in [dataBlkType, mipBlkType]:
+            blockData = imageData if block.type_ == dataBlkType else mipData
+
+            alignSize = getAlignBlockSize(len(output) + 32, surfOut.baseAlign)
+            output += GFDBlockHeader().pack(b"BLK{", 32, block.majorVersion, block.minorVersion, 2, alignSize, 0, 0)
+            output += bytes(alignSize)
+
+        output += block.pack(block.magic, block.size_, block.majorVersion, block.minorVersion, block.type_,
+                             len(blockData), block.id, block.typeIdx)
+        output += blockData
+
+    return bytes(output)
+
+
+def getBlocks(f, pos=32):
+    """
+    The (position, type, dataSize) of every block of a GTX file (or of blocks built by writeGFD) from pos on.
+    """
+    block = GFDBlockHeader()
+    blocks = []
+
+    while pos < len(f):
+        block.data(f, pos)
+
+        if block.magic != b'BLK{':
+            raise ValueError("Invalid block header!")
+
+        blocks.append((pos, block.type_, block.dataSize))
+        pos += block.size + block.dataSize
+
+    return blocks
+
+
+def getFileBlocks(f):
+    """
+    getBlocks for a whole GTX file, which has to be a version 7 one to be edited.
+    """
+    header = GFDHeader()
+    header.data(f, 0)
+
+    if header.magic != b'Gfx2':
+        raise ValueError("Invalid file header!")
+
+    if header.majorVersion != 7:
+        raise ValueError("Only version 7 GTX files can be edited!")
+
+    return getBlocks(f, header.size)
+
+
+def getImageBlocks(blocks, i):
+    """
+    The indexes in blocks (as returned by getBlocks, for a version 7 file) of the GX2Surface,
+    image and mipmap blocks of image i, the mipmap one is None if the image has no mipmap block.
+    """
+    surfBlk = dataBlk = mipBlk = None
+    surfaces = images = 0
+
+    for j, (_, type_, _) in enumerate(blocks):
+        if type_ == 0x0B:
+            if surfaces == i:
+                surfBlk = j
+
+            surfaces += 1
+
+        elif type_ == 0x0C:
+            if images == i:
+                dataBlk = j
+
+            images += 1
+
+        elif type_ == 0x0D and images == i + 1:
+            mipBlk = j
+
+    if surfBlk is None or dataBlk is None:
+        raise ValueError("Invalid image index!")
+
+    return surfBlk, dataBlk, mipBlk
+
+
+def replaceGFDImage(f, i, input_, tileMode=4, swizzle_=0, SRGB=0, format_=0x1a, quality=1, mipFilter=None):
+    """
+    Replace image i of a GTX file (its contents) with a DDS or PNG file, only the new image gets swizzled.
+    Returns (patches, data): if the new image has the same layout as the old one, patches is a list of
+    (offset, bytes) to write over the file and data is None. Else patches is None and data is the new file,
+    where every other block is copied as it is (the padding in front of the moved image data is added again).
+    """
+    blocks = getFileBlocks(f)
+    surfBlk, dataBlk, mipBlk = getImageBlocks(blocks, i)
+    surfPos = blocks[surfBlk][0]
+
+    # Built at the position of the old GX2Surface block, so its padding is right if it replaces the old blocks
+    new = writeGFD(input_, tileMode, swizzle_, SRGB, 0, surfPos, 1, format_, quality, mipFilter)
+    newBlocks = getBlocks(new, 0)
+    newSurfBlk, newDataBlk, newMipBlk = getImageBlocks(newBlocks, 0)
+    alignment = struct.unpack_from('>I', new, newBlocks[newSurfBlk][0] + 32 + 56)[0]
+
+    patches = []
+
+    for old, new_ in [(surfBlk, newSurfBlk), (dataBlk, newDataBlk), (mipBlk, newMipBlk)]:
+        if old is None or new_ is None:
+            if old is not new_:
+                patches = None
+                break
+
+            continue
+
+        pos, type_, dataSize = blocks[old]
+        newPos, _, newDataSize = newBlocks[new_]
+
+        if dataSize != newDataSize or (type_ != 0x0B and (pos + 32) % alignment):
+            patches = None
+            break
+
+        patches.append((pos + 32, new[newPos + 32:newPos + 32 + newDataSize]))
+
+    if patches is not None:
+        return patches, None
+
+    gfd = readGFD(f)
+
+    output = bytearray(f[:surfPos])
+    images = 0
+
+    for j, (pos, type_, dataSize) in enumerate(blocks):
+        if type_ == 0x0C:
+            images += 1
+
+        if j < surfBlk or j in [dataBlk, mipBlk]:
+            continue
+
+        if j == surfBlk:
+            output += new
+            continue
+
+        if type_ == 2 and j + 1 < len(blocks) and blocks[j + 1][1] in [0x0C, 0x0D]:
+            # The image data might have moved, the padding is added again below
+            continue
+
+        if type_ in [0x0C, 0x0D]:
+            alignSize = getAlignBlockSize(len(output) + 32, gfd.alignment[images - 1])
+            output += GFDBlockHeader().pack(b"BLK{", 32, 1, 0, 2, alignSize, 0, 0)
+            output += bytes(alignSize)
+
+        output += f[pos:pos + 32 + dataSize]
+
+    return None, bytes(output)
+
+
+def swapRB(format_, compSel, data):
+    """
+    Swap the red and blue channels of linear data if its compSel is in BGR order,
+    like writeGFDSurface does for the swizzled data.
+    """
+    if compSel[0] != 2 or compSel[2] != 0:
+        return data
+
+    if format_ == 8:
+        return dds.form_conv.swapRB_16bpp(data, 'rgb565')
+
+    elif format_ == 0xa:
+        return dds.form_conv.swapRB_16bpp(data, 'rgb5a1')
+
+    elif format_ == 0xb:
+        return dds.form_conv.swapRB_16bpp(data, 'rgba4')
+
+    elif format_ == 0x19:
+        return dds.form_conv.swapRB_32bpp(data, 'bgr10a2')
+
+    elif format_ in [0x1a, 0x41a]:
+        return dds.form_conv.swapRB_32bpp(data, 'rgba8')
+
+    return data
+
+
+def getMipData(image, mipLevel):
+    """
+    The linear data of a mipmap level of an image (a tuple as returned by dds.readDDS),
+    and its width and height in elements (4x4 blocks for BCn formats).
+    """
+    width, height, format_, _, _, _, _, data = image
+    bpp = addrlib.surfaceGetBitsPerPixel(format_) >> 3
+    blkWidth, blkHeight = (4, 4) if format_ in BCn_formats else (1, 1)
+
+    offset, size = getCurrentMipOffset_Size(width, height, blkWidth, blkHeight, bpp, mipLevel)
+
+    return (data[offset:offset + size], divRoundUp(max(1, width >> mipLevel), blkWidth),
+            divRoundUp(max(1, height >> mipLevel), blkHeight))
+
+
+def hashTiles(data, width, height, bpp):
+    """
+    A hash of every 8x8 tile of linear data (width and height in elements, bpp in bytes),
+    keyed by the x and y of its top left element.
+    """
+    rowSize = width * bpp
+    hashes = {}
+
+    for y0 in range(0, height, 8):
+        for x0 in range(0, width, 8):
+            tile = hashlib.sha1()
+            for y in range(y0, min(y0 + 8, height)):
+                tile.update(data[y * rowSize + x0 * bpp:y * rowSize + min(x0 + 8, width) * bpp])
+
+            hashes[(x0, y0)] = tile.digest()
+
+    return hashes
+
+
+def hashImageTiles(image):
+    """
+    The tile hashes (see hashTiles) of every mipmap level of an image (a tuple as returned by dds.readDDS),
+    they can be kept instead of the image and passed to updateGFDImage as the old one.
+    """
+    bpp = addrlib.surfaceGetBitsPerPixel(image[2]) >> 3
+    hashes = []
+
+    for mipLevel in range(image[6] + 1):
+        data, width, height = getMipData(image, mipLevel)
+        hashes.append(hashTiles(data, width, height, bpp))
+
+    return hashes
+
+
+def getChangedTiles(old, new, width, height, bpp):
+    """
+    The x and y of the top left element of the 8x8 tiles that differ between two linear surfaces,
+    old can also be the tile hashes of the old surface.
+    """
+    if isinstance(old, dict):
+        return [tile for tile, hash_ in hashTiles(new, width, height, bpp).items() if old.get(tile) != hash_]
+
+    rowSize = width * bpp
+    changed = []
+
+    for y0 in range(0, height, 8):
+        rows = slice(y0 * rowSize, min(y0 + 8, height) * rowSize)
+
+        # Most rows of tiles don't change
+        if old[rows] == new[rows]:
+            continue
+
+        for x0 in range(0, width, 8):
+            for y in range(y0, min(y0 + 8, height)):
+                row = slice(y * rowSize + x0 * bpp, y * rowSize + min(x0 + 8, width) * bpp)
+
+                if old[row] != new[row]:
+                    changed.append((x0, y0))
+                    break
+
+    return changed
+
+
+def updateGFDImage(f, i, old, new):
+    """
+    Swizzle only the 8x8 tiles that changed between old and new into image i of a GTX file
+    (a bytearray, which is changed in place). new is a tuple as returned by dds.readDDS,
+    old is the image it replaces or its tile hashes (see hashImageTiles).
+    Returns the number of tiles that were rewritten, or None if new doesn't fit the image's layout
+    (it then has to be replaced with replaceGFDImage).
+    """
+    width, height, format_, _, _, compSel, numMips, _ = new
+    numMips += 1
+
+    blocks = getFileBlocks(f)
+    _, dataBlk, mipBlk = getImageBlocks(blocks, i)
+    gfd = readGFD(f)
+
+    if ([gfd.width[i], gfd.height[i], gfd.format[i], gfd.numMips[i], gfd.dim[i], gfd.depth[i], gfd.aa[i]]
+            != [width, height, format_, numMips, 1, 1, 0]):
+        return None
+
+    if isinstance(old, list):
+        if len(old) != numMips:
+            return None
+
+    elif old[:3] != new[:3] or old[5:7] != new[5:7]:
+        return None
+
+    surfOuts = getMipLayout(format_, width, height, 1, 1, gfd.tileMode[i], numMips)[0]
+    bpp = addrlib.surfaceGetBitsPerPixel(format_) >> 3
+    view = memoryview(f)
+    total = 0
+
+    for mipLevel in range(numMips):
+        surfOut = surfOuts[mipLevel]
+        data, width_, height_ = getMipData(new, mipLevel)
+
+        if isinstance(old, list):
+            oldData = old[mipLevel]
+
+        else:
+            oldData = getMipData(old, mipLevel)[0]
+
+        tiles = getChangedTiles(oldData, data, width_, height_, bpp)
+        if not tiles:
+            continue
+
+        if mipLevel == 0:
+            pos = blocks[dataBlk][0] + 32
+
+        else:
+            pos = blocks[mipBlk][0] + 32
+            if mipLevel > 1:
+                pos += gfd.mipOffsets[i][mipLevel - 1]
+
+        with profiling.stage('swizzleTiles', len(tiles) * 64 * bpp, image=i, mip=mipLevel):
+            addrlib.swizzleTiles(
+                max(1, width >> mipLevel), max(1, height >> mipLevel), surfOut.height, format_, surfOut.tileMode,
+                gfd.swizzle[i], surfOut.pitch, surfOut.bpp, bytes(swapRB(format_, compSel, data)),
+                view[pos:pos + surfOut.surfSize], [(x, y, 0) for x, y in tiles],
+            )
+
+        total += len(tiles)
+
+    return total
+
+
+def getImageGroups(f):
+    """
+    The blocks of every image of a GTX file (its contents), without the padding and EOF blocks.
+    Returns the file header, the blocks before the first image and a list of (alignment, blocks)
+    for every image, where blocks are (type, bytes) pairs, the bytes of each block as they are in the file.
+    """
+    header = GFDHeader()
+    header.data(f, 0)
+
+    if header.magic != b'Gfx2':
+        raise ValueError("Invalid file header!")
+
+    if header.majorVersion not in [6, 7]:
+        raise ValueError("Unsupported GTX version!")
+
+    surfBlkType = getBlockTypes(header.majorVersion)[0]
+
+    prelude = []
+    images = []
+
+    for pos, type_, dataSize in getBlocks(f, header.size):
+        if type_ in [1, 2]:
+            continue
+
+        block = f[pos:pos + 32 + dataSize]
+
+        if type_ == surfBlkType:
+            alignment = struct.unpack_from('>I', block, 32 + 56)[0]
+            images.append((alignment, []))
+
+        (images[-1][1] if images else prelude).append((type_, block))
+
+    return f[:header.size], prelude, images
+
+
+def buildGFD(header, prelude, images):
+    """
+    Build a GTX file from blocks returned by getImageGroups,
+    the padding in front of the image and mipmap data and the EOF block are added again.
+    """
+    majorVersion = struct.unpack_from('>I', header, 8)[0]
+    dataBlkType, mipBlkType = getBlockTypes(majorVersion)[1:]
+
+    blockHeader = GFDBlockHeader()
+    output = bytearray(header)
+
+    for _, block in prelude:
+        output += block
+
+    for alignment, blocks in images:
+        for type_, block in blocks:
+            if type_ in [dataBlkType, mipBlkType]:
+                blockHeader.data(block, 0)
+                alignSize = getAlignBlockSize(len(output) + 32, alignment)
+
+                output += blockHeader.pack(b"BLK{", 32, blockHeader.majorVersion, blockHeader.minorVersion, 2,
+                                           alignSize, 0, 0)
+                output += bytes(alignSize)
+
+            output += block
+
+    output += blockHeader.pack(b"BLK{", 32, 1, 0, 1, 0, 0, 0)
+
+    return bytes(output)
+
+
+def splitGFD(f):
+    """
+    Split a GTX file (its contents) into one file per image, without deswizzling anything:
+    their blocks are copied as they are, only the header, padding and EOF blocks are written again.
+    """
+    header, prelude, images = getImageGroups(f)
+
+    return [buildGFD(header, prelude, [image]) for image in images]
+
+
+def mergeGFD(files):
+    """
+    Merge GTX files (their contents) into one, in order, like splitGFD without deswizzling anything.
+    The files must have the same version, the header and the blocks before the first image
+    are taken from the first one.
+    """
+    if not files:
+        raise ValueError("No GTX files to merge!")
+
+    merged = []
+
+    for n, f in enumerate(files):
+        header, prelude, images = getImageGroups(f)
+
+        if n == 0:
+            header_, prelude_ = header, prelude
+
+        elif header[8:12] != header_[8:12]:
+            raise ValueError("The GTX files have different versions!")
+
+        merged += images
+
+    return buildGFD(header_, prelude_, merged)
+
+
+def writeToArchive(output_, name, data, level=6):
+    """
+    Save a GTX file in a SARC archive (Yaz0 compressed if output_ ends with .szs).
+    If the archive already exists, its other files are kept and a file with the same name is replaced.
+    """
+    files = OrderedDict()
+
+    if os.path.isfile(output_):
+        with open(output_, "rb") as inf:
+            files.update(sarc.iterFiles(inf.read()))
+
+    files[name] = bytes(data)
+    sarc.writeArchive(output_, files, level)
+
+
+def extractGFD(gfd, name, output_, outExt, images, baseMip=0, maxMip=None, singleOutput=False):
+    """
+    Save the given images of a GTX file (as returned by readGFD) as DDS, PNG or TGA.
+    If the GTX has multiple images and singleOutput isn't set,
+    image i is saved as name (without its extension) + i + outExt instead of output_.
+    An image that can't be extracted is skipped, unless it's the last one (then the ValueError is raised).
+    """
+    compSel = ["R", "G", "B", "A", "0", "1"]
+
+    for i in images:
+        start = time.perf_counter()
+
+        if log.isEnabledFor(logging.INFO):
+            log.info("")
+            log.info("// ----- GX2Surface Info ----- ")
+            log.info("  dim             = " + str(gfd.dim[i]))
+            log.info("  width           = " + str(gfd.width[i]))
+            log.info("  height          = " + str(gfd.height[i]))
+            log.info("  depth           = " + str(gfd.depth[i]))
+            log.info("  numMips         = " + str(gfd.numMips[i]))
+
+            if gfd.format[i] in formats:
+                log.info("  format          = " + formats[gfd.format[i]])
+
+            else:
+                log.info("  format          = " + hex(gfd.format[i]))
+
+            log.info("  aa              = " + str(gfd.aa[i]))
+            log.info("  use             = " + str(gfd.use[i]))
+            log.info("  imageSize       = " + str(gfd.imageSize[i]))
+            log.info("  mipSize         = " + str(gfd.mipSize[i]))
+            log.info("  tileMode        = " + str(gfd.tileMode[i]))
+            log.info("  swizzle         = " + str(gfd.swizzle[i]) + ", " + hex(gfd.swizzle[i]))
+            log.info("  alignment       = " + str(gfd.alignment[i]))
+            log.info("  pitch           = " + str(gfd.pitch[i]))
+            log.info("")
+            log.info("  GX2 Component Selector:")
+            log.info("    Red Channel:    " + str(compSel[gfd.compSel[i][0]]))
+            log.info("    Green Channel:  " + str(compSel[gfd.compSel[i][1]]))
+            log.info("    Blue Channel:   " + str(compSel[gfd.compSel[i][2]]))
+            log.info("    Alpha Channel:  " + str(compSel[gfd.compSel[i][3]]))
+            log.info("")
+            log.info("  bits per pixel  = " + str(gfd.bpp[i]))
+            log.info("  bytes per pixel = " + str(gfd.bpp[i] // 8))
+            log.info("  realSize        = " + str(gfd.realSize[i]))
+
+        if gfd.numImages > 1 and not singleOutput:
+            output_ = os.path.splitext(name)[0] + str(i) + outExt
+
+        if baseMip >= gfd.numMips[i]:
+            print("")
+            print("Image " + str(i) + " has no mipmap level " + str(baseMip) + ", skipping.")
+            continue
+
+        try:
+            # PNG and TGA files only store the first level, the others aren't deswizzled
+            hdr, result = get_deswizzled_data(i, gfd, baseMip, baseMip if outExt in [".png", ".tga"] else maxMip)
+
+        except ValueError as e:
+            if i == images[-1]:
+                raise
+
+            print("")
+            print(str(e))
+            print("")
+            print("Continuing in 5 seconds...")
+            time.sleep(5)
+            continue
+
+        if outExt in [".png", ".tga"]:
+            # Only the first extracted mipmap level (and its first slice) can be stored
+            width = max(1, gfd.width[i] >> baseMip)
+            height = max(1, gfd.height[i] >> baseMip)
+            with profiling.stage('form_conv', len(result[0]), image=i, mip=baseMip):
+                rgba = png_tga.toRGBA8(result[0], width, height, gfd.format[i])
+
+            if outExt == ".png":
+                with profiling.stage('generatePNG', len(rgba), image=i):
+                    data = png_tga.generatePNG(width, height, rgba)
+
+            else:
+                with profiling.stage('generateTGA', len(rgba), image=i):
+                    data = png_tga.generateTGA(width, height, rgba)
+
+            with profiling.stage('write', len(data), file=output_, image=i):
+                with open(output_, "wb+") as output:
+                    output.write(data)
+
+        else:
+            with profiling.stage('write', len(hdr) + sum(map(len, result)), file=output_, image=i):
+                with open(output_, "wb+") as output:
+                    output.write(hdr)
+                    for data in result:
+                        output.write(data)
+
+        if eventLog.isEnabledFor(logging.INFO):
+            logImage('extract', name, output_, gfd, i, time.perf_counter() - start)
+
+
+def extractArchive(f, outDir, outExt, image=None, baseMip=0, maxMip=None):
+    """
+    Extract every GTX file in a (Yaz0 compressed) SARC archive to outDir,
+    keeping the paths they have in the archive.
+    The GTX files are read straight from the archive data, no temporary files are written.
+    """
+    for name, data in sarc.iterFiles(f):
+        if not name.lower().endswith('.gtx'):
+            continue
+
+        log.info("")
+        log.info('Converting: ' + name)
+
+        try:
+            with profiling.stage('readGFD', len(data), file=name):
+                gfd = readGFD(data)
+
+        except (ValueError, struct.error):
+            print("")
+            print(name + " is not a valid GTX file, skipping.")
+            continue
+
+        if image is None:
+            images = range(gfd.numImages)
+
+        elif 0 <= image < gfd.numImages:
+            images = [image]
+
+        else:
+            print("")
+            print(name + " has no image " + str(image) + ", skipping.")
+            continue
+
+        # Don't let the names in the archive point outside of outDir
+        parts = [part for part in name.replace('\\', '/').split('/') if part not in ['', '.', '..']]
+        name = os.path.join(outDir, *parts)
+
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+
+        try:
+            extractGFD(gfd, name, os.path.splitext(name)[0] + outExt, outExt, images, baseMip, maxMip,
+                       image is not None)
+
+        except ValueError as e:
+            print("")
+            print(name + ": " + str(e) + ", skipping.")
+
+
+def packGTX(input_, tileMode=4, swizzle_=0, SRGB=0, format_=0x1a, quality=1, mipFilter=None):
+    """
+    Pack a single DDS or PNG file into a GTX file, returns its contents.
+    """
+    return b''.join([
+        GFDHeader().pack(b"Gfx2", 32, 7, 1, 2, 1, 0, 0),
+        writeGFD(input_, tileMode, swizzle_, SRGB, 0, 32, 1, format_, quality, mipFilter),
+        GFDBlockHeader().pack(b"BLK{", 32, 1, 0, 1, 0, 0, 0),
+    ])
+
+
+def watchFolder(folder, outExt, tileMode=4, swizzle_=0, SRGB=0, format_=0x1a, quality=1, mipFilter=None,
+                delay=0.5):
+    """
+    Convert DDS and PNG files in folder to GTX, and GTX files to outExt, whenever they are saved.
+    The outputs are saved next to the inputs, and aren't converted back.
+    Runs until interrupted, with the backends and their caches loaded the whole time.
+    """
+    # Path -> (mtime, size) of the files saved by this function
+    written = {}
+
+    def stat(path):
+        try:
+            info = os.stat(path)
+
+        except OSError:
+            return None
+
+        return info.st_mtime_ns, info.st_size
+
+    def convert(paths):
+        for path in paths:
+            ext = os.path.splitext(path)[1].lower()
+
+            if ext not in ['.dds', '.png', '.gtx']:
+                continue
+
+            # Skip the outputs of earlier conversions, unless they have been changed since
+            if path in written and written[path] == stat(path):
+                continue
+
+            log.info("")
+            log.info('Converting: ' + path)
+
+            try:
+                if ext == '.gtx':
+                    with open(path, "rb") as inf:
+                        gfd = readGFD(inf.read())
+
+                    outputs = [os.path.splitext(path)[0] + (str(i) if gfd.numImages > 1 else '') + outExt
+                               for i in range(gfd.numImages)]
+
+                    extractGFD(gfd, path, outputs[0], outExt, range(gfd.numImages))
+
+                else:
+                    start = time.perf_counter()
+                    outputs = [os.path.splitext(path)[0] + '.gtx']
+                    data = packGTX(path, tileMode, swizzle_, SRGB, format_, quality, mipFilter)
+
+                    with open(outputs[0], "wb+") as output:
+                        output.write(data)
+
+                    logPacked([path], outputs[0], data, [time.perf_counter() - start])
+
+            except (OSError, ValueError, struct.error) as e:
+                print("")
+                print(path + ": " + str(e) + ", skipping.")
+                continue
+
+            for output_ in outputs:
+                written[output_] = stat(output_)
+
+            log.info('Finished converting: ' + path)
+
+    watch.watch(folder, convert, delay)
+
+
+def setupLogging(quiet=False, events=None):
+    """
+    Print the progress messages to stdout, unless quiet is set.
+    If events is given, write an event for every converted image to it as JSON lines ('-' is stdout).
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    log.addHandler(handler)
+    log.propagate = False
+    log.setLevel(logging.WARNING if quiet else logging.INFO)
+
+    if events is not None:
+        if events == '-':
+            eventHandler = logging.StreamHandler(sys.stdout)
+
+        else:
+            eventHandler = logging.FileHandler(events, 'w')
+
+        eventHandler.setFormatter(logging.Formatter('%(message)s'))
+
+        eventLog.addHandler(eventHandler)
+        eventLog.setLevel(logging.INFO)
+
+
+def surfaceInfo(gfd, i):
+    """
+    The GX2Surface info of image i of a GTX file (as returned by readGFD) as a dict.
+    """
+    return {
+        'dim': gfd.dim[i],
+        'width': gfd.width[i],
+        'height': gfd.height[i],
+        'depth': gfd.depth[i],
+        'numMips': gfd.numMips[i],
+        'format': gfd.format[i],
+        'formatName': formats.get(gfd.format[i], hex(gfd.format[i])),
+        'aa': gfd.aa[i],
+        'use': gfd.use[i],
+        'imageSize': gfd.imageSize[i],
+        'mipSize': gfd.mipSize[i],
+        'tileMode': gfd.tileMode[i],
+        'swizzle': gfd.swizzle[i],
+        'alignment': gfd.alignment[i],
+        'pitch': gfd.pitch[i],
+        'compSel': gfd.compSel[i],
+        'bpp': gfd.bpp[i],
+        'realSize': gfd.realSize[i],
+    }
+
+
+def logImage(event, input_, output_, gfd, i, time_):
+    record = OrderedDict([('event', event), ('input', input_), ('output', output_), ('image', i),
+                          ('time', round(time_, 6))])
+    record.update(surfaceInfo(gfd, i))
+
+    eventLog.info(json.dumps(record))
+
+
+def logPacked(inputs, output_, data, times):
+    """
+    Log a pack event for every image of a packed GTX file,
+    inputs and times are the file and conversion time of each image.
+    """
+    if not eventLog.isEnabledFor(logging.INFO):
+        return
+
+    gfd = readGFD(data)
+
+    for i in range(gfd.numImages):
+        logImage('pack', inputs[i], output_, gfd, i, times[i])
+
+
+def printInfo():
+    print("")
+    print("Usage:")
+    print("  gtx_extract [option...] input")
+    print("")
+    print("Options:")
+    print(
+        " -o <output>           Output file, if not specified, the output file will have the same name as the intput file")
+    print("                       Will be ignored if the GTX has multiple images, unless -image is used")
+    print("")
+    print("DDS/PNG to GTX options:")
+    print(" -tileMode <tileMode>  tileMode (4 is the default)")
+    print(" -autoTileMode <policy>")
+    print("                       pick the tileMode of each texture that gives the smallest imageSize + mipSize,")
+    print("                       out of all of them (size) or of the 2D tiled ones only (2d)")
+    print(" -swizzle <swizzle>    the intial swizzle value, a value from 0 to 7 (0 is the default)")
+    print(" -SRGB <n>             1 if the desired destination format is SRGB, else 0 (0 is the default)")
+    print(
+        " -multi <numImages>    number of images to pack into the GTX file (input file must be the first image, 1 is the default)")
+    print(" -format <format>      GX2 surface format to convert PNG files to (0x1a is the default)")
+    print("                       Supported: 0x1a (RGBA8), 0x8 (RGB565), 0xa (RGB5A1), 0xb (RGBA4), 0x1 (L8), 0x7 (L8A8),")
+    print("                       0x31 (BC1), 0x33 (BC3), 0x34 (BC4U), 0x234 (BC4S), 0x35 (BC5U), 0x235 (BC5S)")
+    print(" -quality <n>          BCn encoding quality, 0 is the fastest, higher values refine the endpoints (1 is the default)")
+    print(" -genMips              generate the mipmaps from the first level down to 1x1 (replaces the ones in DDS files)")
+    print(" -mipFilter <filter>   filter used for generating the mipmaps, box or kaiser (box is the default, implies -genMips)")
+    print("                       SRGB formats are filtered in linear space")
+    print("")
+    print("GTX to GTX options:")
+    print(" -retile               change the tile mode and swizzle value of every image to the -tileMode and -swizzle ones,")
+    print("                       without converting to DDS and back (saved as input_retiled.gtx by default)")
+    print(" -replace <index>      replace the image with this index of the -o GTX file with the input DDS/PNG file,")
+    print("                       only the new image is swizzled (the old tileMode, swizzle and format are kept by default)")
+    print(" -previous <file>      with -replace, the DDS/PNG file the image was made from,")
+    print("                       only the 8x8 tiles that changed since then are swizzled")
+    print(" -split                save every image as its own GTX file (input_0.gtx, input_1.gtx...),")
+    print("                       the blocks are copied as they are, nothing gets deswizzled")
+    print("")
+    print("  gtx_extract [option...] -merge input.gtx...")
+    print("                       merges the GTX files into one (the -o output, input_merged.gtx by default),")
+    print("                       the blocks are copied as they are, nothing gets deswizzled")
+    print("")
+    print("GTX to DDS options:")
+    print(" -image <index>        only extract the image with this index (all images are extracted by default)")
+    print(" -mip <level>          only extract this mipmap level")
+    print(" -maxMip <level>       only extract the mipmap levels up to this one (all levels are extracted by default)")
+    print(" -png                  save as PNG instead of DDS (also used if the output file ends with .png)")
+    print(" -tga                  save as TGA instead of DDS (also used if the output file ends with .tga)")
+    print("                       PNG and TGA files only contain the first extracted mipmap level")
+    print("")
+    print("Output options:")
+    print(" -quiet                only print errors and warnings")
+    print(" -events <file>        write a JSON line for every converted image to file (- for stdout, implies -quiet),")
+    print("                       with its input and output, surface info and conversion time")
+    print("")
+    print("Profiling options:")
+    print(" -profile              print the time, bytes processed and calls of each stage (reading, swizzling...)")
+    print(" -profileMemory        also track the peak allocation of each stage (much slower, Python 3.9 or higher)")
+    print(" -profileJSON <file>   save every stage of every image and mipmap level as JSON (implies -profile)")
+    print(" -profileTrace <file>  save them in the Chrome trace event format, for chrome://tracing or Perfetto")
+    print("")
+    print("SARC archives (.szs, .sarc, .pack, can be Yaz0 compressed) are extracted like GTX files,")
+    print("every GTX file in them is saved to the output folder (the archive name without its extension by default)")
+    print("")
+    print("SARC options:")
+    print(" -name <name>          name of the GTX file when packing into a .szs/.sarc/.pack output")
+    print("                       (the input name by default), the other files of an existing archive are kept")
+    print(" -level <n>            Yaz0 compression level of .szs outputs, 0 (none) to 9 (6 is the default)")
+    print("")
+    print("  gtx_extract [option...] -watch <folder>")
+    print("                       converts the DDS/PNG files in folder (and its subfolders) to GTX, and the GTX files")
+    print("                       to DDS/PNG/TGA, every time they are saved, until Ctrl+C is pressed")
+    print("                       the DDS/PNG to GTX options and -png/-tga are used for every file")
+    print("")
+    print("  gtx_extract [option...] folder...")
+    print("                       packs each folder into folder.szs (or the -o output, if there's only one),")
+    print("                       the archives are built in parallel")
+    print("")
+    print("Supported formats:")
+    print(" - GX2_SURFACE_FORMAT_TCS_R8_G8_B8_A8_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TCS_R8_G8_B8_A8_SRGB")
+    print(" - GX2_SURFACE_FORMAT_TCS_R10_G10_B10_A2_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TCS_R5_G6_B5_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TC_R5_G5_B5_A1_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TC_R4_G4_B4_A4_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TC_R8_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TC_R8_G8_UNORM")
+    print(" - GX2_SURFACE_FORMAT_TC_R4_G4_UNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC1_UNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC1_SRGB")
+    print(" - GX2_SURFACE_FORMAT_T_BC2_UNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC2_SRGB")
+    print(" - GX2_SURFACE_FORMAT_T_BC3_UNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC3_SRGB")
+    print(" - GX2_SURFACE_FORMAT_T_BC4_UNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC4_SNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC5_UNORM")
+    print(" - GX2_SURFACE_FORMAT_T_BC5_SNORM")
+    print("")
+    print("Exiting in 5 seconds...")
+    time.sleep(5)
+    sys.exit(1)
+
+
+def parsePackOptions():
+    if "-tileMode" in sys.argv:
+        tileMode = int(sys.argv[sys.argv.index("-tileMode") + 1], 0)
+    else:
+        tileMode = 4
+
+    if "-autoTileMode" in sys.argv:
+        tileMode = sys.argv[sys.argv.index("-autoTileMode") + 1]
+        if tileMode not in autoTileModes:
+            printInfo()
+
+    elif not 0 <= tileMode <= 16:
+        printInfo()
+
+    if "-swizzle" in sys.argv:
+        swizzle = int(sys.argv[sys.argv.index("-swizzle") + 1], 0)
+    else:
+        swizzle = 0
+
+    if "-SRGB" in sys.argv:
+        SRGB = int(sys.argv[sys.argv.index("-SRGB") + 1], 0)
+    else:
+        SRGB = 0
+
+    if "-format" in sys.argv:
+        format_ = int(sys.argv[sys.argv.index("-format") + 1], 0)
+    else:
+        format_ = 0x1a
+
+    if "-quality" in sys.argv:
+        quality = int(sys.argv[sys.argv.index("-quality") + 1], 0)
+    else:
+        quality = 1
+
+    if "-genMips" in sys.argv:
+        mipFilter = "box"
+    else:
+        mipFilter = None
+
+    if "-mipFilter" in sys.argv:
+        mipFilter = sys.argv[sys.argv.index("-mipFilter") + 1]
+
+    if (SRGB > 1 or not 0 <= swizzle <= 7 or quality < 0
+            or mipFilter not in [None, "box", "kaiser"]):
+        printInfo()
+
+    return tileMode, swizzle, SRGB, format_, quality, mipFilter
+
+
+def reportProfile():
+    profiling.disable()
+    profiling.printSummary()
+
+    if "-profileJSON" in sys.argv:
+        profiling.exportJSON(sys.argv[sys.argv.index("-profileJSON") + 1])
+
+    if "-profileTrace" in sys.argv:
+        profiling.exportTrace(sys.argv[sys.argv.index("-profileTrace") + 1])
+
+
+def main():
+    if "-events" in sys.argv:
+        events = sys.argv[sys.argv.index("-events") + 1]
+    else:
+        events = None
+
+    # Keep stdout clean for the events
+    setupLogging("-quiet" in sys.argv or events == '-', events)
+
+    log.info("GTX Extractor v5.3")
+    log.info("(C) 2015-2018 AboodXD")
+
+    input_ = sys.argv[-1]
+
+    if any(option in sys.argv for option in ["-profile", "-profileMemory", "-profileJSON", "-profileTrace"]):
+        profiling.enable("-profileMemory" in sys.argv)
+
+    if "-level" in sys.argv:
+        level = int(sys.argv[sys.argv.index("-level") + 1], 0)
+        if not 0 <= level <= 9:
+            printInfo()
+
+    else:
+        level = 6
+
+    if "-png" in sys.argv:
+        outExt = ".png"
+
+    elif "-tga" in sys.argv:
+        outExt = ".tga"
+
+    else:
+        outExt = ".dds"
+
+    if "-watch" in sys.argv:
+        folder = sys.argv[sys.argv.index("-watch") + 1]
+        if not os.path.isdir(folder):
+            printInfo()
+
+        tileMode, swizzle, SRGB, format_, quality, mipFilter = parsePackOptions()
+
+        log.info("")
+        log.info("Watching: " + folder + " (press Ctrl+C to stop)")
+
+        try:
+            watchFolder(folder, outExt, tileMode, swizzle, SRGB, format_, quality, mipFilter)
+
+        except KeyboardInterrupt:
+            pass
+
+        log.info("")
+        log.info("Stopped watching: " + folder)
+
+        if profiling.enabled():
+            reportProfile()
+
+        return
+
+    if os.path.isdir(input_):
+        # Every folder at the end of the arguments is packed into its own archive
+        folders = []
+        for arg in reversed(sys.argv[1:]):
+            if not os.path.isdir(arg):
+                break
+
+            folders.insert(0, arg)
+
+        if "-o" in sys.argv and len(folders) == 1:
+            outputs = [sys.argv[sys.argv.index("-o") + 1]]
+
+        else:
+            outputs = [folder.rstrip('/\\') + '.szs' for folder in folders]
+
+        for folder, output_ in zip(folders, outputs):
+            log.info("")
+            log.info('Packing: ' + folder + ' -> ' + output_)
+
+        sarc.packFolders(zip(folders, outputs), level)
+
+        log.info('')
+        log.info('Finished packing ' + str(len(folders)) + ' folder(s)')
+        return
+
+    if not (input_.endswith('.gtx') or input_.endswith('.dds') or input_.endswith('.png')
+            or os.path.splitext(input_)[1] in archiveExts):
+        printInfo()
+
+    toGTX = False
+
+    if input_.endswith('.dds') or input_.endswith('.png'):
+        toGTX = True
+
+    if "-o" in sys.argv:
+        output_ = sys.argv[sys.argv.index("-o") + 1]
+
+        if os.path.splitext(output_)[1].lower() in [".png", ".tga"]:
+            outExt = os.path.splitext(output_)[1].lower()
+
+    elif os.path.splitext(input_)[1] in archiveExts:
+        output_ = os.path.splitext(input_)[0]
+
+    else:
+        output_ = os.path.splitext(input_)[0] + (".gtx" if toGTX else outExt)
+
+    if "-replace" in sys.argv:
+        index = int(sys.argv[sys.argv.index("-replace") + 1], 0)
+
+        if not toGTX or index < 0 or not output_.endswith('.gtx') or not os.path.isfile(output_):
+            printInfo()
+
+        tileMode, swizzle, SRGB, format_, quality, mipFilter = parsePackOptions()
+
+        log.info("")
+        log.info('Replacing image ' + str(index) + ' of ' + output_ + ' with: ' + input_)
+
+        start = time.perf_counter()
+
+        with profiling.stage('read', file=output_) as stage:
+            with open(output_, "rb") as inf:
+                inb = inf.read()
+
+            stage.bytes = len(inb)
+
+        try:
+            gfd = readGFD(inb)
+
+            if not 0 <= index < gfd.numImages:
+                raise ValueError("Invalid image index!")
+
+            # The old image's tile mode, swizzle value and format are kept, unless they are given
+            if "-tileMode" not in sys.argv and "-autoTileMode" not in sys.argv:
+                tileMode = gfd.tileMode[index]
+
+            if "-swizzle" not in sys.argv:
+                swizzle = (gfd.swizzle[index] >> 8) & 7
+
+            if "-format" not in sys.argv:
+                format_ = gfd.format[index] & ~0x400
+
+            if "-SRGB" not in sys.argv:
+                SRGB = 1 if gfd.format[index] & 0x400 else 0
+
+            tiles = None
+
+            # With the previous version of the image, only the tiles that changed are swizzled
+            if ("-previous" in sys.argv and tileMode == gfd.tileMode[index]
+                    and getSwizzleValue(tileMode, swizzle) == gfd.swizzle[index]):
+                previous = sys.argv[sys.argv.index("-previous") + 1]
+
+                outBuffer = bytearray(inb)
+                tiles = updateGFDImage(outBuffer, index, readImage(previous, SRGB, index, format_, quality, mipFilter),
+                                       readImage(input_, SRGB, index, format_, quality, mipFilter))
+
+            if tiles is not None:
+                log.info('Rewrote ' + str(tiles) + ' changed tile(s)')
+                patches = None
+
+            else:
+                patches, outBuffer = replaceGFDImage(inb, index, input_, tileMode, swizzle, SRGB, format_, quality,
+                                                     mipFilter)
+
+        except (ValueError, struct.error) as e:
+            print("")
+            print(output_ + ": " + (str(e) or "Invalid GTX file!"))
+            print("")
+            print("Exiting in 5 seconds...")
+            time.sleep(5)
+            sys.exit(1)
+
+        if patches is not None:
+            log.info('The new image has the same layout, patching it in place')
+
+            with profiling.stage('write', sum(len(data) for _, data in patches), file=output_):
+                with open(output_, "r+b") as output:
+                    for offset, data in patches:
+                        output.seek(offset)
+                        output.write(data)
+
+        else:
+            with profiling.stage('write', len(outBuffer), file=output_):
+                with open(output_, "wb+") as output:
+                    output.write(outBuffer)
+
+        if eventLog.isEnabledFor(logging.INFO):
+            with open(output_, "rb") as inf:
+                logImage('replace', input_, output_, readGFD(inf.read()), index, time.perf_counter() - start)
+
+    elif toGTX:
+        tileMode, swizzle, SRGB, format_, quality, mipFilter = parsePackOptions()
+
+        multi = False
+        if "-multi" in sys.argv:
+            multi = True
+            numImages = int(sys.argv[sys.argv.index("-multi") + 1], 0)
+
+        if "-o" not in sys.argv and "-multi" in sys.argv:
+            output_ = output_[:-5] + ".gtx"
+
+        outBuffer = bytearray()
+        head_struct = GFDHeader()
+        head = head_struct.pack(b"Gfx2", 32, 7, 1, 2, 1, 0, 0)
+
+        pos = 32
+
+        outBuffer += head
+
+        if "-name" in sys.argv:
+            name = sys.argv[sys.argv.index("-name") + 1]
+
+        elif multi:
+            name = os.path.basename(input_)[:-5] + ".gtx"
+
+        else:
+            name = os.path.splitext(os.path.basename(input_))[0] + ".gtx"
+
+        inputs = []
+        times = []
 
         if multi:
+            inExt = input_[-4:]
             input_ = input_[:-5]
             for i in range(numImages):
-                print("")
-                print('Converting: ' + input_ + str(i) + ".dds")
+                log.info("")
+                log.info('Converting: ' + input_ + str(i) + inExt)
+
+                start = time.perf_counter()
+
+                try:
+                    data = writeGFD(input_ + str(i) + inExt, tileMode, swizzle, SRGB, i, pos, numImages, format_,
+                                    quality, mipFilter)
+
+                except ValueError as e:
+                    print("")
+                    print(str(e))
+                    print("")
+
+                    if i == numImages - 1:
+                        print("Exiting in 5 seconds...")
+                        time.sleep(5)
+                        sys.exit(1)
+
+                    print("Continuing in 5 seconds...")
+                    time.sleep(5)
+                    continue
 
-                data = writeGFD(input_ + str(i) + ".dds", tileMode, swizzle, SRGB, i, pos, numImages)
                 pos += len(data)
 
                 outBuffer += data
+                inputs.append(input_ + str(i) + inExt)
+                times.append(time.perf_counter() - start)
         else:
-            print("")
-            print('Converting: ' + input_)
+            log.info("")
+            log.info('Converting: ' + input_)
+
+            start = time.perf_counter()
+
+            try:
+                data = writeGFD(input_, tileMode, swizzle, SRGB, 0, pos, 1, format_, quality, mipFilter)
+
+            except ValueError as e:
+                print("")
+                print(str(e))
+                print("")
+                print("Exiting in 5 seconds...")
+                time.sleep(5)
+                sys.exit(1)
 
-            data = writeGFD(input_, tileMode, swizzle, SRGB, 0, pos, 1)
             outBuffer += data
+            inputs.append(input_)
+            times.append(time.perf_counter() - start)
 
         block_head_struct = GFDBlockHeader()
         eof_blk_head = block_head_struct.pack(b"BLK{", 32, 1, 0, 1, 0, 0, 0)
 
         outBuffer += eof_blk_head
 
-        with open(output_, "wb+") as output:
-            output.write(outBuffer)
+        if os.path.splitext(output_)[1] in archiveExts:
+            with profiling.stage('writeArchive', len(outBuffer), file=output_):
+                writeToArchive(output_, name, outBuffer, level)
 
-    else:
-        print("")
-        print('Converting: ' + input_)
+        else:
+            with profiling.stage('write', len(outBuffer), file=output_):
+                with open(output_, "wb+") as output:
+                    output.write(outBuffer)
 
-        with open(input_, "rb") as inf:
-            inb = inf.read()
+        logPacked(inputs, output_, outBuffer, times)
 
-        compSel = ["R", "G", "B", "A", "0", "1"]
+    elif "-retile" in sys.argv:
+        tileMode, swizzle = parsePackOptions()[:2]
 
-        gfd = readGFD(inb)
+        if "-o" not in sys.argv:
+            output_ = os.path.splitext(input_)[0] + "_retiled.gtx"
 
-        for i in range(gfd.numImages):
+        log.info("")
+        log.info('Retiling: ' + input_ + ' (tileMode ' + str(tileMode) + ', swizzle ' + str(swizzle) + ')')
 
-            print("")
-            print("// ----- GX2Surface Info ----- ")
-            print("  dim             = " + str(gfd.dim[i]))
-            print("  width           = " + str(gfd.width[i]))
-            print("  height          = " + str(gfd.height[i]))
-            print("  depth           = " + str(gfd.depth[i]))
-            print("  numMips         = " + str(gfd.numMips[i]))
+        start = time.perf_counter()
 
-            if gfd.format[i] in formats:
-                print("  format          = " + formats[gfd.format[i]])
+        with profiling.stage('read', file=input_) as stage:
+            with open(input_, "rb") as inf:
+                inb = inf.read()
 
-            else:
-                print("  format          = " + hex(gfd.format[i]))
-
-            print("  aa              = " + str(gfd.aa[i]))
-            print("  use             = " + str(gfd.use[i]))
-            print("  imageSize       = " + str(gfd.imageSize[i]))
-            print("  mipSize         = " + str(gfd.mipSize[i]))
-            print("  tileMode        = " + str(gfd.tileMode[i]))
-            print("  swizzle         = " + str(gfd.swizzle[i]) + ", " + hex(gfd.swizzle[i]))
-            print("  alignment       = " + str(gfd.alignment[i]))
-            print("  pitch           = " + str(gfd.pitch[i]))
+            stage.bytes = len(inb)
+
+        try:
+            outBuffer = retileGFD(inb, tileMode, swizzle)
+
+        except (ValueError, struct.error) as e:
             print("")
-            print("  GX2 Component Selector:")
-            print("    Red Channel:    " + str(compSel[gfd.compSel[i][0]]))
-            print("    Green Channel:  " + str(compSel[gfd.compSel[i][1]]))
-            print("    Blue Channel:   " + str(compSel[gfd.compSel[i][2]]))
-            print("    Alpha Channel:  " + str(compSel[gfd.compSel[i][3]]))
+            print(input_ + ": " + (str(e) or "Invalid GTX file!"))
             print("")
-            print("  bits per pixel  = " + str(gfd.bpp[i]))
-            print("  bytes per pixel = " + str(gfd.bpp[i] // 8))
-            print("  realSize        = " + str(gfd.realSize[i]))
+            print("Exiting in 5 seconds...")
+            time.sleep(5)
+            sys.exit(1)
 
-            if gfd.numImages > 1:
-                output_ = os.path.splitext(input_)[0] + str(i) + ".dds"
+        with profiling.stage('write', len(outBuffer), file=output_):
+            with open(output_, "wb+") as output:
+                output.write(outBuffer)
 
-            hdr, result = get_deswizzled_data(i, gfd)
+        if eventLog.isEnabledFor(logging.INFO):
+            gfd = readGFD(outBuffer)
+            for i in range(gfd.numImages):
+                logImage('retile', input_, output_, gfd, i, time.perf_counter() - start)
 
-            if hdr == b'' or result == []:
-                pass
+    elif "-split" in sys.argv:
+        base = os.path.splitext(sys.argv[sys.argv.index("-o") + 1] if "-o" in sys.argv else input_)[0]
 
-            else:
+        log.info("")
+        log.info('Splitting: ' + input_)
+
+        with profiling.stage('read', file=input_) as stage:
+            with open(input_, "rb") as inf:
+                inb = inf.read()
+
+            stage.bytes = len(inb)
+
+        try:
+            with profiling.stage('split', len(inb), file=input_):
+                outputs = splitGFD(inb)
+
+        except (ValueError, struct.error) as e:
+            print("")
+            print(input_ + ": " + (str(e) or "Invalid GTX file!"))
+            print("")
+            print("Exiting in 5 seconds...")
+            time.sleep(5)
+            sys.exit(1)
+
+        for i, outBuffer in enumerate(outputs):
+            output_ = base + "_" + str(i) + ".gtx"
+
+            with profiling.stage('write', len(outBuffer), file=output_):
                 with open(output_, "wb+") as output:
-                    output.write(hdr)
-                    for data in result:
-                        output.write(data)
+                    output.write(outBuffer)
+
+            if eventLog.isEnabledFor(logging.INFO):
+                logImage('split', input_, output_, readGFD(outBuffer), 0, 0)
+
+    elif "-merge" in sys.argv:
+        # Every GTX file at the end of the arguments is merged, in order
+        inputs = []
+        for n in range(len(sys.argv) - 1, 0, -1):
+            if not sys.argv[n].endswith('.gtx') or sys.argv[n - 1] == "-o":
+                break
+
+            inputs.insert(0, sys.argv[n])
+
+        if "-o" not in sys.argv:
+            output_ = os.path.splitext(inputs[0])[0] + "_merged.gtx"
+
+        log.info("")
+        log.info('Merging ' + str(len(inputs)) + ' file(s) into: ' + output_)
+
+        files = []
+        for file in inputs:
+            with profiling.stage('read', file=file) as stage:
+                with open(file, "rb") as inf:
+                    files.append(inf.read())
+
+                stage.bytes = len(files[-1])
+
+        try:
+            with profiling.stage('merge', sum(map(len, files)), file=output_):
+                outBuffer = mergeGFD(files)
+
+        except (ValueError, struct.error) as e:
+            print("")
+            print(output_ + ": " + (str(e) or "Invalid GTX file!"))
+            print("")
+            print("Exiting in 5 seconds...")
+            time.sleep(5)
+            sys.exit(1)
+
+        with profiling.stage('write', len(outBuffer), file=output_):
+            with open(output_, "wb+") as output:
+                output.write(outBuffer)
+
+        if eventLog.isEnabledFor(logging.INFO):
+            gfd = readGFD(outBuffer)
+            for i in range(gfd.numImages):
+                logImage('merge', None, output_, gfd, i, 0)
+
+    else:
+        if "-image" in sys.argv:
+            image = int(sys.argv[sys.argv.index("-image") + 1], 0)
+
+        else:
+            image = None
+
+        if "-mip" in sys.argv:
+            baseMip = maxMip = int(sys.argv[sys.argv.index("-mip") + 1], 0)
+
+        else:
+            baseMip = 0
+            maxMip = None
+
+        if "-maxMip" in sys.argv:
+            maxMip = int(sys.argv[sys.argv.index("-maxMip") + 1], 0)
+
+        if baseMip < 0 or (maxMip is not None and maxMip < baseMip):
+            printInfo()
+
+        with profiling.stage('read', file=input_) as stage:
+            with open(input_, "rb") as inf:
+                inb = inf.read()
+
+            stage.bytes = len(inb)
+
+        if os.path.splitext(input_)[1] in archiveExts:
+            try:
+                extractArchive(inb, output_, outExt, image, baseMip, maxMip)
+
+            except ValueError as e:
+                print("")
+                print(input_ + ": " + str(e))
+                print("")
+                print("Exiting in 5 seconds...")
+                time.sleep(5)
+                sys.exit(1)
+
+        else:
+            log.info("")
+            log.info('Converting: ' + input_)
+
+            try:
+                with profiling.stage('readGFD', len(inb), file=input_):
+                    gfd = readGFD(inb)
+
+                if image is None:
+                    images = range(gfd.numImages)
+
+                elif 0 <= image < gfd.numImages:
+                    images = [image]
+
+                else:
+                    printInfo()
+
+                extractGFD(gfd, input_, output_, outExt, images, baseMip, maxMip,
+                           image is not None and "-o" in sys.argv)
+
+            except (ValueError, struct.error) as e:
+                print("")
+                print(input_ + ": " + (str(e) or "Invalid GTX file!"))
+                print("")
+                print("Exiting in 5 seconds...")
+                time.sleep(5)
+                sys.exit(1)
+
+    log.info('')
+    log.info('Finished converting: ' + input_)
 
-    print('')
-    print('Finished converting: ' + input_)
+    if profiling.enabled():
+        reportProfile()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""jobs.py: Conversion jobs that work on file contents instead of paths, used by the daemon and gtx_async."""
+
+import os
+import threading
+
+import addrlib
+import dds
+import gtx_extract
+import png_tga
+
+################################################################
+################################################################
+
+# addrlib keeps its state in module globals,
+# so jobs that run in threads of the same process have to take turns
+_lock = threading.Lock()
+
+
+def runLocked(function, *args):
+    with _lock:
+        return function(*args)
+
+
+def inspect(data):
+    """
+    Return the surface info of every image in a GTX file (its contents).
+    Raises ValueError if it isn't a valid GTX file.
+    """
+    gfd = gtx_extract.readGFD(data)
+    return [gtx_extract.surfaceInfo(gfd, i) for i in range(gfd.numImages)]
+
+
+def extract(data, image=0, baseMip=0, maxMip=None, outFormat='dds'):
+    """
+    Extract an image of a GTX file (its contents) as a DDS, PNG or TGA file.
+    PNG and TGA files only contain the first extracted mipmap level (and its first slice).
+    """
+    gfd = gtx_extract.readGFD(data)
+
+    if not 0 <= image < gfd.numImages:
+        raise ValueError("The GTX file has no image " + str(image) + "!")
+
+    if not 0 <= baseMip < gfd.numMips[image]:
+        raise ValueError("Image " + str(image) + " has no mipmap level " + str(baseMip) + "!")
+
+    if outFormat in ['png', 'tga']:
+        # Only the first level is stored, the others aren't deswizzled
+        maxMip = baseMip
+
+    hdr, result = gtx_extract.get_deswizzled_data(image, gfd, baseMip, maxMip)
+
+    if outFormat == 'dds':
+        return hdr + b''.join(result)
+
+    width = max(1, gfd.width[image] >> baseMip)
+    height = max(1, gfd.height[image] >> baseMip)
+    rgba = png_tga.toRGBA8(result[0], width, height, gfd.format[image])
+
+    if outFormat == 'png':
+        return png_tga.generatePNG(width, height, rgba)
+
+    elif outFormat == 'tga':
+        return png_tga.generateTGA(width, height, rgba)
+
+    raise ValueError("Unsupported output format: " + outFormat)
+
+
+def pack(data, tileMode=4, swizzle_=0, SRGB=0, format_=0x1a, quality=1, mipFilter=None):
+    """
+    Pack a DDS or PNG file (its contents) into a GTX file.
+    format_ and quality are only used for PNG files.
+    Raises ValueError if the file can't be packed.
+    tileMode can also be the name of a gtx_extract.autoTileModes policy.
+    """
+    validTileMode = tileMode in gtx_extract.autoTileModes or (isinstance(tileMode, int) and 0 <= tileMode <= 16)
+
+    if not validTileMode or not 0 <= swizzle_ <= 7:
+        raise ValueError("Invalid tileMode or swizzle!")
+
+    if bytes(data[:8]) == b'\x89PNG\r\n\x1a\n':
+        image = gtx_extract.readPNG(data, format_, SRGB, quality)
+
+    else:
+        image = dds.readDDS(data, SRGB)
+
+    if mipFilter is not None:
+        image = gtx_extract.generateMips("The input", image, mipFilter, quality)
+
+    surface = gtx_extract.writeGFDSurface("The input", image, tileMode, swizzle_, 0, 32, 1)
+
+    return b''.join([
+        gtx_extract.GFDHeader().pack(b"Gfx2", 32, 7, 1, 2, 1, 0, 0),
+        surface,
+        gtx_extract.GFDBlockHeader().pack(b"BLK{", 32, 1, 0, 1, 0, 0, 0),
+    ])
+
+
+def warmUp():
+    # Compute one surface layout so the addrlib backend is loaded in the worker,
+    # and load (or measure) the swizzling backend thresholds
+    addrlib.getSurfaceInfo(0x1a, 64, 64, 1, 1, 4, 0, 0)
+    addrlib.getThresholds()
+    return os.getpid()
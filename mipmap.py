@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""mipmap.py: Mipmap chain generation for RGBA8 images."""
+
+import math
+from operator import add
+
+################################################################
+################################################################
+
+# Width of the Kaiser-windowed sinc, in destination pixels on each side
+KAISER_WIDTH = 3
+KAISER_ALPHA = 4.0
+
+
+def _srgbToLinear(value):
+    value /= 255
+
+    if value <= 0.04045:
+        return value / 12.92
+
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linearToSRGB(value):
+    if value <= 0.0031308:
+        value *= 12.92
+
+    else:
+        value = 1.055 * value ** (1 / 2.4) - 0.055
+
+    return min(255, max(0, math.floor(value * 255 + 0.5)))
+
+
+def _toByte(value):
+    return min(255, max(0, math.floor(value + 0.5)))
+
+
+_toLinear = [_srgbToLinear(value) for value in range(256)]
+
+
+def _bessel0(x):
+    # Modified Bessel function of the first kind, order 0
+    total = term = 1.0
+    k = 1
+
+    while term > total * 1e-12:
+        term *= (x / (2 * k)) ** 2
+        total += term
+        k += 1
+
+    return total
+
+
+def _kaiser(x):
+    if abs(x) >= 1:
+        return 0.0
+
+    return _bessel0(KAISER_ALPHA * math.sqrt(1 - x * x)) / _bessel0(KAISER_ALPHA)
+
+
+def _sinc(x):
+    if not x:
+        return 1.0
+
+    x *= math.pi
+    return math.sin(x) / x
+
+
+def boxTaps(size, newSize):
+    """
+    Source pixels and weights of each destination pixel for a 2x2 box filter.
+    The last row/column is repeated for odd sizes.
+    """
+    return [[(min(2 * i, size - 1), 0.5), (min(2 * i + 1, size - 1), 0.5)] for i in range(newSize)]
+
+
+def kaiserTaps(size, newSize):
+    """
+    Source pixels and weights of each destination pixel for a Kaiser-windowed sinc filter.
+    """
+    scale = size / newSize
+    support = scale * KAISER_WIDTH
+    taps = []
+
+    for i in range(newSize):
+        center = (i + 0.5) * scale
+        weights = []
+
+        for j in range(math.floor(center - support), math.ceil(center + support) + 1):
+            x = (j + 0.5 - center) / scale
+            weight = _sinc(x) * _kaiser(x / KAISER_WIDTH)
+
+            if weight:
+                weights.append((min(size - 1, max(0, j)), weight))
+
+        total = sum(weight for _, weight in weights)
+        taps.append([(j, weight / total) for j, weight in weights])
+
+    return taps
+
+
+def _resample(values, width, height, newWidth, newHeight, taps):
+    # Horizontal pass, a whole column of a channel at a time
+    stride = width * 4
+    newStride = newWidth * 4
+
+    temp = [0.0] * (newStride * height)
+
+    for x, weights in enumerate(taps(width, newWidth)):
+        for channel in range(4):
+            column = [0.0] * height
+
+            for j, weight in weights:
+                column = list(map(add, column, map(weight.__mul__, values[j * 4 + channel::stride])))
+
+            temp[x * 4 + channel::newStride] = column
+
+    # Vertical pass, a whole row at a time
+    output = []
+
+    for weights in taps(height, newHeight):
+        row = [0.0] * newStride
+
+        for j, weight in weights:
+            row = list(map(add, row, map(weight.__mul__, temp[j * newStride:(j + 1) * newStride])))
+
+        output += row
+
+    return output
+
+
+def _toRGBA8(values, SRGB):
+    data = bytearray(len(values))
+
+    if SRGB:
+        for channel in range(3):
+            data[channel::4] = bytes(map(_linearToSRGB, values[channel::4]))
+
+    else:
+        for channel in range(3):
+            data[channel::4] = bytes(map(_toByte, values[channel::4]))
+
+    data[3::4] = bytes(map(_toByte, values[3::4]))
+
+    return bytes(data)
+
+
+def generateMipmaps(data, width, height, SRGB=False, filter_='box', numMips=None):
+    """
+    Generate the mipmap levels of an RGBA8 image, down to 1x1
+    (or numMips levels, if given), not including the image itself.
+    Each level is filtered from the previous one with the 'box' or 'kaiser' filter.
+    If SRGB is set, the color channels are filtered in linear space.
+    Returns a list of RGBA8 levels.
+    """
+    if filter_ == 'box':
+        taps = boxTaps
+
+    elif filter_ == 'kaiser':
+        taps = kaiserTaps
+
+    else:
+        raise ValueError("Unsupported mipmap filter: " + filter_)
+
+    if numMips is None:
+        numMips = max(width, height).bit_length() - 1
+
+    values = [float(value) for value in data[:width * height * 4]]
+
+    if SRGB:
+        for channel in range(3):
+            values[channel::4] = [_toLinear[int(value)] for value in values[channel::4]]
+
+    levels = []
+
+    for mipLevel in range(1, numMips + 1):
+        newWidth = max(1, width >> mipLevel)
+        newHeight = max(1, height >> mipLevel)
+
+        values = _resample(values, max(1, width >> (mipLevel - 1)), max(1, height >> (mipLevel - 1)),
+                           newWidth, newHeight, taps)
+
+        levels.append(_toRGBA8(values, SRGB))
+
+    return levels
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""mipmap_cy.pyx: Mipmap chain generation for RGBA8 images."""
+
+################################################################
+################################################################
+
+from cpython cimport array
+from libc.math cimport floor, pow
+from libc.stdlib cimport malloc, free
+
+# The taps are only computed once per level, so they are shared with mipmap.py
+from mipmap import boxTaps, kaiserTaps
+
+
+ctypedef unsigned char u8
+ctypedef unsigned int u32
+
+
+cdef double _toLinear[256]
+
+for _value in range(256):
+    _toLinear[_value] = _value / 255 / 12.92 if _value / 255 <= 0.04045 else ((_value / 255 + 0.055) / 1.055) ** 2.4
+
+
+cdef inline u8 _clampByte(double value) noexcept nogil:
+    value = floor(value + 0.5)
+
+    if value <= 0:
+        return 0
+
+    elif value >= 255:
+        return 255
+
+    return <u8>value
+
+
+cdef inline u8 _linearToSRGB(double value) noexcept nogil:
+    if value <= 0.0031308:
+        value *= 12.92
+
+    else:
+        value = 1.055 * pow(value, 1 / 2.4) - 0.055
+
+    return _clampByte(value * 255)
+
+
+cdef class _Taps:
+    # The taps of every destination pixel as C arrays:
+    # the taps of pixel i are index[start[i]:start[i + 1]] and weight[start[i]:start[i + 1]]
+    cdef array.array start, index, weight
+
+    def __init__(self, taps):
+        self.start = array.array('I', [0])
+        self.index = array.array('I')
+        self.weight = array.array('d')
+
+        for weights in taps:
+            for j, weight in weights:
+                self.index.append(j)
+                self.weight.append(weight)
+
+            self.start.append(len(self.index))
+
+
+cdef void _resample(const double *values, double *temp, double *output, u32 width, u32 height,
+                    u32 newWidth, u32 newHeight, const u32 *hStart, const u32 *hIndex, const double *hWeight,
+                    const u32 *vStart, const u32 *vIndex, const double *vWeight) noexcept nogil:
+    # Same order of operations as mipmap.py, so the results are the same to the bit
+    cdef:
+        u32 stride = width * 4
+        u32 newStride = newWidth * 4
+        u32 x, y, channel, n
+        double total
+
+    # Horizontal pass
+    for y in range(height):
+        for x in range(newWidth):
+            for channel in range(4):
+                total = 0.0
+
+                for n in range(hStart[x], hStart[x + 1]):
+                    total = total + hWeight[n] * values[y * stride + hIndex[n] * 4 + channel]
+
+                temp[y * newStride + x * 4 + channel] = total
+
+    # Vertical pass
+    for y in range(newHeight):
+        for x in range(newStride):
+            total = 0.0
+
+            for n in range(vStart[y], vStart[y + 1]):
+                total = total + vWeight[n] * temp[vIndex[n] * newStride + x]
+
+            output[y * newStride + x] = total
+
+
+cdef void _toRGBA8(const double *values, u8 *data, u32 size, bint SRGB) noexcept nogil:
+    cdef u32 i
+
+    for i in range(size):
+        if SRGB and i % 4 != 3:
+            data[i] = _linearToSRGB(values[i])
+
+        else:
+            data[i] = _clampByte(values[i])
+
+
+def generateMipmaps(data, width, height, SRGB=False, filter_='box', numMips=None):
+    """
+    Generate the mipmap levels of an RGBA8 image, down to 1x1
+    (or numMips levels, if given), not including the image itself.
+    Each level is filtered from the previous one with the 'box' or 'kaiser' filter.
+    If SRGB is set, the color channels are filtered in linear space.
+    Returns a list of RGBA8 levels.
+    """
+    if filter_ == 'box':
+        taps = boxTaps
+
+    elif filter_ == 'kaiser':
+        taps = kaiserTaps
+
+    else:
+        raise ValueError("Unsupported mipmap filter: " + filter_)
+
+    if numMips is None:
+        numMips = max(width, height).bit_length() - 1
+
+    cdef:
+        bytes data_ = bytes(data[:width * height * 4])
+        const u8 *src = data_
+        u32 size = len(data_)
+        u32 newSize, i
+        u32 srcWidth, srcHeight, newWidth, newHeight
+        bint SRGB_ = SRGB
+        double *values = <double *>malloc(max(1, size) * sizeof(double))
+        double *temp = <double *>malloc(max(1, size) * sizeof(double))
+        double *output = <double *>malloc(max(1, size) * sizeof(double))
+        double *swap
+        u8 *level = <u8 *>malloc(max(1, size))
+        _Taps hTaps, vTaps
+
+    try:
+        if values == NULL or temp == NULL or output == NULL or level == NULL:
+            raise MemoryError()
+
+        with nogil:
+            for i in range(size):
+                if SRGB_ and i % 4 != 3:
+                    values[i] = _toLinear[src[i]]
+
+                else:
+                    values[i] = src[i]
+
+        levels = []
+
+        for mipLevel in range(1, numMips + 1):
+            srcWidth = max(1, width >> (mipLevel - 1))
+            srcHeight = max(1, height >> (mipLevel - 1))
+            newWidth = max(1, width >> mipLevel)
+            newHeight = max(1, height >> mipLevel)
+            newSize = newWidth * newHeight * 4
+
+            hTaps = _Taps(taps(srcWidth, newWidth))
+            vTaps = _Taps(taps(srcHeight, newHeight))
+
+            with nogil:
+                _resample(values, temp, output, srcWidth, srcHeight, newWidth, newHeight,
+                          hTaps.start.data.as_uints, hTaps.index.data.as_uints, hTaps.weight.data.as_doubles,
+                          vTaps.start.data.as_uints, vTaps.index.data.as_uints, vTaps.weight.data.as_doubles)
+
+                _toRGBA8(output, level, newSize, SRGB_)
+
+            levels.append(bytes(<u8[:newSize]>level))
+
+            # The next level is filtered from this one
+            swap = values
+            values = output
+            output = swap
+
+        return levels
+
+    finally:
+        free(values)
+        free(temp)
+        free(output)
+        free(level)
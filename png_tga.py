@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+# Supported formats:
+#  -RGBA8
+#  -RGB10A2
+#  -RGB565
+#  -RGB5A1
+#  -RGBA4
+#  -L8
+#  -L8A8
+#  -L4A4
+#  -BC1
+#  -BC2
+#  -BC3
+#  -BC4U
+#  -BC4S
+#  -BC5U
+#  -BC5S
+
+"""png_tga.py: PNG and TGA writer, PNG reader."""
+
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyximport
+
+    pyximport.install()
+    import bcn_cy as bcn
+    import form_conv_cy as form_conv
+
+except ImportError:
+    import bcn
+    import form_conv
+
+import profiling
+
+BCn_formats = [0x31, 0x431, 0x32, 0x432, 0x33, 0x433, 0x34, 0x234, 0x35, 0x235]
+
+# GX2 surface format -> (form_conv format, bytes per pixel)
+rgba8_formats = {
+    0x1a: ('rgba8', 4), 0x41a: ('rgba8', 4),
+    0x19: ('bgr10a2', 4),
+    0x08: ('rgb565', 2),
+    0x0a: ('rgb5a1', 2),
+    0x0b: ('rgba4', 2),
+    0x01: ('l8', 1),
+    0x07: ('la8', 2),
+    0x02: ('la4', 1),
+}
+
+# Size of the pieces the PNG image data is split into
+# for compressing them in parallel
+CHUNK_SIZE = 0x40000
+
+_executor = None
+
+
+def getExecutor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor()
+
+    return _executor
+
+
+def toRGBA8(data, width, height, format_):
+    """
+    Convert a deswizzled surface (as returned by addrlib.deswizzle)
+    of the given GX2 surface format to RGBA8.
+    """
+    if format_ in BCn_formats:
+        return bcn.decompress(bytes(data), width, height, format_)
+
+    if format_ not in rgba8_formats:
+        raise ValueError("Unsupported texture format: " + hex(format_))
+
+    fmt, bytesPerPixel = rgba8_formats[format_]
+    return form_conv.torgba8(bytes(data[:width * height * bytesPerPixel]), fmt)
+
+
+def _compressChunk(data, start, end, level, last):
+    if start:
+        # Prime the compressor with the end of the previous chunk
+        # so matches can cross the chunk boundary
+        zdict = bytes(data[max(0, start - 0x8000):start])
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    compressed = compressor.compress(data[start:end])
+    return compressed + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def deflate(data, level=6, executor=None):
+    """
+    zlib-compress data, splitting it into pieces that get compressed in parallel.
+    zlib releases the GIL, so this scales with the number of threads of the executor.
+    """
+    if len(data) <= CHUNK_SIZE:
+        return zlib.compress(data, level)
+
+    if executor is None:
+        executor = getExecutor()
+
+    data = memoryview(data)
+    starts = range(0, len(data), CHUNK_SIZE)
+
+    futures = [executor.submit(_compressChunk, data, start, start + CHUNK_SIZE, level, start + CHUNK_SIZE >= len(data))
+               for start in starts]
+
+    output = bytearray(b'\x78\x9c')
+
+    for future in futures:
+        output += future.result()
+
+    output += struct.pack('>I', zlib.adler32(data) & 0xFFFFFFFF)
+    return bytes(output)
+
+
+def _pngChunk(type_, data):
+    return b''.join([
+        struct.pack('>I', len(data)),
+        type_,
+        data,
+        struct.pack('>I', zlib.crc32(type_ + data) & 0xFFFFFFFF),
+    ])
+
+
+def generatePNG(width, height, data, level=6, executor=None):
+    """
+    Generate a PNG file from RGBA8 data.
+    """
+    stride = width * 4
+
+    if len(data) < stride * height:
+        raise ValueError("Not enough data for a " + str(width) + "x" + str(height) + " image!")
+
+    # Filter type 0 (None) for every scanline
+    raw = bytearray((stride + 1) * height)
+    for y in range(height):
+        pos = y * (stride + 1) + 1
+        raw[pos:pos + stride] = data[y * stride:(y + 1) * stride]
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _pngChunk(b'IHDR', struct.pack('>2I5B', width, height, 8, 6, 0, 0, 0)),
+        _pngChunk(b'IDAT', deflate(raw, level, executor)),
+        _pngChunk(b'IEND', b''),
+    ])
+
+
+def generateTGA(width, height, data):
+    """
+    Generate an uncompressed 32-bit TGA file from RGBA8 data.
+    """
+    size = width * height * 4
+
+    if len(data) < size:
+        raise ValueError("Not enough data for a " + str(width) + "x" + str(height) + " image!")
+
+    # Top-left origin, 8 bits of alpha
+    hdr = struct.pack('<3B2HB4H2B', 0, 0, 2, 0, 0, 0, 0, 0, width, height, 32, 0x28)
+
+    bgra = bytearray(data[:size])
+    bgra[0::4] = data[2:size:4]
+    bgra[2::4] = data[0:size:4]
+
+    return hdr + bytes(bgra)
+
+
+def readPNG(f):
+    """
+    Read a non-interlaced PNG file (a path or its contents) and return (width, height, RGBA8 data).
+    """
+    if isinstance(f, str):
+        with open(f, "rb") as inf:
+            inb = inf.read()
+
+    else:
+        inb = bytes(f)
+
+    if inb[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError("Invalid PNG file!")
+
+    try:
+        return _decodePNG(inb)
+
+    except (struct.error, IndexError, KeyError, zlib.error):
+        # Truncated or malformed chunks
+        raise ValueError("Invalid PNG file!")
+
+
+def _decodePNG(inb):
+    pos = 8
+    idat = []
+    palette = b''
+    transparency = b''
+    width = height = bitDepth = colorType = interlace = 0
+
+    while pos < len(inb):
+        size, type_ = struct.unpack_from('>I4s', inb, pos)
+        chunk = inb[pos + 8:pos + 8 + size]
+        pos += size + 12
+
+        if type_ == b'IHDR':
+            width, height, bitDepth, colorType, _, _, interlace = struct.unpack('>2I5B', chunk)
+
+        elif type_ == b'PLTE':
+            palette = chunk
+
+        elif type_ == b'tRNS':
+            transparency = chunk
+
+        elif type_ == b'IDAT':
+            idat.append(chunk)
+
+        elif type_ == b'IEND':
+            break
+
+    if not width or not height:
+        raise ValueError("Invalid PNG file!")
+
+    if interlace:
+        raise ValueError("Interlaced PNG files are not supported!")
+
+    if bitDepth not in [1, 2, 4, 8, 16]:
+        raise ValueError("Invalid PNG file!")
+
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[colorType]
+    bitsPerPixel = channels * bitDepth
+    rowSize = (width * bitsPerPixel + 7) // 8
+
+    raw = zlib.decompress(b''.join(idat))
+    if len(raw) < height * (rowSize + 1):
+        raise ValueError("Invalid PNG file!")
+
+    data = form_conv.unfilter(raw, height, max(1, bitsPerPixel // 8), rowSize)
+
+    if bitDepth == 16:
+        data = data[0::2]
+
+    elif bitDepth < 8:
+        data = form_conv.unpackBits(data, width, height, rowSize, bitDepth)
+        if colorType == 0:
+            data = data.translate(bytes((value * 255 // ((1 << bitDepth) - 1)) & 0xFF for value in range(256)))
+
+    numPixels = width * height
+    rgba = bytearray(b'\xff' * (numPixels * 4))
+
+    if colorType == 6:
+        rgba[:] = data[:numPixels * 4]
+
+    elif colorType == 2:
+        rgba[0::4] = data[0::3]
+        rgba[1::4] = data[1::3]
+        rgba[2::4] = data[2::3]
+
+    elif colorType == 4:
+        rgba[0::4] = rgba[1::4] = rgba[2::4] = data[0::2]
+        rgba[3::4] = data[1::2]
+
+    elif colorType == 0:
+        rgba[0::4] = rgba[1::4] = rgba[2::4] = data[:numPixels]
+
+    else:
+        entries = []
+        for i in range(256):
+            rgb = palette[i * 3:i * 3 + 3].ljust(3, b'\0')
+            alpha = transparency[i] if i < len(transparency) else 0xFF
+            entries.append(rgb + bytes((alpha,)))
+
+        rgba[:] = b''.join([entries[index] for index in data[:numPixels]])
+
+    return width, height, bytes(rgba)
+
+
+# GX2 surface format -> (form_conv format, component selector)
+gx2_formats = {
+    0x1a: ('rgba8', [0, 1, 2, 3]), 0x41a: ('rgba8', [0, 1, 2, 3]),
+    0x08: ('rgb565', [0, 1, 2, 5]),
+    0x0a: ('rgb5a1', [0, 1, 2, 3]),
+    0x0b: ('rgba4', [0, 1, 2, 3]),
+    0x01: ('l8', [0, 0, 0, 5]),
+    0x07: ('la8', [0, 0, 0, 1]),
+    0x31: ('bcn', [0, 1, 2, 3]), 0x431: ('bcn', [0, 1, 2, 3]),
+    0x33: ('bcn', [0, 1, 2, 3]), 0x433: ('bcn', [0, 1, 2, 3]),
+    0x34: ('bcn', [0, 1, 2, 3]), 0x234: ('bcn', [0, 1, 2, 3]),
+    0x35: ('bcn', [0, 1, 2, 3]), 0x235: ('bcn', [0, 1, 2, 3]),
+}
+
+
+def packRGBA8(width, height, data, format_, quality=1):
+    """
+    Convert RGBA8 data to the given GX2 surface format.
+    BCn formats are encoded with the given quality (see bcn.compress).
+    Returns a tuple shaped like the one returned by dds.readDDS,
+    that can be passed to gtx_extract.writeGFDSurface.
+    """
+    if format_ not in gx2_formats:
+        raise ValueError("Unsupported texture format: " + hex(format_))
+
+    fmt, compSel = gx2_formats[format_]
+    data = bytes(data[:width * height * 4])
+
+    if fmt == 'bcn':
+        with profiling.stage('bcnEncode', len(data)):
+            data = bcn.compress(data, width, height, format_, quality, getExecutor())
+
+    else:
+        with profiling.stage('form_conv', len(data)):
+            data = form_conv.fromrgba8(data, fmt)
+
+    return width, height, format_, b'', len(data), list(compSel), 0, data
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""profiling.py: Opt-in timing and memory instrumentation of the conversion stages.
+
+    with profiling.stage('deswizzle', len(data), image=i, mip=mipLevel):
+        ...
+
+Nothing is recorded unless enable() has been called.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+################################################################
+################################################################
+
+_enabled = False
+_memory = False
+_startTime = 0.0
+_endTime = None
+_events = []
+_local = threading.local()
+
+
+class Event:
+    """
+    A finished stage: start and duration in seconds since enable(),
+    childTime is the time spent in stages nested in it.
+    peak is the peak allocation during the stage in bytes (None if memory isn't tracked).
+    """
+    def __init__(self, name, start, duration, childTime, bytes_, peak, args, thread):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.childTime = childTime
+        self.bytes = bytes_
+        self.peak = peak
+        self.args = args
+        self.thread = thread
+
+
+class _NullStage:
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_nullStage = _NullStage()
+
+
+class Stage:
+    """
+    Times the code in its with block. bytes can be set inside the block,
+    if the amount of data processed isn't known in advance.
+    """
+    def __init__(self, name, bytes_, args):
+        self.name = name
+        self.bytes = bytes_
+        self.args = args
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+
+        self.childTime = 0.0
+        self.peak = None
+
+        if _memory and tracemalloc.is_tracing():
+            # tracemalloc has a single peak, so the parent's is saved before it's reset
+            if stack and stack[-1].peak is not None:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+
+            tracemalloc.reset_peak()
+            self.startMemory = self.peak = tracemalloc.get_traced_memory()[0]
+
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+
+        peak = None
+        if self.peak is not None:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak = self.peak - self.startMemory
+
+        if stack:
+            stack[-1].childTime += duration
+
+            if self.peak is not None and stack[-1].peak is not None:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        _events.append(Event(self.name, self.start - _startTime, duration, self.childTime, self.bytes,
+                             peak, self.args, threading.current_thread().ident))
+
+        return False
+
+
+def stage(name, bytes_=0, **args):
+    """
+    A context manager that records how long its block takes as the stage name.
+    bytes_ is the amount of data processed, args (image, mip, file...) are saved with the event.
+    """
+    if not _enabled:
+        return _nullStage
+
+    return Stage(name, bytes_, args)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(memory=False):
+    """
+    Start recording stages, and their peak allocations if memory is set
+    (this uses tracemalloc, which makes everything a lot slower, and needs Python 3.9 or higher).
+    """
+    global _enabled, _memory, _startTime, _endTime
+
+    _enabled = True
+    _memory = memory
+    _startTime = time.perf_counter()
+    _endTime = None
+    del _events[:]
+
+    if memory and hasattr(tracemalloc, 'reset_peak') and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    Stop recording, the recorded stages are kept.
+    """
+    global _enabled, _endTime
+
+    _enabled = False
+    _endTime = time.perf_counter()
+
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def events():
+    return list(_events)
+
+
+def summary():
+    """
+    The recorded stages grouped by name, in the order they first ran.
+    Each is a dict with the number of calls, total and self (excluding nested stages) time in seconds,
+    bytes processed and the largest peak allocation.
+    """
+    stages = {}
+    order = []
+
+    # Events are recorded when they end, nested stages before the ones around them
+    for event in sorted(_events, key=lambda event: event.start):
+        if event.name not in stages:
+            order.append(event.name)
+            stages[event.name] = {'stage': event.name, 'calls': 0, 'time': 0.0, 'selfTime': 0.0,
+                                  'bytes': 0, 'peak': None}
+
+        row = stages[event.name]
+        row['calls'] += 1
+        row['time'] += event.duration
+        row['selfTime'] += event.duration - event.childTime
+        row['bytes'] += event.bytes
+
+        if event.peak is not None:
+            row['peak'] = max(row['peak'] or 0, event.peak)
+
+    return [stages[name] for name in order]
+
+
+def _totalTime():
+    return (_endTime if _endTime is not None else time.perf_counter()) - _startTime
+
+
+def printSummary():
+    total = _totalTime()
+
+    print("")
+    print("Stage                 Calls   Time (ms)   Self (ms)  Self %      Bytes      MB/s   Peak alloc")
+
+    for row in summary():
+        if row['bytes'] and row['time']:
+            speed = "%9.1f" % (row['bytes'] / row['time'] / 0x100000)
+
+        else:
+            speed = "        -"
+
+        peak = "%12d" % row['peak'] if row['peak'] is not None else "           -"
+
+        print("%-20s %6d %11.2f %11.2f %6.1f%% %10d %s %s" % (
+            row['stage'], row['calls'], row['time'] * 1000, row['selfTime'] * 1000,
+            row['selfTime'] / total * 100 if total else 0, row['bytes'], speed, peak))
+
+    print("")
+    print("Total: %.2f ms" % (total * 1000))
+
+
+def exportJSON(path):
+    """
+    Save the summary and every recorded event as JSON.
+    """
+    data = {
+        'total': _totalTime(),
+        'stages': summary(),
+        'events': [{
+            'stage': event.name,
+            'start': event.start,
+            'duration': event.duration,
+            'selfTime': event.duration - event.childTime,
+            'bytes': event.bytes,
+            'peak': event.peak,
+            'thread': event.thread,
+            'args': event.args,
+        } for event in _events],
+    }
+
+    with open(path, "w") as output:
+        json.dump(data, output, indent=1)
+
+
+def exportTrace(path):
+    """
+    Save the recorded events in the Chrome trace event format,
+    for chrome://tracing, Perfetto or speedscope.
+    """
+    pid = os.getpid()
+    traceEvents = []
+
+    for event in _events:
+        args = dict(event.args)
+        args['bytes'] = event.bytes
+
+        if event.peak is not None:
+            args['peak'] = event.peak
+
+        traceEvents.append({
+            'name': event.name,
+            'cat': 'gtx',
+            'ph': 'X',
+            'ts': event.start * 1000000,
+            'dur': event.duration * 1000000,
+            'pid': pid,
+            'tid': event.thread,
+            'args': args,
+        })
+
+    with open(path, "w") as output:
+        json.dump({'traceEvents': traceEvents, 'displayTimeUnit': 'ms'}, output)
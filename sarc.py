@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""sarc.py: SARC archive reader and builder."""
+
+import os
+import struct
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyximport
+
+    pyximport.install()
+    import yaz0_cy as yaz0
+
+except ImportError:
+    import yaz0
+
+################################################################
+################################################################
+
+
+class SARCHeader(struct.Struct):
+    def __init__(self, bom):
+        super().__init__(bom + '4s2H2I2H')
+
+    def data(self, data, pos):
+        (self.magic,
+         self.headerSize,
+         self.bom,
+         self.fileSize,
+         self.dataOffset,
+         self.version,
+         self.unknown) = self.unpack_from(data, pos)
+
+
+class SFATHeader(struct.Struct):
+    def __init__(self, bom):
+        super().__init__(bom + '4s2HI')
+
+    def data(self, data, pos):
+        (self.magic,
+         self.headerSize,
+         self.nodeCount,
+         self.hashKey) = self.unpack_from(data, pos)
+
+
+class SFATNode(struct.Struct):
+    def __init__(self, bom):
+        super().__init__(bom + '4I')
+
+    def data(self, data, pos):
+        (self.nameHash,
+         self.attributes,
+         self.dataStart,
+         self.dataEnd) = self.unpack_from(data, pos)
+
+
+class SFNTHeader(struct.Struct):
+    def __init__(self, bom):
+        super().__init__(bom + '4s2H')
+
+    def data(self, data, pos):
+        (self.magic,
+         self.headerSize,
+         self.unknown) = self.unpack_from(data, pos)
+
+
+def _readName(data, pos):
+    end = pos
+    while data[end]:
+        end += 1
+
+    return bytes(data[pos:end]).decode('utf-8')
+
+
+def iterFiles(data):
+    """
+    Go through the files of a SARC archive (bytes or a memoryview),
+    decompressing it first if it's Yaz0 compressed.
+    Yields (name, data) for each file, where data is a memoryview into the archive.
+    """
+    if bytes(data[:4]) == b'Yaz0':
+        data = yaz0.decompress(data)
+
+    view = memoryview(data)
+
+    if bytes(view[:4]) != b'SARC':
+        raise ValueError("Invalid SARC header!")
+
+    bom = '>' if bytes(view[6:8]) == b'\xfe\xff' else '<'
+
+    header = SARCHeader(bom)
+    header.data(view, 0)
+    pos = header.headerSize
+
+    sfat = SFATHeader(bom)
+    sfat.data(view, pos)
+
+    if sfat.magic != b'SFAT':
+        raise ValueError("Invalid SFAT header!")
+
+    pos += sfat.headerSize
+    nodesPos = pos
+
+    node = SFATNode(bom)
+    pos += node.size * sfat.nodeCount
+
+    sfnt = SFNTHeader(bom)
+    sfnt.data(view, pos)
+
+    if sfnt.magic != b'SFNT':
+        raise ValueError("Invalid SFNT header!")
+
+    namesPos = pos + sfnt.headerSize
+
+    for i in range(sfat.nodeCount):
+        node.data(view, nodesPos + i * node.size)
+
+        if node.attributes & 0x01000000:
+            name = _readName(view, namesPos + (node.attributes & 0xFFFF) * 4)
+
+        else:
+            # Files without names are only known by their hash
+            name = '%08X.bin' % node.nameHash
+
+        if header.dataOffset + node.dataEnd > len(view) or node.dataStart > node.dataEnd:
+            raise ValueError("Invalid SARC file entry: " + name)
+
+        yield name, view[header.dataOffset + node.dataStart:header.dataOffset + node.dataEnd]
+
+
+def readSARC(data):
+    """
+    Read all the files of a SARC archive, see iterFiles.
+    Returns an OrderedDict mapping each name to its data.
+    """
+    return OrderedDict(iterFiles(data))
+
+
+################################################################
+################################################################
+
+# Minimum alignment of the data of some file types,
+# GX2 surfaces must stay aligned inside the archive
+fileAlignments = {'.gtx': 0x2000}
+
+
+def calcHash(name, key=0x65):
+    hash_ = 0
+    for char in name.encode('utf-8'):
+        hash_ = (hash_ * key + char) & 0xFFFFFFFF
+
+    return hash_
+
+
+def buildSARC(files, alignment=0x100, bom='>', hashKey=0x65):
+    """
+    Build a SARC archive from a dict (or (name, data) pairs) of files.
+    bom is '>' for Wii U (big endian) archives, '<' for little endian ones.
+    """
+    if isinstance(files, dict):
+        files = files.items()
+
+    files = sorted(((calcHash(name, hashKey), name, data) for name, data in files), key=lambda file: file[0])
+
+    header = SARCHeader(bom)
+    sfat = SFATHeader(bom)
+    node = SFATNode(bom)
+    sfnt = SFNTHeader(bom)
+
+    names = bytearray()
+    nodes = bytearray()
+    data = bytearray()
+
+    for hash_, name, fileData in files:
+        nameOffset = len(names)
+        names += name.encode('utf-8') + b'\0'
+        names += bytes(-len(names) % 4)
+
+        fileAlignment = max(alignment, fileAlignments.get(os.path.splitext(name)[1].lower(), 1))
+        data += bytes(-len(data) % fileAlignment)
+
+        nodes += node.pack(hash_, 0x01000000 | (nameOffset // 4), len(data), len(data) + len(fileData))
+        data += fileData
+
+    headerSize = header.size + sfat.size + len(nodes) + sfnt.size + len(names)
+
+    # The data has to start at an offset that's aligned like every file in it
+    dataAlignment = max([alignment] + [fileAlignments.get(os.path.splitext(name)[1].lower(), 1)
+                                       for _, name, _ in files])
+    dataOffset = headerSize + (-headerSize % dataAlignment)
+
+    return b''.join([
+        header.pack(b'SARC', header.size, 0xFEFF, dataOffset + len(data), dataOffset, 0x100, 0),
+        sfat.pack(b'SFAT', sfat.size, len(files), hashKey),
+        bytes(nodes),
+        sfnt.pack(b'SFNT', sfnt.size, 0),
+        bytes(names),
+        bytes(dataOffset - headerSize),
+        bytes(data),
+    ])
+
+
+def writeArchive(output, files, level=6, alignment=0x100):
+    """
+    Build a SARC archive and save it, Yaz0 compressed if output ends with .szs.
+    """
+    data = buildSARC(files, alignment)
+
+    if output.lower().endswith('.szs'):
+        data = yaz0.compress(data, level)
+
+    with open(output, "wb+") as out:
+        out.write(data)
+
+
+def packFolder(folder, output, level=6, alignment=0x100):
+    """
+    Pack every file in folder (and its subfolders) into a SARC archive, see writeArchive.
+    """
+    files = OrderedDict()
+
+    for root, _, fileNames in os.walk(folder):
+        for fileName in fileNames:
+            path = os.path.join(root, fileName)
+            name = os.path.relpath(path, folder).replace(os.sep, '/')
+
+            with open(path, "rb") as inf:
+                files[name] = inf.read()
+
+    writeArchive(output, files, level, alignment)
+    return output
+
+
+def packFolders(jobs, level=6, alignment=0x100, processes=None):
+    """
+    Pack (folder, output) pairs with packFolder, in parallel across a process pool.
+    Returns the outputs, in order.
+    """
+    jobs = list(jobs)
+
+    if len(jobs) < 2 or processes == 1:
+        return [packFolder(folder, output, level, alignment) for folder, output in jobs]
+
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(packFolder, folder, output, level, alignment) for folder, output in jobs]
+        return [future.result() for future in futures]
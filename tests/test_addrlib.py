@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""test_addrlib.py: The swizzling backends and fast paths match the reference address functions.
+
+    python3 -m unittest discover tests
+
+A fixed range of addrlib.verify cases, python3 -m addrlib.verify checks more (and random) ones.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from addrlib import verify
+
+################################################################
+################################################################
+
+SEED = 1
+COUNT = 30
+MAX_SIZE = 16
+
+
+class VerifyTest(unittest.TestCase):
+    def test_cases(self):
+        for n in range(COUNT):
+            case = verify.Case(str(SEED) + ":" + str(n), MAX_SIZE)
+
+            with self.subTest(case=n, surface=case.describe()):
+                try:
+                    verify.checkCase(case)
+
+                except verify.Mismatch as e:
+                    self.fail(str(e))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""test_dds.py: Array textures extracted as DDS files can be read (and packed) again.
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import random
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import addrlib
+import dds
+import gtx_extract
+import jobs
+
+################################################################
+################################################################
+
+
+def makeArrayGTX(format_, ddsFormat, width, height, numLayers):
+    """
+    A GTX file with a 2D array image of numLayers random layers, and the linear data of the layers.
+    """
+    compressed = format_ in gtx_extract.BCn_formats
+    blkWidth, blkHeight = (4, 4) if compressed else (1, 1)
+    bpp = addrlib.surfaceGetBitsPerPixel(format_) // 8
+    layerSize = gtx_extract.divRoundUp(width, blkWidth) * gtx_extract.divRoundUp(height, blkHeight) * bpp
+
+    rnd = random.Random(format_)
+    layers = [bytes(rnd.getrandbits(8) for _ in range(layerSize)) for _ in range(numLayers)]
+
+    # Pack the first layer, then turn its surface into an array
+    hdr = dds.generateHeader(1, width, height, ddsFormat, [0, 1, 2, 3], layerSize, compressed)
+    data = bytearray(jobs.pack(bytes(hdr) + layers[0]))
+
+    blocks = gtx_extract.getFileBlocks(data)
+    surfBlock, imgBlock = gtx_extract.getImageBlocks(blocks, 0)[:2]
+    surfPos, imgPos, imgSize = blocks[surfBlock][0], blocks[imgBlock][0], blocks[imgBlock][2]
+    surface = list(struct.unpack_from('>16I', data, surfPos + 32))
+
+    surfOut = addrlib.getSurfaceInfo(format_, width, height, numLayers, 5, surface[12], 0, 0)
+    linear = b''.join(layers)
+    swizzled = addrlib.swizzle(width, height, surfOut.height, format_, surfOut.tileMode, surface[13], surfOut.pitch,
+                               surfOut.bpp, linear + bytes(surfOut.surfSize - len(linear)), numLayers)
+
+    surface[0], surface[3], surface[8], surface[12], surface[15] = 5, numLayers, surfOut.surfSize, surfOut.tileMode, surfOut.pitch
+    struct.pack_into('>16I', data, surfPos + 32, *surface)
+    struct.pack_into('>I', data, imgPos + 20, surfOut.surfSize)
+
+    return bytes(data[:imgPos + 32] + swizzled + data[imgPos + 32 + imgSize:]), layers
+
+
+class ArrayDDSTest(unittest.TestCase):
+    def assertRoundTrip(self, format_, ddsFormat, compSel):
+        gtx, layers = makeArrayGTX(format_, ddsFormat, 16, 8, 3)
+        output = jobs.extract(gtx)
+
+        # All the layers are stored, but they are read as one 2D texture
+        self.assertTrue(output.endswith(b''.join(layers)))
+
+        width, height, readFormat, _, size, readCompSel, numMips, data = dds.readDDS(output, 0)
+
+        self.assertEqual((width, height, readFormat, numMips), (16, 8, format_, 0))
+        self.assertEqual(readCompSel, compSel)
+        self.assertEqual(data, layers[0])
+
+        packed = gtx_extract.readGFD(jobs.pack(output))
+        self.assertEqual((packed.format[0], packed.compSel[0]), (format_, compSel))
+
+    def test_rgba8(self):
+        self.assertRoundTrip(0x1a, 28, [0, 1, 2, 3])
+
+    def test_rgb565(self):
+        self.assertRoundTrip(0x8, 85, [0, 1, 2, 5])
+
+    def test_l8(self):
+        self.assertRoundTrip(0x1, 61, [0, 5, 5, 5])
+
+    def test_bc1(self):
+        self.assertRoundTrip(0x31, "BC1", [0, 1, 2, 3])
+
+    def test_bc4(self):
+        self.assertRoundTrip(0x34, "BC4U", [0, 1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""test_gtx_async.py: A malformed GTX file fails gtx_async calls with a normal exception.
+
+    python3 -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gtx_async
+import gtx_extract
+
+################################################################
+################################################################
+
+
+class MalformedGTXTest(unittest.TestCase):
+    def setUp(self):
+        # A GTX file with a header and an EOF block, but no image
+        fd, self.path = tempfile.mkstemp(suffix='.gtx')
+
+        with os.fdopen(fd, "wb") as output:
+            output.write(gtx_extract.GFDHeader().pack(b"Gfx2", 32, 7, 1, 2, 1, 0, 0))
+            output.write(gtx_extract.GFDBlockHeader().pack(b"BLK{", 32, 1, 0, 1, 0, 0, 0))
+
+        # A thread pool, so a job that sleeps or exits would stall or stop the test itself
+        self.converter = gtx_async.Converter(ThreadPoolExecutor(2))
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.converter.shutdown()
+        os.remove(self.path)
+
+    def assertFailsQuickly(self, coroutine):
+        start = time.perf_counter()
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(coroutine)
+
+        self.assertLess(time.perf_counter() - start, 2)
+
+    def test_inspect(self):
+        self.assertFailsQuickly(gtx_async.inspect_gtx(self.path, converter=self.converter))
+
+    def test_extract(self):
+        self.assertFailsQuickly(gtx_async.extract_gtx(self.path, converter=self.converter))
+
+    def test_extract_png(self):
+        self.assertFailsQuickly(gtx_async.extract_gtx(self.path, outFormat='png', converter=self.converter))
+
+
+if __name__ == '__main__':
+    unittest.main()
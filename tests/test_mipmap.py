@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""test_mipmap.py: mipmap_cy generates the same mipmap levels as mipmap.py, to the byte.
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mipmap
+
+try:
+    import pyximport
+
+    pyximport.install()
+    import mipmap_cy
+
+except ImportError:
+    mipmap_cy = None
+
+################################################################
+################################################################
+
+# Odd, non power of 2 and 1 pixel wide or high sizes
+SIZES = [(13, 7), (1, 9), (10, 1), (33, 17)]
+
+
+@unittest.skipIf(mipmap_cy is None, "Cython isn't available")
+class MipmapTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(3)
+        self.images = [(width, height, bytes(rnd.getrandbits(8) for _ in range(width * height * 4)))
+                       for width, height in SIZES]
+
+    def assertSameLevels(self, filter_, SRGB):
+        for width, height, data in self.images:
+            with self.subTest(size=(width, height)):
+                expected = mipmap.generateMipmaps(data, width, height, SRGB, filter_)
+                result = mipmap_cy.generateMipmaps(data, width, height, SRGB, filter_)
+
+                self.assertEqual(len(result), max(width, height).bit_length() - 1)
+                self.assertEqual(result, expected)
+
+    def test_box(self):
+        self.assertSameLevels('box', False)
+
+    def test_box_srgb(self):
+        self.assertSameLevels('box', True)
+
+    def test_kaiser(self):
+        self.assertSameLevels('kaiser', False)
+
+    def test_kaiser_srgb(self):
+        self.assertSameLevels('kaiser', True)
+
+    def test_numMips(self):
+        width, height, data = self.images[-1]
+        self.assertEqual(mipmap_cy.generateMipmaps(data, width, height, numMips=2),
+                         mipmap.generateMipmaps(data, width, height, numMips=2))
+
+    def test_invalid_filter(self):
+        with self.assertRaises(ValueError):
+            mipmap_cy.generateMipmaps(bytes(16), 2, 2, filter_='lanczos')
+
+
+if __name__ == '__main__':
+    unittest.main()
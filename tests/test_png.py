@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""test_png.py: PNG files with every row filter and bit depth are read correctly,
+a truncated or malformed one fails with the "Invalid PNG file!" ValueError.
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import random
+import struct
+import sys
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import form_conv
+import gtx_extract
+import png_tga
+
+try:
+    import pyximport
+
+    pyximport.install()
+    import form_conv_cy
+
+except ImportError:
+    form_conv_cy = None
+
+################################################################
+################################################################
+
+
+def filterRow(filterType, row, prev, bytesPerPixel):
+    # The PNG encoder side of a row filter
+    result = bytearray([filterType])
+
+    for i in range(len(row)):
+        a = row[i - bytesPerPixel] if i >= bytesPerPixel else 0
+        b = prev[i]
+        c = prev[i - bytesPerPixel] if i >= bytesPerPixel else 0
+
+        if filterType == 0:
+            predictor = 0
+
+        elif filterType == 1:
+            predictor = a
+
+        elif filterType == 2:
+            predictor = b
+
+        elif filterType == 3:
+            predictor = (a + b) >> 1
+
+        else:
+            p = a + b - c
+            if abs(p - a) <= abs(p - b) and abs(p - a) <= abs(p - c):
+                predictor = a
+
+            elif abs(p - b) <= abs(p - c):
+                predictor = b
+
+            else:
+                predictor = c
+
+        result.append((row[i] - predictor) & 0xFF)
+
+    return result
+
+
+def makePNG(width, height, bitDepth, colorType, data, filterTypes):
+    """
+    A PNG file of the (unfiltered) rows in data, row y uses filterTypes[y % len(filterTypes)].
+    """
+    channels = {0: 1, 2: 3, 4: 2, 6: 4}[colorType]
+    rowSize = (width * channels * bitDepth + 7) // 8
+    bytesPerPixel = max(1, channels * bitDepth // 8)
+
+    raw = bytearray()
+    prev = bytes(rowSize)
+
+    for y in range(height):
+        row = data[y * rowSize:(y + 1) * rowSize]
+        raw += filterRow(filterTypes[y % len(filterTypes)], row, prev, bytesPerPixel)
+        prev = row
+
+    def chunk(type_, data):
+        return struct.pack('>I', len(data)) + type_ + data + struct.pack('>I', zlib.crc32(type_ + data))
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>2I5B', width, height, bitDepth, colorType, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(bytes(raw))),
+        chunk(b'IEND', b''),
+    ])
+
+
+class FilterTest(unittest.TestCase):
+    def setUp(self):
+        self.rnd = random.Random(2)
+
+    def randomBytes(self, size):
+        return bytes(self.rnd.getrandbits(8) for _ in range(size))
+
+    def test_filters(self):
+        # RGBA8, every filter on its own and all of them mixed
+        width, height = 13, 9
+        rgba = self.randomBytes(width * height * 4)
+
+        for filterTypes in [[0], [1], [2], [3], [4], [4, 3, 2, 1, 0]]:
+            with self.subTest(filterTypes=filterTypes):
+                png = makePNG(width, height, 8, 6, rgba, filterTypes)
+                self.assertEqual(png_tga.readPNG(png), (width, height, rgba))
+
+    def test_rgb8(self):
+        width, height = 11, 7
+        rgb = self.randomBytes(width * height * 3)
+        png = makePNG(width, height, 8, 2, rgb, [1, 2, 3, 4])
+
+        expected = bytearray(b'\xff' * (width * height * 4))
+        expected[0::4], expected[1::4], expected[2::4] = rgb[0::3], rgb[1::3], rgb[2::3]
+
+        self.assertEqual(png_tga.readPNG(png), (width, height, bytes(expected)))
+
+    def test_rgba16(self):
+        # Only the high byte of the 16 bit samples is kept
+        width, height = 5, 6
+        rgba = self.randomBytes(width * height * 8)
+        png = makePNG(width, height, 16, 6, rgba, [4, 3, 1, 2])
+
+        self.assertEqual(png_tga.readPNG(png), (width, height, rgba[0::2]))
+
+    def test_gray_bits(self):
+        width, height = 9, 5
+
+        for bitDepth in [1, 2, 4]:
+            with self.subTest(bitDepth=bitDepth):
+                values = [self.rnd.randrange(1 << bitDepth) for _ in range(width * height)]
+
+                rows = bytearray()
+                for y in range(height):
+                    row = bytearray((width * bitDepth + 7) // 8)
+                    for x in range(width):
+                        row[x * bitDepth // 8] |= values[y * width + x] << (8 - bitDepth - x * bitDepth % 8)
+
+                    rows += row
+
+                png = makePNG(width, height, bitDepth, 0, rows, [0, 1, 2, 3, 4])
+
+                expected = bytearray()
+                for value in values:
+                    gray = value * 255 // ((1 << bitDepth) - 1)
+                    expected += bytes([gray, gray, gray, 0xFF])
+
+                self.assertEqual(png_tga.readPNG(png), (width, height, bytes(expected)))
+
+    def test_implementations(self):
+        # The Cython and Python versions of unfilter and unpackBits give the same output
+        if form_conv_cy is None:
+            self.skipTest("Cython isn't available")
+
+        for bytesPerPixel in [1, 2, 3, 4, 8]:
+            rowSize = bytesPerPixel * 7 + 1
+            raw = bytearray(self.randomBytes((rowSize + 1) * 10))
+            for y in range(10):
+                raw[y * (rowSize + 1)] = y % 5
+
+            self.assertEqual(form_conv_cy.unfilter(bytes(raw), 10, bytesPerPixel, rowSize),
+                             bytes(form_conv.unfilter(bytes(raw), 10, bytesPerPixel, rowSize)))
+
+        for bitDepth in [1, 2, 4]:
+            rowSize = (11 * bitDepth + 7) // 8
+            data = self.randomBytes(rowSize * 6)
+            self.assertEqual(form_conv_cy.unpackBits(data, 11, 6, rowSize, bitDepth),
+                             bytes(form_conv.unpackBits(data, 11, 6, rowSize, bitDepth)))
+
+    def test_invalid_filter(self):
+        with self.assertRaisesRegex(ValueError, "Invalid PNG filter type!"):
+            png_tga.readPNG(makePNG(4, 4, 8, 6, bytes(64), [0, 5]))
+
+
+class MalformedPNGTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(1)
+        self.rgba = bytes(rnd.getrandbits(8) for _ in range(7 * 5 * 4))
+        self.png = png_tga.generatePNG(7, 5, self.rgba)
+
+    def test_valid(self):
+        self.assertEqual(png_tga.readPNG(self.png), (7, 5, self.rgba))
+
+    def test_truncated(self):
+        for size in range(8, len(self.png) - 16):
+            with self.assertRaisesRegex(ValueError, "Invalid PNG file!"):
+                png_tga.readPNG(self.png[:size])
+
+    def test_malformed(self):
+        # Every byte of the IHDR chunk (from its size on) flipped, which may still be a valid PNG file
+        for pos in range(8, 8 + 25):
+            png = bytearray(self.png)
+            png[pos] ^= 0xff
+
+            try:
+                png_tga.readPNG(bytes(png))
+
+            except ValueError:
+                pass
+
+    def test_pack(self):
+        # Packing one prints the error and gives no image, like an invalid DDS file
+        self.assertEqual(gtx_extract.readPNG(self.png[:40], 0x1a, 0)[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -102,3 +102,12 @@ def makeRegsBytearray(width, height, numMips, format_, tileMode, pitch, compSel)
         register3.to_bytes(4, 'big'),
         register4.to_bytes(4, 'big'),
     ])
+
+
+def setRegsTiling(regs, tileMode, pitch):
+    # Only register0 depends on the tile mode and pitch
+    pitch = max(pitch, 8)
+    register0 = int.from_bytes(regs[:4], 'big') & ~(0x7FF << 8 | 0xF << 3)
+    register0 |= _register0(0, (pitch // 8) - 1, 0, tileMode, 0)
+
+    return register0.to_bytes(4, 'big') + bytes(regs[4:])
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""watch.py: Watch a folder tree for changed files, with inotify on Linux or by polling elsewhere."""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+################################################################
+################################################################
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+
+
+class InotifyEvent(struct.Struct):
+    def __init__(self):
+        super().__init__('iIII')
+
+    def data(self, data, pos):
+        (self.wd,
+         self.mask,
+         self.cookie,
+         self.len) = self.unpack_from(data, pos)
+
+
+def _loadLibc():
+    if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+        return None
+
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+def _scan(folder):
+    files = {}
+
+    for root, _, fileNames in os.walk(folder):
+        for fileName in fileNames:
+            path = os.path.join(root, fileName)
+
+            try:
+                stat = os.stat(path)
+
+            except OSError:
+                continue
+
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+
+    return files
+
+
+class PollingWatcher:
+    """
+    Finds changed files by comparing the modification times and sizes of every file,
+    every interval seconds.
+    """
+    def __init__(self, folder, interval=1.0):
+        self.folder = folder
+        self.interval = interval
+        self.files = _scan(folder)
+
+    def wait(self, timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) and return the paths of the files that changed.
+        """
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+
+        files = _scan(self.folder)
+        changed = [path for path, stat in files.items() if self.files.get(path) != stat]
+
+        self.files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Gets the changed files from inotify, watching new subfolders as they are created.
+    """
+    def __init__(self, folder, libc):
+        self.libc = libc
+        self.root = folder
+        self.folders = {}
+        self.event = InotifyEvent()
+
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.addFolder(folder)
+
+    def addFolder(self, folder):
+        """
+        Watch folder and its subfolders, returns the files already in them.
+        """
+        files = []
+
+        for root, _, fileNames in os.walk(folder):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root),
+                                             IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd >= 0:
+                self.folders[wd] = root
+
+            files += [os.path.join(root, fileName) for fileName in fileNames]
+
+        return files
+
+    def wait(self, timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) and return the paths of the files that changed.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+
+        data = os.read(self.fd, 0x10000)
+        changed = []
+        pos = 0
+
+        while pos < len(data):
+            self.event.data(data, pos)
+            pos += self.event.size
+
+            name = os.fsdecode(data[pos:pos + self.event.len].rstrip(b'\0'))
+            pos += self.event.len
+
+            if self.event.mask & IN_Q_OVERFLOW:
+                # Events were lost, every file might have changed
+                changed += _scan(self.root)
+                continue
+
+            if self.event.mask & IN_IGNORED:
+                self.folders.pop(self.event.wd, None)
+                continue
+
+            if self.event.wd not in self.folders:
+                continue
+
+            path = os.path.join(self.folders[self.event.wd], name)
+
+            if self.event.mask & IN_ISDIR:
+                # Files can be written to the new folder before it's watched
+                changed += self.addFolder(path)
+
+            elif self.event.mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed.append(path)
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def getWatcher(folder, interval=1.0):
+    """
+    An InotifyWatcher for folder if inotify is available, else a PollingWatcher.
+    """
+    libc = _loadLibc()
+
+    if libc is not None:
+        try:
+            return InotifyWatcher(folder, libc)
+
+        except OSError:
+            pass
+
+    return PollingWatcher(folder, interval)
+
+
+def watch(folder, callback, delay=0.5, interval=1.0):
+    """
+    Call callback with a sorted list of the files in folder that changed, forever.
+    Files are only passed once they haven't changed for delay seconds,
+    so a file that is saved several times in a row is only handled once.
+    interval is how often files are checked when polling.
+    """
+    watcher = getWatcher(folder, interval)
+    pending = {}
+
+    try:
+        while True:
+            if pending:
+                timeout = max(0, min(pending.values()) + delay - time.monotonic())
+
+            else:
+                timeout = None
+
+            for path in watcher.wait(timeout):
+                pending[path] = time.monotonic()
+
+            now = time.monotonic()
+            ready = sorted(path for path, changeTime in pending.items() if now - changeTime >= delay)
+
+            for path in ready:
+                del pending[path]
+
+            if ready:
+                callback(ready)
+
+    finally:
+        watcher.close()
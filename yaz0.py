@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""yaz0.py: Yaz0 decompressor and compressor."""
+
+import struct
+
+################################################################
+################################################################
+
+
+def getDecompressedSize(data):
+    if bytes(data[:4]) != b'Yaz0':
+        raise ValueError("Invalid Yaz0 header!")
+
+    return struct.unpack_from('>I', data, 4)[0]
+
+
+def decompress(data):
+    """
+    Decompress Yaz0 data (bytes or a memoryview).
+    """
+    size = getDecompressedSize(data)
+    data = bytes(data)
+
+    output = bytearray(size)
+    src = 16
+    dst = 0
+
+    try:
+        while dst < size:
+            code = data[src]
+            src += 1
+
+            if code == 0xFF and dst + 8 <= size and src + 8 <= len(data):
+                # Eight literal bytes
+                output[dst:dst + 8] = data[src:src + 8]
+                src += 8
+                dst += 8
+                continue
+
+            for bit in range(8):
+                if dst >= size:
+                    break
+
+                if code & (0x80 >> bit):
+                    output[dst] = data[src]
+                    src += 1
+                    dst += 1
+                    continue
+
+                b1 = data[src]
+                b2 = data[src + 1]
+                src += 2
+
+                copySrc = dst - (((b1 & 0xF) << 8) | b2) - 1
+                length = b1 >> 4
+
+                if length:
+                    length += 2
+
+                else:
+                    length = data[src] + 0x12
+                    src += 1
+
+                if copySrc < 0:
+                    raise ValueError("Invalid Yaz0 data!")
+
+                length = min(length, size - dst)
+                distance = dst - copySrc
+
+                if distance >= length:
+                    output[dst:dst + length] = output[copySrc:copySrc + length]
+
+                else:
+                    # Overlapping copy, repeats the last distance bytes
+                    output[dst:dst + length] = (output[copySrc:dst] * (length // distance + 1))[:length]
+
+                dst += length
+
+    except IndexError:
+        raise ValueError("Truncated Yaz0 data!")
+
+    return bytes(output)
+
+
+################################################################
+################################################################
+
+WINDOW_SIZE = 0x1000
+MIN_LENGTH = 3
+MAX_LENGTH = 0x111
+
+HASH_MASK = 0x7FFF
+
+# Number of hash chain entries that get checked for a match, for each level
+_chainLengths = [0, 1, 4, 8, 16, 32, 64, 128, 512, 4096]
+
+# Levels from which a match is only taken if the next position doesn't have a longer one
+LAZY_LEVEL = 5
+
+
+def _hash(data, pos):
+    return ((data[pos] << 10) ^ (data[pos + 1] << 5) ^ data[pos + 2]) & HASH_MASK
+
+
+def _findMatch(data, pos, size, head, prev, maxChain):
+    maxLength = min(MAX_LENGTH, size - pos)
+    if maxLength < MIN_LENGTH:
+        return 0, 0
+
+    best = MIN_LENGTH - 1
+    bestDistance = 0
+
+    candidate = head[_hash(data, pos)]
+
+    while candidate >= 0 and pos - candidate <= WINDOW_SIZE and maxChain:
+        # Only candidates that could beat the best match are worth comparing
+        if data[candidate + best] == data[pos + best]:
+            length = 0
+            while length < maxLength and data[candidate + length] == data[pos + length]:
+                length += 1
+
+            if length > best:
+                best = length
+                bestDistance = pos - candidate
+
+                if length == maxLength:
+                    break
+
+        candidate = prev[candidate & (WINDOW_SIZE - 1)]
+        maxChain -= 1
+
+    if bestDistance:
+        return best, bestDistance
+
+    return 0, 0
+
+
+def compress(data, level=6):
+    """
+    Compress data to Yaz0.
+    level is 0 (no compression) to 9 (smallest output),
+    it's the number of hash chain entries checked for each match.
+    """
+    if not 0 <= level <= 9:
+        raise ValueError("Invalid Yaz0 compression level: " + str(level))
+
+    data = bytes(data)
+    size = len(data)
+    maxChain = _chainLengths[level]
+
+    output = bytearray(b'Yaz0' + struct.pack('>I', size) + bytes(8))
+
+    # head: last position with a given hash, prev: the position before it with the same hash
+    head = [-1] * (HASH_MASK + 1)
+    prev = [-1] * WINDOW_SIZE
+    inserted = 0
+
+    pending = None
+    pos = 0
+
+    while pos < size:
+        codePos = len(output)
+        output.append(0)
+
+        for bit in range(8):
+            if pos >= size:
+                break
+
+            length = 0
+
+            if pending is not None:
+                length, distance = pending
+                pending = None
+
+            elif maxChain:
+                while inserted < min(pos, size - 2):
+                    hash_ = _hash(data, inserted)
+                    prev[inserted & (WINDOW_SIZE - 1)] = head[hash_]
+                    head[hash_] = inserted
+                    inserted += 1
+
+                length, distance = _findMatch(data, pos, size, head, prev, maxChain)
+
+            if length and level >= LAZY_LEVEL and length < MAX_LENGTH:
+                while inserted < min(pos + 1, size - 2):
+                    hash_ = _hash(data, inserted)
+                    prev[inserted & (WINDOW_SIZE - 1)] = head[hash_]
+                    head[hash_] = inserted
+                    inserted += 1
+
+                nextMatch = _findMatch(data, pos + 1, size, head, prev, maxChain)
+                if nextMatch[0] > length:
+                    pending = nextMatch
+                    length = 0
+
+            if length:
+                distance -= 1
+
+                if length >= 0x12:
+                    output += bytes((distance >> 8, distance & 0xFF, length - 0x12))
+
+                else:
+                    output += bytes((((length - 2) << 4) | (distance >> 8), distance & 0xFF))
+
+                pos += length
+
+            else:
+                output[codePos] |= 0x80 >> bit
+                output.append(data[pos])
+                pos += 1
+
+    return bytes(output)
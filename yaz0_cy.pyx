@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright © 2018 AboodXD
+
+"""yaz0_cy.pyx: Yaz0 decompressor and compressor."""
+
+################################################################
+################################################################
+
+from libc.stdlib cimport malloc, free
+
+
+ctypedef unsigned char u8
+ctypedef unsigned int u32
+ctypedef int s32
+
+
+cpdef u32 getDecompressedSize(data):
+    if bytes(data[:4]) != b'Yaz0':
+        raise ValueError("Invalid Yaz0 header!")
+
+    return (data[4] << 24) | (data[5] << 16) | (data[6] << 8) | data[7]
+
+
+cdef int _decompress(const u8 *data, u32 dataSize, u8 *output, u32 size) noexcept nogil:
+    cdef:
+        u32 src = 16, dst = 0, copySrc, length, distance
+        u8 code, b1, b2
+        int bit
+
+    while dst < size:
+        if src >= dataSize:
+            return -1
+
+        code = data[src]
+        src += 1
+
+        for bit in range(8):
+            if dst >= size:
+                break
+
+            if code & (0x80 >> bit):
+                if src >= dataSize:
+                    return -1
+
+                output[dst] = data[src]
+                src += 1
+                dst += 1
+                continue
+
+            if src + 1 >= dataSize:
+                return -1
+
+            b1 = data[src]
+            b2 = data[src + 1]
+            src += 2
+
+            distance = (((b1 & 0xF) << 8) | b2) + 1
+            length = b1 >> 4
+
+            if length:
+                length += 2
+
+            else:
+                if src >= dataSize:
+                    return -1
+
+                length = data[src] + 0x12
+                src += 1
+
+            if distance > dst:
+                return -2
+
+            copySrc = dst - distance
+            length = min(length, size - dst)
+
+            # Byte by byte, the source can overlap the output
+            while length:
+                output[dst] = output[copySrc]
+                dst += 1
+                copySrc += 1
+                length -= 1
+
+    return 0
+
+
+cpdef bytes decompress(data):
+    """
+    Decompress Yaz0 data (bytes or a memoryview).
+    """
+    cdef:
+        const u8[::1] data_ = bytes(data) if not isinstance(data, bytes) else data
+        u32 size = getDecompressedSize(data)
+        u8 *output = <u8 *>malloc(max(1, size))
+        int result
+
+    try:
+        with nogil:
+            result = _decompress(&data_[0], data_.shape[0], output, size)
+
+        if result == -1:
+            raise ValueError("Truncated Yaz0 data!")
+
+        elif result == -2:
+            raise ValueError("Invalid Yaz0 data!")
+
+        return bytes(<u8[:size]>output) if size else b''
+
+    finally:
+        free(output)
+
+
+################################################################
+################################################################
+
+DEF WINDOW_SIZE = 0x1000
+DEF MIN_LENGTH = 3
+DEF MAX_LENGTH = 0x111
+
+DEF HASH_MASK = 0x7FFF
+
+# Number of hash chain entries that get checked for a match, for each level
+cdef u32 _chainLengths[10]
+_chainLengths[:] = [0, 1, 4, 8, 16, 32, 64, 128, 512, 4096]
+
+# Levels from which a match is only taken if the next position doesn't have a longer one
+DEF LAZY_LEVEL = 5
+
+
+cdef inline u32 _hash(const u8 *data, u32 pos) noexcept nogil:
+    return ((data[pos] << 10) ^ (data[pos + 1] << 5) ^ data[pos + 2]) & HASH_MASK
+
+
+cdef u32 _findMatch(const u8 *data, u32 pos, u32 size, const s32 *head, const s32 *prev,
+                    u32 maxChain, u32 *distance) noexcept nogil:
+    cdef:
+        u32 maxLength = min(MAX_LENGTH, size - pos)
+        u32 best = MIN_LENGTH - 1, bestDistance = 0, length
+        s32 candidate
+
+    if maxLength < MIN_LENGTH:
+        return 0
+
+    candidate = head[_hash(data, pos)]
+
+    while candidate >= 0 and pos - candidate <= WINDOW_SIZE and maxChain:
+        # Only candidates that could beat the best match are worth comparing
+        if data[candidate + best] == data[pos + best]:
+            length = 0
+            while length < maxLength and data[candidate + length] == data[pos + length]:
+                length += 1
+
+            if length > best:
+                best = length
+                bestDistance = pos - candidate
+
+                if length == maxLength:
+                    break
+
+        candidate = prev[candidate & (WINDOW_SIZE - 1)]
+        maxChain -= 1
+
+    if bestDistance:
+        distance[0] = bestDistance
+        return best
+
+    return 0
+
+
+cdef inline void _insert(const u8 *data, u32 *inserted, u32 end, s32 *head, s32 *prev) noexcept nogil:
+    cdef u32 hash_
+
+    while inserted[0] < end:
+        hash_ = _hash(data, inserted[0])
+        prev[inserted[0] & (WINDOW_SIZE - 1)] = head[hash_]
+        head[hash_] = inserted[0]
+        inserted[0] += 1
+
+
+cdef u32 _compress(const u8 *data, u32 size, int level, u8 *output, s32 *head, s32 *prev) noexcept nogil:
+    cdef:
+        u32 maxChain = _chainLengths[level]
+        u32 pos = 0, outPos = 16, codePos, inserted = 0
+        u32 length, distance = 0, pendingLength = 0, pendingDistance = 0, nextLength, nextDistance = 0
+        u32 last = size - 2 if size > 2 else 0
+        int bit
+
+    while pos < size:
+        codePos = outPos
+        output[codePos] = 0
+        outPos += 1
+
+        for bit in range(8):
+            if pos >= size:
+                break
+
+            length = 0
+
+            if pendingLength:
+                length = pendingLength
+                distance = pendingDistance
+                pendingLength = 0
+
+            elif maxChain:
+                _insert(data, &inserted, min(pos, last), head, prev)
+                length = _findMatch(data, pos, size, head, prev, maxChain, &distance)
+
+            if length and level >= LAZY_LEVEL and length < MAX_LENGTH:
+                _insert(data, &inserted, min(pos + 1, last), head, prev)
+
+                nextLength = _findMatch(data, pos + 1, size, head, prev, maxChain, &nextDistance)
+                if nextLength > length:
+                    pendingLength = nextLength
+                    pendingDistance = nextDistance
+                    length = 0
+
+            if length:
+                distance -= 1
+
+                if length >= 0x12:
+                    output[outPos] = distance >> 8
+                    output[outPos + 1] = distance & 0xFF
+                    output[outPos + 2] = length - 0x12
+                    outPos += 3
+
+                else:
+                    output[outPos] = ((length - 2) << 4) | (distance >> 8)
+                    output[outPos + 1] = distance & 0xFF
+                    outPos += 2
+
+                pos += length
+
+            else:
+                output[codePos] |= 0x80 >> bit
+                output[outPos] = data[pos]
+                outPos += 1
+                pos += 1
+
+    return outPos
+
+
+cpdef bytes compress(data, int level=6):
+    """
+    Compress data to Yaz0.
+    level is 0 (no compression) to 9 (smallest output),
+    it's the number of hash chain entries checked for each match.
+    """
+    if not 0 <= level <= 9:
+        raise ValueError("Invalid Yaz0 compression level: " + str(level))
+
+    cdef:
+        bytes data_ = bytes(data)
+        const u8 *src = data_
+        u32 size = len(data_)
+
+        # Worst case: every byte is a literal, plus one code byte for every 8 of them
+        u8 *output = <u8 *>malloc(16 + size + (size + 7) // 8)
+        s32 *head = <s32 *>malloc((HASH_MASK + 1) * sizeof(s32))
+        s32 *prev = <s32 *>malloc(WINDOW_SIZE * sizeof(s32))
+        u32 outSize, i
+
+    try:
+        output[0] = ord('Y')
+        output[1] = ord('a')
+        output[2] = ord('z')
+        output[3] = ord('0')
+        output[4] = size >> 24
+        output[5] = (size >> 16) & 0xFF
+        output[6] = (size >> 8) & 0xFF
+        output[7] = size & 0xFF
+
+        for i in range(8, 16):
+            output[i] = 0
+
+        for i in range(HASH_MASK + 1):
+            head[i] = -1
+
+        for i in range(WINDOW_SIZE):
+            prev[i] = -1
+
+        with nogil:
+            outSize = _compress(src, size, level, output, head, prev)
+
+        return bytes(<u8[:outSize]>output)
+
+    finally:
+        free(output)
+        free(head)
+        free(prev)